@@ -1,6 +1,38 @@
 import logging
-from multiqc.utils import config
+import threading
+from multiqc.utils import config, run_state
 
 config.logger = logging.getLogger(__name__)
 
 __version__ = config.version
+
+# Before Python 3.5 the report is kept in global variables, so only one run can happen at a time
+run_lock = threading.Lock()
+
+def run(analysis_dir, **kwargs):
+    """ Run MultiQC on one or more analysis directories and return its results,
+    without exiting. Keyword arguments can be any of the command line options
+    (using the names of the multiqc.multiqc.run() arguments, e.g. title, outdir,
+    force, module), or any config option. For example:
+
+        multiqc.run(['/path/to/analysis'], outdir='reports', force=True, max_table_rows=1000)
+
+    Returns a dict with the exit code and the paths of the report, data directory
+    and plots directory. Several reports can be made at once in different
+    threads, each run has its own config and report data.
+    """
+    from multiqc import multiqc as mqc
+    if not isinstance(analysis_dir, (list, tuple)):
+        analysis_dir = [analysis_dir]
+    run_func = mqc.run.__wrapped__
+    arg_names = run_func.__code__.co_varnames[:run_func.__code__.co_argcount]
+    options = { k: v for k, v in kwargs.items() if k in arg_names }
+    config_options = { k: v for k, v in kwargs.items() if k not in arg_names }
+    cl_config = options.get('cl_config', [])
+    if not isinstance(cl_config, (list, tuple)):
+        cl_config = [cl_config]
+    options['cl_config'] = list(cl_config) + [config_options]
+    if run_state.per_thread:
+        return mqc.run(tuple(analysis_dir), **options)
+    with run_lock:
+        return mqc.run(tuple(analysis_dir), **options)
@@ -7,15 +7,85 @@ from collections import OrderedDict
 import io
 import fnmatch
 import logging
-import markdown
 import mimetypes
+import mmap
 import os
 import re
 import textwrap
 
-from multiqc.utils import report, config, util_functions
+from multiqc.utils import report, config, util_functions, profiling, shards
 logger = logging.getLogger(__name__)
 
+def markdown_to_html(text):
+    """ Convert markdown to HTML. The markdown package is imported here
+    rather than at the top as it is slow to load. """
+    import markdown
+    return markdown.markdown(text)
+
+class MappedFile(object):
+    """
+    Read-only memory-mapped view of a log file, as returned by find_log_files(filemmap=True).
+    The file is paged in by the operating system as it is read, so it is never held in
+    memory as one big string. Iterating gives the lines of the file without line endings,
+    in the same way as str.splitlines() for files with Unix or Windows line endings.
+    Lines are decoded as UTF-8, with any invalid bytes replaced.
+    The raw bytes can be searched without copying with the re module, using mmap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = io.open(path, 'rb')
+        try:
+            self.mmap = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be memory-mapped
+            self.mmap = None
+
+    def __iter__(self):
+        return self.lines()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def lines(self):
+        """ Yield each line of the file as a str, without the line ending """
+        mm = self.mmap
+        if mm is None:
+            return
+        size = len(mm)
+        pos = 0
+        while pos < size:
+            end = mm.find(b'\n', pos)
+            if end == -1:
+                end = size
+            line = mm[pos:end]
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            yield line.decode('utf-8', 'replace')
+            pos = end + 1
+
+    def startswith(self, prefix):
+        """ Check the start of the file without reading the rest of it """
+        if self.mmap is None:
+            return prefix == ''
+        prefix = prefix.encode('utf-8')
+        return self.mmap[:len(prefix)] == prefix
+
+    def read(self):
+        """ Return the whole file as a str, for parsers that need it all at once """
+        if self.mmap is None:
+            return ''
+        return self.mmap[:].decode('utf-8', 'replace')
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+        self._fh.close()
+
+
 class BaseMultiqcModule(object):
 
     def __init__(self, name='base', anchor='base', target=None, href=None, info=None, comment=None, extra=None,
@@ -54,21 +124,26 @@ class BaseMultiqcModule(object):
             if self.comment is not None:
                 self.comment = textwrap.dedent(self.comment)
                 if autoformat_type == 'markdown':
-                    self.comment = markdown.markdown(self.comment)
+                    self.comment = markdown_to_html(self.comment)
 
         self.sections = list()
 
-    def find_log_files(self, sp_key, filecontents=True, filehandles=False):
+    def find_log_files(self, sp_key, filecontents=True, filehandles=False, filemmap=False):
         """
         Return matches log files of interest.
         :param sp_key: Search pattern key specified in config
         :param filehandles: Set to true to return a file handle instead of slurped file contents
+        :param filemmap: Set to true to return a memory-mapped MappedFile instead of slurped file contents.
+                         Iterate over it to get the lines of the file without reading it all into memory.
         :return: Yields a dict with filename (fn), root directory (root), cleaned sample name
                  generated from the filename (s_name) and either the file contents or file handle
                  for the current matched file (f).
                  As yield is used, the results can be iterated over without loading all files at once
         """
+        files = self._find_log_files(sp_key, filecontents, filehandles, filemmap)
+        return profiling.profile_iter(files, 'find_log_files', sp_key if isinstance(sp_key, str) else self.name)
 
+    def _find_log_files(self, sp_key, filecontents, filehandles, filemmap):
         # Pick up path filters if specified.
         # Allows modules to be called multiple times with different sets of files
         path_filters = getattr(self, 'mod_cust_config', {}).get('path_filters')
@@ -112,7 +187,7 @@ class BaseMultiqcModule(object):
 
             # Make a sample name from the filename
             f['s_name'] = self.clean_s_name(f['fn'], f['root'])
-            if filehandles or filecontents:
+            if filehandles or filecontents or filemmap:
                 try:
                     # Custom content module can now handle image files
                     (ftype, encoding) = mimetypes.guess_type(os.path.join(f['root'], f['fn']))
@@ -121,6 +196,10 @@ class BaseMultiqcModule(object):
                             # always return file handles
                             f['f'] = fh
                             yield f
+                    elif filemmap:
+                        with MappedFile(os.path.join(f['root'],f['fn'])) as mf:
+                            f['f'] = mf
+                            yield f
                     else:
                         # Everything else - should be all text files
                         with io.open (os.path.join(f['root'],f['fn']), "r", encoding='utf-8') as fh:
@@ -137,6 +216,58 @@ class BaseMultiqcModule(object):
             else:
                 yield f
 
+    def parse_log_file(self, f, parse_func, filecontents=True, filehandles=False, filemmap=False):
+        """
+        Parse a log file found with find_log_files(filecontents=False).
+        If the parse cache is enabled, the result is saved and reused in later runs
+        for as long as the file is unchanged, without reading the file again.
+        :param f: File dict yielded by find_log_files()
+        :param parse_func: Function which parses a single file. It is given the file contents,
+                           a file handle if filehandles is True, a MappedFile if filemmap is True,
+                           or the file path if filecontents is False. Must only depend on the file
+                           and return picklable data.
+        :return: Whatever parse_func returns, or None if the file could not be read
+        """
+        fpath = os.path.join(f['root'], f['fn'])
+        report.last_found_file = fpath
+        cache_key = None
+        if report.parse_cache is not None:
+            cache_key = report.parse_cache.key(fpath, parse_func)
+            parsed = report.parse_cache.get(cache_key)
+            if parsed is not None:
+                return parsed
+
+        if filemmap:
+            try:
+                mf = MappedFile(fpath)
+            except (IOError, OSError, ValueError) as e:
+                if config.report_readerrors:
+                    logger.debug("Couldn't read file when parsing: {}\n{}".format(f['fn'], e))
+                return None
+            with mf:
+                parsed = parse_func(mf)
+        elif not filehandles and not filecontents:
+            parsed = parse_func(fpath)
+        else:
+            try:
+                fh = io.open(fpath, "r", encoding='utf-8')
+                if not filehandles:
+                    with fh:
+                        contents = fh.read()
+            except (IOError, OSError, ValueError, UnicodeDecodeError) as e:
+                if config.report_readerrors:
+                    logger.debug("Couldn't read file when parsing: {}\n{}".format(f['fn'], e))
+                return None
+            if filehandles:
+                with fh:
+                    parsed = parse_func(fh)
+            else:
+                parsed = parse_func(contents)
+
+        if report.parse_cache is not None:
+            report.parse_cache.add(cache_key, parsed)
+        return parsed
+
     def add_section(self, name=None, anchor=None, description='', comment='', helptext='', plot='', content='', autoformat=True, autoformat_type='markdown'):
         """ Add a section to the module report output """
 
@@ -166,15 +297,15 @@ class BaseMultiqcModule(object):
             if len(description) > 0:
                 description = textwrap.dedent(description)
                 if autoformat_type == 'markdown':
-                    description = markdown.markdown(description)
+                    description = markdown_to_html(description)
             if len(comment) > 0:
                 comment = textwrap.dedent(comment)
                 if autoformat_type == 'markdown':
-                    comment = markdown.markdown(comment)
+                    comment = markdown_to_html(comment)
             if len(helptext) > 0:
                 helptext = textwrap.dedent(helptext)
                 if autoformat_type == 'markdown':
-                    helptext = markdown.markdown(helptext)
+                    helptext = markdown_to_html(helptext)
 
         # Strip excess whitespace
         description = description.strip()
@@ -273,7 +404,8 @@ class BaseMultiqcModule(object):
     def general_stats_addcols(self, data, headers=None, namespace=None):
         """ Helper function to add to the General Statistics variable.
         Adds to report.general_stats and does not return anything. Fills
-        in required config variables if not supplied.
+        in required config variables if not supplied. The values are also
+        copied into a columnar store, so call this once the data is complete.
         :param data: A dict with the data. First key should be sample name,
                      then the data key, then the data.
         :param headers: Dict / OrderedDict with information for the headers,
@@ -329,6 +461,8 @@ class BaseMultiqcModule(object):
         """ Saves raw data to a dictionary for downstream use, then redirects
         to report.write_data_file() to create the file in the report directory """
         report.saved_raw_data[fn] = data
+        if config.shard_out:
+            shards.record_data_file(data, fn, sort_cols, data_format)
         util_functions.write_data_file(data, fn, sort_cols, data_format)
 
     ##################################################
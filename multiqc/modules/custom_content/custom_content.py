@@ -79,7 +79,7 @@ def custom_module_classes():
     bm = BaseMultiqcModule()
     for k in search_patterns:
         num_sp_found_files = 0
-        for f in bm.find_log_files(k):
+        for f in bm.find_log_files(k, filemmap=True):
             num_sp_found_files += 1
             # Handle any exception without messing up for remaining custom content files
             try:
@@ -89,7 +89,7 @@ def custom_module_classes():
                 parsed_data = None
                 if f_extension == '.yaml' or f_extension == '.yml':
                     try:
-                        parsed_data = yaml_ordered_load(f['f'])
+                        parsed_data = yaml_ordered_load(f['f'].read())
                     except Exception as e:
                         log.warning("Error parsing YAML file '{}' (probably invalid YAML)".format(f['fn']))
                         log.warning("YAML error: {}".format(e))
@@ -97,7 +97,7 @@ def custom_module_classes():
                 elif f_extension == '.json':
                     try:
                         # Use OrderedDict for objects so that column order is honoured
-                        parsed_data = json.loads(f['f'], object_pairs_hook=OrderedDict)
+                        parsed_data = json.loads(f['f'].read(), object_pairs_hook=OrderedDict)
                     except Exception as e:
                         log.warning("Error parsing JSON file '{}' (probably invalid JSON)".format(f['fn']))
                         log.warning("JSON error: {}".format(e))
@@ -319,7 +319,7 @@ class MultiqcModule(BaseMultiqcModule):
 def _find_file_header(f):
     # Collect commented out header lines
     hlines = []
-    for l in f['f'].splitlines():
+    for l in f['f']:
         if l.startswith('#'):
             hlines.append(l[1:])
     if len(hlines) == 0:
@@ -350,7 +350,7 @@ def _guess_file_format(f):
     commas = []
     spaces = []
     j = 0
-    for l in f['f'].splitlines():
+    for l in f['f']:
         if not l.startswith('#'):
             j += 1
             tabs.append(len(l.split("\t")))
@@ -390,19 +390,20 @@ def _parse_txt(f, conf):
         sep = ","
     if conf['file_format'] == 'tsv':
         sep = "\t"
-    lines = f['f'].splitlines()
     d = []
 
     # Check for special case - HTML
     if conf.get('plot_type') == 'html':
-        for l in lines:
+        for l in f['f']:
             if l and not l.startswith('#'):
                 d.append(l)
         return ("\n".join(d), conf)
 
     # Not HTML, need to parse data
     ncols = None
-    for l in lines:
+    nlines = 0
+    for l in f['f']:
+        nlines += 1
         if l and not l.startswith('#'):
             sections = l.split(sep)
             d.append(sections)
@@ -438,7 +439,7 @@ def _parse_txt(f, conf):
         return (data, conf)
 
     # Heatmap: Number of headers == number of lines
-    if conf.get('plot_type') is None and first_row_str == len(lines) and all_numeric:
+    if conf.get('plot_type') is None and first_row_str == nlines and all_numeric:
         conf['plot_type'] = 'heatmap'
     if conf.get('plot_type') == 'heatmap':
         conf['xcats'] = d[0][1:]
@@ -39,9 +39,11 @@ class MultiqcModule(BaseMultiqcModule):
         self.fastqc_data = dict()
 
         # Find and parse unzipped FastQC reports
-        for f in self.find_log_files('fastqc/data'):
+        for f in self.find_log_files('fastqc/data', filecontents=False):
             s_name = self.clean_s_name(os.path.basename(f['root']), os.path.dirname(f['root']))
-            self.parse_fastqc_report(f['f'], s_name, f)
+            parsed = self.parse_log_file(f, parse_fastqc_data, filemmap=True)
+            if parsed is not None:
+                self.add_fastqc_data(parsed, s_name, f)
 
         # Find and parse zipped FastQC reports
         for f in self.find_log_files('fastqc/zip', filecontents=False):
@@ -52,20 +54,9 @@ class MultiqcModule(BaseMultiqcModule):
             if s_name in self.fastqc_data.keys():
                 log.debug("Skipping '{}' as already parsed '{}'".format(f['fn'], s_name))
                 continue
-            try:
-                fqc_zip = zipfile.ZipFile(os.path.join(f['root'], f['fn']))
-            except Exception as e:
-                log.warn("Couldn't read '{}' - Bad zip file".format(f['fn']))
-                log.debug("Bad zip file error:\n{}".format(e))
-                continue
-            # FastQC zip files should have just one directory inside, containing report
-            d_name = fqc_zip.namelist()[0]
-            try:
-                with fqc_zip.open(os.path.join(d_name, 'fastqc_data.txt')) as fh:
-                    r_data = fh.read().decode('utf8')
-                    self.parse_fastqc_report(r_data, s_name, f)
-            except KeyError:
-                log.warning("Error - can't find fastqc_raw_data.txt in {}".format(f))
+            parsed = self.parse_log_file(f, parse_fastqc_zip, filecontents=False)
+            if parsed is not None:
+                self.add_fastqc_data(parsed, s_name, f)
 
         # Filter to strip out ignored sample names
         self.fastqc_data = self.ignore_samples(self.fastqc_data)
@@ -121,108 +112,22 @@ class MultiqcModule(BaseMultiqcModule):
         """ Takes contents from a fastq_data.txt file and parses out required
         statistics and data. Returns a dict with keys 'stats' and 'data'.
         Data is for plotting graphs, stats are for top table. """
+        self.add_fastqc_data(parse_fastqc_data(file_contents.splitlines()), s_name, f)
+
+    def add_fastqc_data(self, parsed, s_name=None, f=None):
+        """ Add the results of parse_fastqc_data() for one report """
 
         # Make the sample name from the input filename if we find it
-        fn_search = re.search(r"Filename\s+(.+)", file_contents)
-        if fn_search:
-            s_name = self.clean_s_name(fn_search.group(1) , f['root'])
+        if parsed['filename'] is not None:
+            s_name = self.clean_s_name(parsed['filename'], f['root'])
 
         if s_name in self.fastqc_data.keys():
             log.debug("Duplicate sample name found! Overwriting: {}".format(s_name))
         self.add_data_source(f, s_name)
-        self.fastqc_data[s_name] = { 'statuses': dict() }
-
-        # Parse the report
-        section = None
-        s_headers = None
-        self.dup_keys = []
-        for l in file_contents.splitlines():
-            if l == '>>END_MODULE':
-                section = None
-                s_headers = None
-            elif l.startswith('>>'):
-                (section, status) = l[2:].split("\t", 1)
-                section = section.lower().replace(' ', '_')
-                self.fastqc_data[s_name]['statuses'][section] = status
-            elif section is not None:
-                if l.startswith('#'):
-                    s_headers = l[1:].split("\t")
-                    # Special case: Total Deduplicated Percentage header line
-                    if s_headers[0] == 'Total Deduplicated Percentage':
-                        self.fastqc_data[s_name]['basic_statistics'].append({
-                            'measure': 'total_deduplicated_percentage',
-                            'value': float(s_headers[1])
-                        })
-                    else:
-                        # Special case: Rename dedup header in old versions of FastQC (v10)
-                        if s_headers[1] == 'Relative count':
-                            s_headers[1] = 'Percentage of total'
-                        s_headers = [s.lower().replace(' ', '_') for s in s_headers]
-                        self.fastqc_data[s_name][section] = list()
-
-                elif s_headers is not None:
-                    s = l.split("\t")
-                    row = dict()
-                    for (i, v) in enumerate(s):
-                        v.replace('NaN','0')
-                        try:
-                            v = float(v)
-                        except ValueError:
-                            pass
-                        row[s_headers[i]] = v
-                    self.fastqc_data[s_name][section].append(row)
-                    # Special case - need to remember order of duplication keys
-                    if section == 'sequence_duplication_levels':
-                        try:
-                            self.dup_keys.append(float(s[0]))
-                        except ValueError:
-                            self.dup_keys.append(s[0])
-
-        # Tidy up the Basic Stats
-        self.fastqc_data[s_name]['basic_statistics'] = {d['measure']: d['value'] for d in
-                                                        self.fastqc_data[s_name][
-                                                            'basic_statistics']}
-
-        # Pull out upto Q30
-        pbsq_unordered_list = []
-        for pbsq in self.fastqc_data[s_name]["per_base_sequence_quality"]:
-
-            pos = str(pbsq['base'])
-
-            # The base is only a single number up until 10.  After this the base is represented by a range.
-            # In these cases we take the upper value in the range.
-            base = int(pos.split('-')[1]) if '-' in pos else int(float(pos))
-
-            # Mean quality at this base
-            mean = float(pbsq['mean'])
-
-            pbsq_unordered_list.append((base, mean))
-
-        pbsq_ordered_list = sorted(pbsq_unordered_list, key=lambda x: x[0])
-
-        #print(pbsq_ordered_list)
-
-        q30_reaches = 0
-        for i, pbsq in enumerate(pbsq_ordered_list):
-            if i == 0:
-                continue
-
-            if float(pbsq[1]) > 30.0:
-                q30_reaches = pbsq[0]
+        self.fastqc_data[s_name] = parsed['data']
 
-        #print(q30_reaches)
-        self.fastqc_data[s_name]['basic_statistics']['upto_q30'] = q30_reaches
-
-
-
-        # Calculate the average sequence length (Basic Statistics gives a range)
-        length_bp = 0
-        total_count = 0
-        for d in self.fastqc_data[s_name].get('sequence_length_distribution', {}):
-            length_bp += d['count'] * self.avg_bp_from_range(d['length'])
-            total_count += d['count']
-        if total_count > 0:
-            self.fastqc_data[s_name]['basic_statistics']['avg_sequence_length'] = length_bp / total_count
+        # Special case - need to remember order of duplication keys
+        self.dup_keys = parsed['dup_keys']
 
     def overrepresented_sequences_table(self):
         """ Add the most overrepresented sequence plus some stats to it's own table """
@@ -1048,18 +953,8 @@ class MultiqcModule(BaseMultiqcModule):
 
 
     def avg_bp_from_range(self, bp):
-        """ Helper function - FastQC often gives base pair ranges (eg. 10-15)
-        which are not helpful when plotting. This returns the average from such
-        ranges as an int, which is helpful. If not a range, just returns the int """
-
-        try:
-            if '-' in bp:
-                maxlen = float(bp.split("-",1)[1])
-                minlen = float(bp.split("-",1)[0])
-                bp = ((maxlen - minlen)/2) + minlen
-        except TypeError:
-            pass
-        return(int(bp))
+        """ Helper function - see avg_bp_from_range() """
+        return avg_bp_from_range(bp)
 
     def get_status_cols(self, section):
         """ Helper function - returns a list of colours according to the FastQC
@@ -1069,3 +964,144 @@ class MultiqcModule(BaseMultiqcModule):
             status = self.fastqc_data[s_name]['statuses'].get(section, 'default')
             colours[s_name] = self.status_colours[status]
         return colours
+
+
+def avg_bp_from_range(bp):
+    """ Helper function - FastQC often gives base pair ranges (eg. 10-15)
+    which are not helpful when plotting. This returns the average from such
+    ranges as an int, which is helpful. If not a range, just returns the int """
+
+    try:
+        if '-' in bp:
+            maxlen = float(bp.split("-",1)[1])
+            minlen = float(bp.split("-",1)[0])
+            bp = ((maxlen - minlen)/2) + minlen
+    except TypeError:
+        pass
+    return(int(bp))
+
+def parse_fastqc_zip(path):
+    """ Read the fastqc_data.txt file from a zipped FastQC report and
+    parse it with parse_fastqc_data(). Returns None if it can't be read. """
+    fn = os.path.basename(path)
+    try:
+        fqc_zip = zipfile.ZipFile(path)
+    except Exception as e:
+        log.warn("Couldn't read '{}' - Bad zip file".format(fn))
+        log.debug("Bad zip file error:\n{}".format(e))
+        return None
+    # FastQC zip files should have just one directory inside, containing report
+    d_name = fqc_zip.namelist()[0]
+    try:
+        fh = fqc_zip.open(os.path.join(d_name, 'fastqc_data.txt'))
+    except KeyError:
+        log.warning("Error - can't find fastqc_raw_data.txt in {}".format(path))
+        return None
+    # Decompress and parse line by line instead of reading the whole file
+    with io.TextIOWrapper(fh, encoding='utf8') as text_fh:
+        return parse_fastqc_data(l.rstrip('\n') for l in text_fh)
+
+def parse_fastqc_data(lines):
+    """ Takes the lines of a fastq_data.txt file and parses out required
+    statistics and data. Returns a dict with the input filename given in the
+    report (filename), the parsed data (data) and the order of the
+    sequence duplication level keys (dup_keys). """
+
+    filename = None
+    fastqc_data = { 'statuses': dict() }
+    dup_keys = []
+
+    # Parse the report
+    section = None
+    s_headers = None
+    for l in lines:
+        # Get the input filename so that we can use it for the sample name
+        if filename is None:
+            fn_search = re.search(r"Filename\s+(.+)", l)
+            if fn_search:
+                filename = fn_search.group(1)
+        if l == '>>END_MODULE':
+            section = None
+            s_headers = None
+        elif l.startswith('>>'):
+            (section, status) = l[2:].split("\t", 1)
+            section = section.lower().replace(' ', '_')
+            fastqc_data['statuses'][section] = status
+        elif section is not None:
+            if l.startswith('#'):
+                s_headers = l[1:].split("\t")
+                # Special case: Total Deduplicated Percentage header line
+                if s_headers[0] == 'Total Deduplicated Percentage':
+                    fastqc_data['basic_statistics'].append({
+                        'measure': 'total_deduplicated_percentage',
+                        'value': float(s_headers[1])
+                    })
+                else:
+                    # Special case: Rename dedup header in old versions of FastQC (v10)
+                    if s_headers[1] == 'Relative count':
+                        s_headers[1] = 'Percentage of total'
+                    s_headers = [s.lower().replace(' ', '_') for s in s_headers]
+                    fastqc_data[section] = list()
+
+            elif s_headers is not None:
+                s = l.split("\t")
+                row = dict()
+                for (i, v) in enumerate(s):
+                    v.replace('NaN','0')
+                    try:
+                        v = float(v)
+                    except ValueError:
+                        pass
+                    row[s_headers[i]] = v
+                fastqc_data[section].append(row)
+                # Special case - need to remember order of duplication keys
+                if section == 'sequence_duplication_levels':
+                    try:
+                        dup_keys.append(float(s[0]))
+                    except ValueError:
+                        dup_keys.append(s[0])
+
+    # Tidy up the Basic Stats
+    fastqc_data['basic_statistics'] = {d['measure']: d['value'] for d in fastqc_data['basic_statistics']}
+
+    # Pull out upto Q30
+    pbsq_unordered_list = []
+    for pbsq in fastqc_data["per_base_sequence_quality"]:
+
+        pos = str(pbsq['base'])
+
+        # The base is only a single number up until 10.  After this the base is represented by a range.
+        # In these cases we take the upper value in the range.
+        base = int(pos.split('-')[1]) if '-' in pos else int(float(pos))
+
+        # Mean quality at this base
+        mean = float(pbsq['mean'])
+
+        pbsq_unordered_list.append((base, mean))
+
+    pbsq_ordered_list = sorted(pbsq_unordered_list, key=lambda x: x[0])
+
+    q30_reaches = 0
+    for i, pbsq in enumerate(pbsq_ordered_list):
+        if i == 0:
+            continue
+
+        if float(pbsq[1]) > 30.0:
+            q30_reaches = pbsq[0]
+
+    fastqc_data['basic_statistics']['upto_q30'] = q30_reaches
+
+    # Calculate the average sequence length (Basic Statistics gives a range)
+    length_bp = 0
+    total_count = 0
+    for d in fastqc_data.get('sequence_length_distribution', {}):
+        length_bp += d['count'] * avg_bp_from_range(d['length'])
+        total_count += d['count']
+    if total_count > 0:
+        fastqc_data['basic_statistics']['avg_sequence_length'] = length_bp / total_count
+
+    return {
+        'filename': filename,
+        'data': fastqc_data,
+        'dup_keys': dup_keys
+    }
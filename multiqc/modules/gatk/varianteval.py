@@ -16,8 +16,10 @@ class VariantEvalMixin():
         """ Find GATK varianteval logs and parse their data """
 
         self.gatk_varianteval = dict()
-        for f in self.find_log_files('gatk/varianteval', filehandles=True):
-            parsed_data = parse_single_report(f['f'])
+        for f in self.find_log_files('gatk/varianteval', filecontents=False):
+            parsed_data = self.parse_log_file(f, parse_single_report, filehandles=True)
+            if parsed_data is None:
+                continue
             if len(parsed_data) > 0:
                 if f['s_name'] in self.gatk_varianteval:
                     log.debug("Duplicate sample name found! Overwriting: {}".format(f['s_name']))
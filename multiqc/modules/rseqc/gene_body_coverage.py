@@ -23,13 +23,13 @@ def parse_reports(self):
     # and add these to the general stats table?
 
     # Go through files and parse data
-    for f in self.find_log_files('rseqc/gene_body_coverage'):
+    for f in self.find_log_files('rseqc/gene_body_coverage', filemmap=True):
 
         # RSeQC >= v2.4
         if f['f'].startswith('Percentile'):
             keys = []
             nrows = 0
-            for l in f['f'].splitlines():
+            for l in f['f']:
                 s = l.split()
                 if len(keys) == 0:
                     keys = s[1:]
@@ -55,7 +55,7 @@ def parse_reports(self):
             self.add_data_source(f, section='gene_body_coverage')
             self.gene_body_cov_hist_counts[f['s_name']] = OrderedDict()
             nrows = 0
-            for l in f['f'].splitlines():
+            for l in f['f']:
                 s = l.split()
                 try:
                     nrows += 1
@@ -19,8 +19,10 @@ class FlagstatReportMixin():
         """ Find Samtools flagstat logs and parse their data """
 
         self.samtools_flagstat = dict()
-        for f in self.find_log_files('samtools/flagstat'):
-            parsed_data = parse_single_report(f['f'])
+        for f in self.find_log_files('samtools/flagstat', filecontents=False):
+            parsed_data = self.parse_log_file(f, parse_single_report)
+            if parsed_data is None:
+                continue
             if len(parsed_data) > 0:
                 if f['s_name'] in self.samtools_flagstat:
                     log.debug("Duplicate sample name found! Overwriting: {}".format(f['s_name']))
@@ -17,8 +17,10 @@ class IdxstatsReportMixin():
         """ Find Samtools idxstats logs and parse their data """
 
         self.samtools_idxstats = dict()
-        for f in self.find_log_files('samtools/idxstats'):
-            parsed_data = parse_single_report(f['f'])
+        for f in self.find_log_files('samtools/idxstats', filecontents=False):
+            parsed_data = self.parse_log_file(f, parse_single_report)
+            if parsed_data is None:
+                continue
             if len(parsed_data) > 0:
                 if f['s_name'] in self.samtools_idxstats:
                     log.debug("Duplicate sample name found! Overwriting: {}".format(f['s_name']))
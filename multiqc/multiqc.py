@@ -0,0 +1,975 @@
+#!/usr/bin/env python
+
+""" MultiQC: A modular tool to aggregate results from bioinformatics analyses across many samples into a single report
+
+The command line interface and the main MultiQC run, used by the multiqc
+script and by multiqc.run()
+"""
+
+from __future__ import print_function, absolute_import
+
+import click
+from distutils import version
+import errno
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import traceback
+
+try:
+    from urllib.request import urlopen #py3
+except ImportError:
+    from urllib2 import urlopen #py2
+    # Use UTF-8 encoding by default
+    reload(sys)
+    sys.setdefaultencoding('utf8')
+try:
+    from importlib import reload as reload_module #py3
+except ImportError:
+    reload_module = reload #py2
+
+from multiqc import __version__
+from multiqc.plots import table
+from multiqc.utils import report, plugin_hooks, megaqc, util_functions, lint_helpers, config, log, parse_cache, module_runner, profiling, run_state, shards, split, template_bundle, flat_plots
+logger = config.logger
+
+# Templates used by earlier runs in this process
+loaded_templates = set()
+
+@click.command(
+    context_settings = dict( help_option_names = ['-h', '--help'] )
+)
+@click.argument('analysis_dir',
+                    type = click.Path(exists=True),
+                    nargs = -1,
+                    metavar = "<analysis directory>"
+)
+@click.option('-f', '--force',
+                    is_flag = True,
+                    help = "Overwrite any existing reports"
+)
+@click.option('-d', '--dirs',
+                    is_flag = True,
+                    help = "Prepend directory to sample names"
+)
+@click.option('-dd', '--dirs-depth', 'dirs_depth',
+                    type = int,
+                    help = "Prepend [INT] directories to sample names. Negative number to take from start of path."
+)
+@click.option('-s', '--fullnames', 'no_clean_sname',
+                    is_flag = True,
+                    help = "Do not clean the sample names (leave as full file name)"
+)
+@click.option('-i', '--title',
+                    type = str,
+                    help = "Report title. Printed as page header, used for filename if not otherwise specified."
+)
+@click.option('-b', '--comment', 'report_comment',
+                    type = str,
+                    help = "Custom comment, will be printed at the top of the report."
+)
+@click.option('-n', '--filename',
+                    type = str,
+                    help = "Report filename. Use 'stdout' to print to standard out."
+)
+@click.option('-o', '--outdir',
+                    type = str,
+                    help = "Create report in the specified output directory."
+)
+@click.option('-t', '--template',
+                    type = click.Choice(config.avail_templates),
+                    help = "Report template to use."
+)
+@click.option( '--tag', 'module_tag',
+                    type = str,
+                    multiple = True,
+                    help = "Use only modules which tagged with this keyword, eg. RNA"
+)
+@click.option( '--view-tags', '--view_tags',
+                    is_flag = True,
+                    callback = util_functions.view_all_tags,
+                    expose_value = False,
+                    is_eager = True,
+                    help = "View the available tags and which modules they load"
+)
+@click.option('-x', '--ignore',
+                    type = str,
+                    multiple = True,
+                    help = "Ignore analysis files (glob expression)"
+)
+@click.option('--ignore-samples', 'ignore_samples',
+                    type = str,
+                    multiple = True,
+                    help = "Ignore sample names (glob expression)"
+)
+@click.option('--ignore-symlinks', 'ignore_symlinks',
+                    is_flag = True,
+                    help = "Ignore symlinked directories and files"
+)
+@click.option('--sample-names', 'sample_names',
+                    type = click.Path(exists=True, readable=True),
+                    help = "File containing alternative sample names"
+)
+@click.option('-l', '--file-list',
+                    is_flag = True,
+                    help = "Supply a file containing a list of file paths to be searched, one per row"
+)
+@click.option('--search-threads', 'search_threads',
+                    type = int,
+                    help = "Number of threads to use when searching for files. Default: {}".format(config.search_threads)
+)
+@click.option('--search-cache', 'search_cache',
+                    is_flag = True,
+                    help = "Remember which files matched, and skip searching unchanged files next time"
+)
+@click.option('--incremental', 'incremental',
+                    is_flag = True,
+                    help = "Cache search and parsing results, so that only new or changed files are processed next time"
+)
+@click.option('--module-workers', 'module_workers',
+                    type = int,
+                    help = "Number of processes to use when running modules. Default: {}".format(config.module_workers)
+)
+@click.option('--plot-workers', 'plot_workers',
+                    type = int,
+                    help = "Number of processes to use when saving flat plots. Default: {}".format(config.plot_workers)
+)
+@click.option('--shard-out', 'shard_out',
+                    type = click.Path(),
+                    help = "Save module results to this shard file instead of making a report, to merge later with --merge"
+)
+@click.option('--merge', 'merge_shards',
+                    is_flag = True,
+                    help = "Make one report from the shard files given instead of analysis directories"
+)
+@click.option('--split-by', 'split_by',
+                    multiple = True,
+                    metavar = 'regex:PATTERN|dir:N|sheet:FILE',
+                    help = "Also make a report for each group of samples, from one search and parse. Can be given more than once"
+)
+@click.option('--split-workers', 'split_workers',
+                    type = int,
+                    help = "Number of processes to use when making the --split-by reports. Default: {}".format(config.split_workers)
+)
+@click.option('--from-data', 'from_data',
+                    type = click.Path(exists=True, dir_okay=False),
+                    help = "Make the report again from the multiqc_data.json file of a previous run, without searching for files"
+)
+@click.option('--server', 'server_address',
+                    metavar = '[host:port|port|socket]',
+                    help = "Run as a server that makes reports for jobs sent over HTTP, on a local port or a Unix socket"
+)
+@click.option('--server-workers', 'server_workers',
+                    type = int,
+                    default = 2,
+                    help = "Number of reports to make at once in server mode. Default: 2"
+)
+@click.option('--server-queue', 'server_queue',
+                    type = int,
+                    default = 100,
+                    help = "Number of jobs that can wait to run in server mode. Default: 100"
+)
+@click.option('-e', '--exclude', metavar='[module name]',
+                    type = click.Choice(sorted(['general_stats']+list(config.avail_modules.keys()))),
+                    multiple = True,
+                    help = "Do not use this module. Can specify multiple times."
+)
+@click.option('-m', '--module', metavar='[module name]',
+                    type = click.Choice(sorted(config.avail_modules.keys())),
+                    multiple = True,
+                    help = "Use only this module. Can specify multiple times."
+)
+@click.option('--data-dir', 'make_data_dir',
+                    is_flag = True,
+                    help = "Force the parsed data directory to be created."
+)
+@click.option('--no-data-dir', 'no_data_dir',
+                    is_flag = True,
+                    help = "Prevent the parsed data directory from being created."
+)
+@click.option('-k', '--data-format', 'data_format',
+                    type = click.Choice(config.data_format_extensions.keys()),
+                    help = "Output parsed data in a different format. Default: {}".format(config.data_format)
+)
+@click.option('-z', '--zip-data-dir', 'zip_data_dir',
+                    is_flag = True,
+                    help = "Compress the data directory."
+)
+@click.option('--gzip-report', 'gzip_report',
+                    is_flag = True,
+                    help = "Compress the report with gzip as it is written, to <filename>.html.gz"
+)
+@click.option('--asset-dir', 'asset_dir',
+                    type = click.Path(file_okay=False),
+                    help = "Write the report JavaScript, CSS, fonts and images to this shared directory instead of into the report"
+)
+@click.option('--asset-url', 'asset_url',
+                    help = "URL prefix for the files in --asset-dir. Default: the path from the report to --asset-dir"
+)
+@click.option('--asset-gzip', 'asset_gzip',
+                    is_flag = True,
+                    help = "Also write a gzipped copy of each file in --asset-dir"
+)
+@click.option('-p', '--export', 'export_plots',
+                    is_flag = True,
+                    help = "Export plots as static images in addition to the report"
+)
+@click.option('-fp', '--flat', 'plots_flat',
+                    is_flag = True,
+                    help = "Use only flat plots (static images)"
+)
+@click.option('-ip', '--interactive', 'plots_interactive',
+                    is_flag = True,
+                    help = "Use only interactive plots (HighCharts Javascript)"
+)
+@click.option('--lint', 'lint',
+                    is_flag = True,
+                    help = "Use strict linting (validation) to help code development"
+)
+@click.option('--profile-runtime', 'profile_runtime',
+                    is_flag = True,
+                    help = "Record how long each step takes, saved to multiqc_runtime.json"
+)
+@click.option('--pdf', 'make_pdf',
+                    is_flag = True,
+                    help = "Creates PDF report with 'simple' template. Requires Pandoc to be installed."
+)
+@click.option('--no-megaqc-upload', 'no_megaqc_upload',
+                    is_flag = True,
+                    help = "Don't upload generated report to MegaQC, even if MegaQC options are found"
+)
+@click.option('-c', '--config', 'config_file',
+                    type = click.Path(exists=True, readable=True),
+                    multiple=True,
+                    help = "Specific config file to load, after those in MultiQC dir / home dir / working dir."
+)
+@click.option('--cl-config', '--cl_config',
+                    type = str,
+                    multiple = True,
+                    help = "Specify MultiQC config YAML on the command line"
+)
+@click.option('-v', '--verbose',
+                    count = True,
+                    default = 0,
+                    help = "Increase output verbosity."
+)
+@click.option('-q', '--quiet',
+                    is_flag = True,
+                    help = "Only show log warnings"
+)
+@click.version_option(__version__)
+
+def run_cli(server_address, server_workers, server_queue, **kwargs):
+    """MultiQC aggregates results from bioinformatics analyses across many samples into a single report.
+
+        It searches a given directory for analysis logs and compiles a HTML report.
+        It's a general use tool, perfect for summarising the output from numerous
+        bioinformatics tools.
+
+        To run, supply with one or more directory to scan for analysis results.
+        To run here, use 'multiqc .'
+
+        See http://multiqc.info for more details.
+
+        Author: Phil Ewels (http://phil.ewels.co.uk)
+    """
+
+    # Run as a server, making each report in a new process forked from this one
+    if server_address is not None:
+        loglevel = log.LEVELS.get(min(kwargs['verbose'],1), "INFO")
+        if kwargs['quiet']:
+            loglevel = 'WARNING'
+        from multiqc.utils import server
+        server.serve(run_cli, server_address, server_workers, server_queue, loglevel)
+        sys.exit(0)
+
+    result = run(**kwargs)
+
+    # Exit with an error code if a module broke
+    sys.exit(result['sys_exit_code'])
+
+
+@run_state.in_new_report
+def run(analysis_dir=(), dirs=False, dirs_depth=None, no_clean_sname=False, title=None, report_comment=None, template=None,
+module_tag=(), module=(), exclude=(), outdir=None, ignore=(), ignore_samples=(), sample_names=None, file_list=False,
+search_threads=None, search_cache=False, incremental=False, module_workers=None, plot_workers=None, shard_out=None, merge_shards=False,
+split_by=(), split_workers=None, from_data=None, filename=None, make_data_dir=False, no_data_dir=False, data_format=None, zip_data_dir=False, gzip_report=False, asset_dir=None, asset_url=None, asset_gzip=False, force=False,
+ignore_symlinks=False, export_plots=False, plots_flat=False, plots_interactive=False, lint=False, profile_runtime=False,
+make_pdf=False, no_megaqc_upload=False, config_file=(), cl_config=(), verbose=0, quiet=False, **kwargs):
+    """ Run MultiQC. Takes the same arguments as the command line options,
+    with any extra plugin options as keyword arguments. cl_config can hold
+    config dicts as well as YAML strings.
+
+    Returns a dict with the exit code ('sys_exit_code'), and the paths of the
+    report ('report'), data directory ('data_dir') and plots directory
+    ('plots_dir'), which are None if they weren't made.
+
+    Each run has its own config and report (see utils/run_state.py), so
+    runs in different threads don't share them. When the run finishes, its
+    report data is in multiqc.utils.report until another run finishes.
+    """
+    run_args = dict(locals())
+
+    # Set up logging level
+    loglevel = log.LEVELS.get(min(verbose,1), "INFO")
+    if quiet:
+        loglevel = 'WARNING'
+    log.init_log(logger, loglevel=loglevel)
+
+    # Load config files
+    plugin_hooks.mqc_trigger('before_config')
+    config.mqc_load_userconfig(config_file)
+    plugin_hooks.mqc_trigger('config_loaded')
+
+    # Command-line config YAML
+    if len(cl_config) > 0:
+        for c in cl_config:
+            if isinstance(c, dict):
+                config.mqc_add_config(c)
+            else:
+                config.mqc_cl_config([c])
+
+    # Log the command used to launch MultiQC
+    report.multiqc_command = " ".join(sys.argv)
+    logger.debug("Command used: {}".format(report.multiqc_command))
+
+    # Check that we're running the latest version of MultiQC
+    if config.no_version_check is not True:
+        try:
+            response = urlopen('http://multiqc.info/version.php?v={}'.format(config.short_version), timeout=5)
+            remote_version = response.read().decode('utf-8').strip()
+            if version.StrictVersion(re.sub('[^0-9\.]','', remote_version)) > version.StrictVersion(re.sub('[^0-9\.]','', config.short_version)):
+                logger.warn('MultiQC Version {} now available!'.format(remote_version))
+            else:
+                logger.debug('Latest MultiQC version is {}'.format(remote_version))
+        except Exception as e:
+            logger.debug('Could not connect to multiqc.info for version check: {}'.format(e))
+
+    # Set up key variables (overwrite config vars from command line)
+    if template is not None:
+        config.template = template
+    if title is not None:
+        config.title = title
+    if report_comment is not None:
+        config.report_comment = report_comment
+    if dirs is True:
+        config.prepend_dirs = dirs
+    if dirs_depth is not None:
+        config.prepend_dirs = True
+        config.prepend_dirs_depth = dirs_depth
+    config.analysis_dir = analysis_dir
+    if outdir is not None:
+        config.output_dir = outdir
+    if no_clean_sname:
+        config.fn_clean_sample_names = False
+        logger.info("Not cleaning sample names")
+    if make_data_dir:
+        config.make_data_dir = True
+    if no_data_dir:
+        config.make_data_dir = False
+    if force:
+        config.force = True
+    if ignore_symlinks:
+        config.ignore_symlinks = True
+    if search_threads is not None:
+        config.search_threads = search_threads
+    if search_cache:
+        config.search_cache = True
+    if incremental:
+        config.search_cache = True
+        config.parse_cache = True
+    if module_workers is not None:
+        config.module_workers = module_workers
+    if plot_workers is not None:
+        config.plot_workers = plot_workers
+    if len(analysis_dir) == 0 and from_data is None:
+        raise click.UsageError('Missing argument "<analysis directory>".')
+    if shard_out is not None:
+        if merge_shards:
+            raise click.BadParameter("--shard-out can't be used with --merge", param_hint='--shard-out')
+        config.shard_out = shard_out
+    if len(split_by) > 0:
+        config.split_by = list(split_by)
+    if split_workers is not None:
+        config.split_workers = split_workers
+    if len(config.split_by) > 0:
+        if config.shard_out or from_data is not None or filename == 'stdout':
+            raise click.BadParameter("--split-by can't be used with --shard-out, --from-data or --filename stdout", param_hint='--split-by')
+        for spec in config.split_by:
+            try:
+                split.parse_spec(spec)
+            except (ValueError, re.error) as e:
+                raise click.BadParameter(str(e), param_hint='--split-by')
+        # Save the module results to a shard, to make each report from
+        split_dir = tempfile.mkdtemp()
+        config.shard_out = os.path.join(split_dir, 'multiqc_split.mqc')
+    if zip_data_dir:
+        config.zip_data_dir = True
+    if gzip_report:
+        config.gzip_report = True
+    if asset_dir is not None:
+        config.asset_dir = asset_dir
+    if asset_url is not None:
+        config.asset_url = asset_url
+    if asset_gzip:
+        config.asset_gzip = True
+    if config.asset_url and not config.asset_dir:
+        raise click.BadParameter("--asset-url needs --asset-dir, for the files to be written to", param_hint='--asset-url')
+    if config.asset_dir:
+        config.asset_dir = os.path.abspath(os.path.expanduser(config.asset_dir))
+    if data_format is not None:
+        config.data_format = data_format
+    if export_plots:
+        config.export_plots = True
+    if plots_flat:
+        config.plots_force_flat = True
+    if plots_interactive:
+        config.plots_force_interactive = True
+    if lint:
+        config.lint = True
+        lint_helpers.run_tests()
+    if profile_runtime:
+        config.profile_runtime = True
+    if make_pdf:
+        config.template = 'simple'
+    if no_megaqc_upload:
+        config.megaqc_upload = False
+    else:
+        config.megaqc_upload = True
+    if sample_names:
+        config.load_sample_names(sample_names)
+    if module_tag is not None:
+        config.module_tag = module_tag
+    config.kwargs = kwargs # Plugin command line options
+
+    plugin_hooks.mqc_trigger('execution_start')
+
+    logger.info("This is MultiQC v{}".format(__version__))
+    logger.debug("Command     : {}".format(' '.join(sys.argv)))
+    logger.debug("Working dir : {}".format(os.getcwd()))
+    if make_pdf:
+        logger.info('--pdf specified. Using non-interactive HTML template.')
+    logger.info("Template    : {}".format(config.template))
+    if lint:
+        logger.info('--lint specified. Being strict with validation.')
+
+    # Add files if --file-list option is given
+    if file_list:
+        if len(analysis_dir) > 1:
+            raise ValueError("If --file-list is giving, analysis_dir should have only one plain text file.")
+        config.analysis_dir = []
+        with (open(analysis_dir[0])) as in_handle:
+            for line in in_handle:
+                if os.path.exists(line.strip()):
+                    path = os.path.abspath(line.strip())
+                    config.analysis_dir.append(path)
+        if len(config.analysis_dir) == 0:
+            logger.error("No files or directories were added from {} using --file-list option.".format(analysis_dir[0]))
+            logger.error("Please, check that {} contains correct paths.".format(analysis_dir[0]))
+            raise ValueError("Any files or directories to be searched.")
+
+    if len(ignore) > 0:
+        logger.debug("Ignoring files, directories and paths that match: {}".format(", ".join(ignore)))
+        config.fn_ignore_files.extend(ignore)
+        config.fn_ignore_dirs.extend(ignore)
+        config.fn_ignore_paths.extend(ignore)
+    if len(ignore_samples) > 0:
+        logger.debug("Ignoring sample names that match: {}".format(", ".join(ignore_samples)))
+        config.sample_names_ignore.extend(ignore_samples)
+    if filename == 'stdout':
+        config.output_fn = sys.stdout
+        logger.info("Printing report to stdout")
+    else:
+        if title is not None and filename is None:
+            filename = re.sub('[^\w\.-]', '', re.sub('[-\s]+', '-', title) ).strip()
+            filename += '_multiqc_report'
+        if filename is not None:
+            if filename.endswith('.html'):
+                filename = filename[:-5]
+            config.output_fn_name = filename
+            config.data_dir_name = '{}_data'.format(filename)
+        if not config.output_fn_name.endswith('.html'):
+            config.output_fn_name = '{}.html'.format(config.output_fn_name)
+
+    # Print some status updates
+    if config.title is not None:
+        logger.info("Report title: {}".format(config.title))
+    if dirs:
+        logger.info("Prepending directory to sample names")
+    for d in config.analysis_dir:
+        logger.info("Searching '{}'".format(d))
+
+    # Prep module configs
+    config.top_modules = [ m if type(m) is dict else {m:{}} for m in config.top_modules ]
+    config.module_order = [ m if type(m) is dict else {m:{}} for m in config.module_order ]
+    mod_keys = [ list(m.keys())[0] for m in config.module_order ]
+
+    # Lint the module configs
+    if config.lint:
+        for m in config.avail_modules.keys():
+            if m not in mod_keys:
+                errmsg = "LINT: Module '{}' not found in config.module_order".format(m)
+                logger.error(errmsg)
+                report.lint_errors.append(errmsg)
+            else:
+                for mo in config.module_order:
+                    if m != 'custom_content' and m in mo.keys() and 'module_tag' not in mo[m]:
+                        errmsg = "LINT: Module '{}' in config.module_order did not have 'module_tag' config".format(m)
+                        logger.error(errmsg)
+                        report.lint_errors.append(errmsg)
+
+    # Get the avaiable tags to decide which modules to run.
+    modules_from_tags = set()
+    if config.module_tag is not None:
+        tags = config.module_tag
+        for m in config.module_order:
+            module_name = list(m.keys())[0] # only one name in each dict
+            for tag in tags:
+                for t in m[module_name].get('module_tag', []):
+                    if tag.lower() == t.lower():
+                        modules_from_tags.add(module_name)
+
+    # Get the list of modules we want to run, in the order that we want them
+    run_modules = [ m for m in config.top_modules if list(m.keys())[0] in config.avail_modules.keys() ]
+    run_modules.extend( [ {m:{}} for m in config.avail_modules.keys() if m not in mod_keys and m not in run_modules ] )
+    run_modules.extend( [ m for m in config.module_order if list(m.keys())[0] in config.avail_modules.keys() and list(m.keys())[0] not in [list(rm.keys())[0] for rm in run_modules] ] )
+
+    if module:
+        run_modules = [ m for m in run_modules if list(m.keys())[0] in module ]
+        logger.info('Only using modules {}'.format(', '.join(module)))
+    elif modules_from_tags:
+        run_modules = [ m for m in run_modules if list(m.keys())[0] in modules_from_tags ]
+        logger.info("Only using modules with '{}' tag".format(', '.join(module_tag)))
+    if exclude:
+        logger.info("Excluding modules '{}'".format("', '".join(exclude)))
+        if 'general_stats' in exclude:
+            config.skip_generalstats = True
+            exclude = tuple(x for x in exclude if x != 'general_stats')
+        run_modules = [m for m in run_modules if list(m.keys())[0] not in exclude]
+    if len(run_modules) == 0:
+        logger.critical('No analysis modules specified!')
+        return run_result(1)
+    run_module_names = [ list(m.keys())[0] for m in run_modules ]
+    logger.debug("Analysing modules: {}".format(', '.join(run_module_names)))
+
+    # Create the temporary working directories
+    tmp_dir = tempfile.mkdtemp()
+    logger.debug('Using temporary directory for creating report: {}'.format(tmp_dir))
+    config.data_tmp_dir = os.path.join(tmp_dir, 'multiqc_data')
+    if filename != 'stdout' and config.make_data_dir == True:
+        config.data_dir = config.data_tmp_dir
+        os.makedirs(config.data_dir)
+    else:
+        config.data_dir = None
+    config.plots_tmp_dir = os.path.join(tmp_dir, 'multiqc_plots')
+    if filename != 'stdout' and config.export_plots == True:
+        config.plots_dir = config.plots_tmp_dir
+        os.makedirs(config.plots_dir)
+
+    # Load the template. Templates can set config when they are imported,
+    # so import them again if they were used by an earlier run
+    template_mod = config.avail_templates[config.template].load()
+    if config.template in loaded_templates:
+        template_mod = reload_module(template_mod)
+    loaded_templates.add(config.template)
+
+    # Add an output subdirectory if specified by template
+    try:
+        config.output_dir = os.path.join(config.output_dir, template_mod.output_subdir)
+    except AttributeError:
+        pass # No subdirectory variable given
+
+
+    # Add custom content section names
+    try:
+        if 'custom_content' in run_module_names:
+            run_module_names.extend(config.custom_data.keys())
+    except AttributeError:
+        pass # custom_data not in config
+
+    # Get the list of files to search, unless results are coming from earlier runs
+    search_files = not merge_shards and from_data is None
+    if search_files:
+        report.get_filelist(run_module_names)
+
+    # Load cached parsing results
+    if config.parse_cache and search_files:
+        try:
+            report.parse_cache = parse_cache.ParseCache()
+        except (sqlite3.Error, IOError, OSError) as e:
+            logger.warning("Could not open parse cache, parsing all files: {}".format(e))
+
+    # Don't import modules that didn't find any files
+    if config.skip_unmatched_modules and search_files:
+        run_modules = module_runner.modules_with_files(run_modules)
+
+    # Run the modules!
+    plugin_hooks.mqc_trigger('before_modules')
+    report.modules_output = list()
+    sys_exit_code = 0
+    if merge_shards:
+        # Results come from the shard files instead
+        module_results = [ ([m], 0) for m in shards.merge_shards(analysis_dir, getattr(config, 'split_samples', None)) ]
+    elif from_data is not None:
+        # Results come from the data file of an earlier run
+        module_results = [ ([m], 0) for m in megaqc.multiqc_load_json(from_data, report) ]
+    elif config.module_workers > 1 and len(run_modules) > 1:
+        module_results = module_runner.run_modules_parallel(run_modules, config.module_workers)
+    else:
+        module_results = (module_runner.run_module(mod_dict) for mod_dict in run_modules)
+    module_results = profiling.profile_iter(module_results, 'modules', 'all modules')
+    try:
+        for output, exit_code in module_results:
+            sys_exit_code = max(sys_exit_code, exit_code)
+            for m in output:
+                report.modules_output.append(m)
+            if len(output) == 0:
+                continue
+
+            # Copy over css & js files if requested by the theme
+            try:
+                for to, path in report.modules_output[-1].css.items():
+                    copy_to = os.path.join(tmp_dir, to)
+                    os.makedirs(os.path.dirname(copy_to))
+                    shutil.copyfile(path, copy_to)
+            except OSError as e:
+                if e.errno == errno.EEXIST:
+                    pass
+                else:
+                    raise
+            except AttributeError:
+                pass
+            try:
+                for to, path in report.modules_output[-1].js.items():
+                    copy_to = os.path.join(tmp_dir, to)
+                    os.makedirs(os.path.dirname(copy_to))
+                    shutil.copyfile(path, copy_to)
+            except OSError as e:
+                if e.errno == errno.EEXIST:
+                    pass
+                else:
+                    raise
+            except AttributeError:
+                pass
+
+    except KeyboardInterrupt:
+        shutil.rmtree(tmp_dir)
+        logger.critical(
+                "User Cancelled Execution!\n{eq}\n{tb}{eq}\n"
+                .format(eq=('='*60), tb=traceback.format_exc())+
+                "User Cancelled Execution!\nExiting MultiQC...")
+        return run_result(1)
+
+    module_runner.log_time_saved()
+
+    # Draw the flat plots that were left for the plot workers
+    with profiling.timer('plot', 'flat plots'):
+        flat_plots.draw_pending(report.modules_output)
+
+    # Save newly parsed results to the cache
+    if report.parse_cache is not None:
+        try:
+            report.parse_cache.save()
+        except sqlite3.Error as e:
+            logger.warning("Could not save parse cache: {}".format(e))
+
+    # Save the results to a shard file to merge later, instead of making a report
+    if config.shard_out:
+        shards.write_shard(config.shard_out)
+        shutil.rmtree(tmp_dir)
+        if len(config.split_by) > 0:
+            # Make the report for all samples and for each group from the shard
+            try:
+                groups = split.sample_groups(config.split_by, shards.read_shard(config.shard_out))
+                result = split.make_reports(run, run_args, config.shard_out, groups, config.split_workers)
+            finally:
+                shutil.rmtree(split_dir)
+            result['sys_exit_code'] = max(result['sys_exit_code'], sys_exit_code)
+            return result
+        logger.info("MultiQC complete")
+        return run_result(sys_exit_code)
+
+    # Did we find anything?
+    if len(report.modules_output) == 0:
+        logger.warn("No analysis results found. Cleaning up..")
+        shutil.rmtree(tmp_dir)
+        logger.info("MultiQC complete")
+        # Return with an error code if a module broke
+        return run_result(sys_exit_code)
+
+    # Sort the report sections if we have a config
+    if len(getattr(config, 'report_section_order', {})) > 0:
+        section_id_order = {}
+        idx = 10
+        for mod in reversed(report.modules_output):
+            section_id_order[mod.anchor] = idx
+            idx += 10
+        for anchor, ss in config.report_section_order.items():
+            if anchor not in section_id_order.keys():
+                continue
+            if ss.get('order') is not None:
+                section_id_order[anchor] = ss['order']
+            if ss.get('after') in section_id_order.keys():
+                section_id_order[anchor] = section_id_order[ss['after']] + 1
+            if ss.get('before') in section_id_order.keys():
+                section_id_order[anchor] = section_id_order[ss['before']] - 1
+        sorted_ids = sorted(section_id_order, key=section_id_order.get)
+        report.modules_output = [ mod for i in reversed(sorted_ids) for mod in report.modules_output if mod.anchor == i ]
+
+    plugin_hooks.mqc_trigger('after_modules')
+
+    # Remove empty data sections from the General Stats table
+    empty_keys = [i for i, d in enumerate(report.general_stats_data[:]) if len(d) == 0]
+    empty_keys.sort(reverse=True)
+    for i in empty_keys:
+        del report.general_stats_data[i]
+        del report.general_stats_headers[i]
+    # Add general-stats IDs to table row headers
+    for idx, h in enumerate(report.general_stats_headers):
+        for k in h.keys():
+            if 'rid' not in h[k]:
+                h[k]['rid'] = re.sub(r'\W+', '_', k).strip().strip('_')
+            ns_html = re.sub(r'\W+', '_', h[k]['namespace']).strip().strip('_').lower()
+            report.general_stats_headers[idx][k]['rid'] = report.save_htmlid('mqc-generalstats-{}-{}'.format(ns_html, h[k]['rid']))
+    # Generate the General Statistics HTML & write to file
+    if len(report.general_stats_data) > 0:
+        pconfig = {
+            'id': 'general_stats_table',
+            'table_title': 'General Statistics',
+            'save_file': True,
+            'raw_data_fn':'multiqc_general_stats'
+        }
+        # The column arrays are made from the data now, after any changes by modules or plugins
+        report.general_stats_html = table.plot(report.general_stats_data, report.general_stats_headers, pconfig)
+    else:
+        config.skip_generalstats = True
+
+    # Add a section with the run time of each step so far
+    if config.profile_runtime and config.profile_runtime_section:
+        report.modules_output.append(profiling.add_report_section())
+
+    # Write the report sources to disk
+    if config.data_dir is not None:
+        report.data_sources_tofile()
+    # Compress the report plot JSON data
+    logger.info("Compressing plot data")
+    plot_data = report.plot_data
+    sample_names = {}
+    if config.plot_data_sample_ids:
+        # Save each sample name once, with the plots referring to it by index
+        s_names, plot_data = report.intern_sample_names(report.plot_data)
+        sample_names = {'mqc_sample_names': s_names}
+    if config.lazy_plot_data:
+        # Compress each plot separately, so that the browser only decodes plots when shown
+        report.plot_compressed_json = report.compress_json(sample_names)
+        for plot_id, pdata in plot_data.items():
+            report.plot_compressed_lazy[plot_id] = report.compress_json(pdata)
+    else:
+        report.plot_compressed_json = report.compress_json(dict(plot_data, **sample_names))
+
+    plugin_hooks.mqc_trigger('before_report_generation')
+
+    # Data Export / MegaQC integration - save report data to file or send report data to an API endpoint
+    if (config.data_dump_file or config.megaqc_url) and config.megaqc_upload:
+        multiqc_json_dump = megaqc.multiqc_dump_json(report)
+        if config.data_dump_file:
+            # Also save what's needed to make the report again with --from-data
+            multiqc_data = dict(multiqc_json_dump, **megaqc.multiqc_render_json(report))
+            util_functions.write_data_file(multiqc_data, 'multiqc_data', False, 'json')
+        if config.megaqc_url:
+            megaqc.multiqc_api_post(multiqc_json_dump)
+
+    # Make the final report path & data directories
+    if filename != 'stdout':
+        if config.gzip_report:
+            config.output_fn_name = '{}.gz'.format(config.output_fn_name)
+        config.output_fn = os.path.join(config.output_dir, config.output_fn_name)
+        config.data_dir = os.path.join(config.output_dir, config.data_dir_name)
+        # Check for existing reports and remove if -f was specified
+        if os.path.exists(config.output_fn) or (config.make_data_dir and os.path.exists(config.data_dir)):
+            if config.force:
+                if os.path.exists(config.output_fn):
+                    logger.warning("Deleting    : {}   (-f was specified)".format(os.path.relpath(config.output_fn)))
+                    os.remove(config.output_fn)
+                if config.make_data_dir and os.path.exists(config.data_dir):
+                    logger.warning("Deleting    : {}   (-f was specified)".format(os.path.relpath(config.data_dir)))
+                    shutil.rmtree(config.data_dir)
+            else:
+                # Set up the base names of the report and the data dir
+                report_num = 1
+                report_base, report_ext = os.path.splitext(config.output_fn_name)
+                if report_ext == '.gz':
+                    report_base, report_ext = os.path.splitext(report_base)[0], '.html.gz'
+                dir_base = os.path.basename(config.data_dir)
+
+                # Iterate through appended numbers until we find one that's free
+                while os.path.exists(config.output_fn) or (config.make_data_dir and os.path.exists(config.data_dir)):
+                    config.output_fn = os.path.join(config.output_dir, "{}_{}{}".format(report_base, report_num, report_ext) )
+                    config.data_dir = os.path.join(config.output_dir, "{}_{}".format(dir_base, report_num) )
+                    report_num += 1
+
+                config.output_fn_name = os.path.basename(config.output_fn)
+                config.data_dir_name = os.path.basename(config.data_dir)
+                logger.warning("Previous MultiQC output found! Adjusting filenames..")
+                logger.warning("Use -f or --force to overwrite existing reports instead")
+
+        # Make directories for report if needed
+        if not os.path.exists(os.path.dirname(config.output_fn)):
+            os.makedirs(os.path.dirname(config.output_fn))
+        logger.info("Report      : {}".format(os.path.relpath(config.output_fn)))
+
+        if config.make_data_dir == False:
+            logger.info("Data        : None")
+        else:
+            # Make directories for data_dir
+            logger.info("Data        : {}".format(os.path.relpath(config.data_dir)))
+            if not os.path.exists(config.data_dir):
+                os.makedirs(config.data_dir)
+            # Modules have run, so data directory should be complete by now. Move its contents.
+            for f in os.listdir(config.data_tmp_dir):
+                fn = os.path.join(config.data_tmp_dir, f)
+                logger.debug("Moving data file from '{}' to '{}'".format(fn, config.data_dir))
+                shutil.move(fn, config.data_dir)
+
+        # Copy across the static plot images if requested
+        if config.export_plots:
+            config.plots_dir = os.path.join(config.output_dir, config.plots_dir_name)
+            if os.path.exists(config.plots_dir):
+                if config.force:
+                    logger.warning("Deleting    : {}   (-f was specified)".format(os.path.relpath(config.plots_dir)))
+                    shutil.rmtree(config.plots_dir)
+                else:
+                    logger.error("Output directory {} already exists.".format(config.plots_dir))
+                    logger.info("Use -f or --force to overwrite existing reports")
+                    shutil.rmtree(tmp_dir)
+                    return run_result(1)
+            os.makedirs(config.plots_dir)
+            logger.info("Plots       : {}".format(os.path.relpath(config.plots_dir)))
+
+            # Modules have run, so plots directory should be complete by now. Move its contents.
+            for f in os.listdir(config.plots_tmp_dir):
+                fn = os.path.join(config.plots_tmp_dir, f)
+                logger.debug("Moving plots directory from '{}' to '{}'".format(fn, config.plots_dir))
+                shutil.move(fn, config.plots_dir)
+
+    plugin_hooks.mqc_trigger('before_template')
+
+    # Load the report template, with the parent template files if a child theme
+    try:
+        bundle = template_bundle.get_bundle(config.template, template_mod)
+        j_template = bundle.env.get_template(template_mod.base_fn)
+    except:
+        raise IOError ("Could not load {} template file '{}'".format(config.template, template_mod.base_fn))
+
+    # Use jinja2 to render the template, writing each part to the report as it is rendered.
+    # Rendering and writing are timed separately, so writing to slow disks shows up on its own.
+    config.analysis_dir = [os.path.realpath(d) for d in config.analysis_dir]
+    try:
+        with util_functions.open_report(config.output_fn, config.gzip_report) as f:
+            report_stream = j_template.stream(report=report, config=config)
+            report_stream.enable_buffering()
+            for part in profiling.profile_iter(report_stream, 'render', 'jinja'):
+                with profiling.timer('write', 'report'):
+                    f.write(part.encode('utf-8'))
+            f.write(b'\n')
+    except IOError as e:
+        raise IOError ("Could not print report to '{}' - {}".format(config.output_fn, IOError(e)))
+    bundle.save()
+    if filename != 'stdout':
+        # Copy over files if requested by the theme
+        bundle.copy_files(getattr(template_mod, 'copy_files', []), os.path.dirname(config.output_fn))
+
+    # Clean up temporary directory
+    shutil.rmtree(tmp_dir)
+
+    # Save the run time of each step
+    if config.profile_runtime and config.make_data_dir and filename != 'stdout':
+        util_functions.write_data_file(profiling.runtime_data(), 'multiqc_runtime', False, 'json')
+
+    # Zip the data directory if requested
+    if config.zip_data_dir and config.data_dir is not None:
+        shutil.make_archive(config.data_dir, 'zip', config.data_dir)
+        shutil.rmtree(config.data_dir)
+
+    # Try to create a PDF if requested
+    if make_pdf and config.gzip_report:
+        logger.error("Can't create a PDF from a gzipped report - run again without --gzip-report")
+    elif make_pdf:
+        try:
+            pdf_fn_name = config.output_fn.replace('.html', '.pdf')
+            pandoc_call = [
+                'pandoc',
+                '--standalone',
+                config.output_fn,
+                '--output', pdf_fn_name,
+                '--pdf-engine=xelatex',
+                '-V', 'documentclass=article',
+                '-V', 'geometry=margin=1in',
+                '-V', 'title='
+            ]
+            if config.pandoc_template is not None:
+                pandoc_call.append('--template={}'.format(config.pandoc_template))
+            logger.debug("Attempting Pandoc conversion to PDF with following command:\n{}".format(' '.join(pandoc_call)))
+            pdf_exit_code = subprocess.call(pandoc_call)
+            if pdf_exit_code != 0:
+                logger.error("Error creating PDF! Pandoc returned a non-zero exit code.")
+            else:
+                logger.info("PDF Report  : {}".format(pdf_fn_name))
+        except OSError as e:
+            if e.errno == os.errno.ENOENT:
+                logger.error('Error creating PDF - pandoc not found. Is it installed? http://pandoc.org/')
+            else:
+                logger.error("Error creating PDF! Something went wrong when creating the PDF\n"+
+                    ('='*60)+"\n{}\n".format(traceback.format_exc()) + ('='*60))
+
+    plugin_hooks.mqc_trigger('execution_finish')
+
+    logger.info("MultiQC complete")
+
+    if lint and len(report.lint_errors) > 0:
+        logger.error("Found {} linting errors!\n{}".format(len(report.lint_errors), "\n".join(report.lint_errors)))
+        sys_exit_code = 1
+
+    # Move the log file into the data directory
+    log.move_tmp_log(logger)
+
+    # Return with an error code if a module broke
+    if filename == 'stdout':
+        return run_result(sys_exit_code)
+    data_dir = None
+    if config.make_data_dir:
+        data_dir = '{}.zip'.format(config.data_dir) if config.zip_data_dir else config.data_dir
+    return run_result(sys_exit_code, config.output_fn, data_dir, config.plots_dir if config.export_plots else None)
+
+
+def run_result(sys_exit_code, report_fn=None, data_dir=None, plots_dir=None):
+    """ The results returned by run() """
+    return {
+        'sys_exit_code': sys_exit_code,
+        'report': report_fn,
+        'data_dir': data_dir,
+        'plots_dir': plots_dir
+    }
+
+
+def modify_usage_error(main_command):
+    ''' Function to modify the default click error handling.
+    Used here to tell the user about how to find additional help.
+    With thanks to this Stack Overflow answer: http://stackoverflow.com/a/43922088/713980
+    :param main_command: top-level group or command object constructed by click wrapper
+    :return: None
+    '''
+    def show(self, file=None):
+        if file is None:
+            file = click._compat.get_text_stderr()
+        color = None
+        if self.ctx is not None:
+            color = self.ctx.color
+            click.utils.echo(self.ctx.get_usage() + '\n', file=file, color=color)
+        click.utils.echo('Error: %s\n\nThis is MultiQC v{}\n\nFor more help, run \'multiqc --help\' or visit http://multiqc.info\n'.format(__version__) % self.format_message(), file=file, color=color)
+    click.exceptions.UsageError.show = show
+
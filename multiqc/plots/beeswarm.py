@@ -5,13 +5,15 @@
 import logging
 import random
 
-from multiqc.utils import config, report
+from multiqc.utils import config, report, profiling, shards
 from multiqc.plots import table_object
 
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@profiling.profile('plot')
+@shards.record_plot('beeswarm')
 def plot (data, headers=None, pconfig=None):
     """ Helper HTML for a beeswarm plot.
     :param data: A list of data dicts
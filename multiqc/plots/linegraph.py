@@ -4,39 +4,49 @@
 
 from __future__ import print_function, division
 from collections import OrderedDict
-import base64
 import io
 import logging
 import os
 import random
 import sys
 
-from multiqc.utils import config, report, util_functions
+from multiqc.utils import config, report, util_functions, profiling, downsample, shards, flat_plots
 logger = logging.getLogger(__name__)
 
-try:
-    # Import matplot lib but avoid default X environment
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-except Exception as e:
-    # MatPlotLib can break in a variety of ways. Fake an error message and continue without it if so.
-    # The lack of the library will be handled when plots are attempted
-    print("##### ERROR! MatPlotLib library could not be loaded!    #####", file=sys.stderr)
-    print("##### Flat plots will instead be plotted as interactive #####", file=sys.stderr)
-    print(e)
+# Import MatPlotLib when the first flat plot is made, as it is slow to load
+_plt = None
+def get_pyplot():
+    global _plt
+    if _plt is None:
+        try:
+            # Import matplot lib but avoid default X environment
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            _plt = plt
+        except Exception as e:
+            # MatPlotLib can break in a variety of ways. Fake an error message and continue without it if so.
+            # The lack of the library will be handled when plots are attempted
+            print("##### ERROR! MatPlotLib library could not be loaded!    #####", file=sys.stderr)
+            print("##### Flat plots will instead be plotted as interactive #####", file=sys.stderr)
+            print(e)
+            _plt = False
+    if _plt is False:
+        raise ImportError("MatPlotLib could not be loaded")
+    return _plt
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
 # Load the template so that we can access its configuration
 # Do this lazily to mitigate import-spaghetti when running unit tests
-_template_mod = None
+_template_mods = dict()
 def get_template_mod():
-    global _template_mod
-    if not _template_mod:
-        _template_mod = config.avail_templates[config.template].load()
-    return _template_mod
+    if config.template not in _template_mods:
+        _template_mods[config.template] = config.avail_templates[config.template].load()
+    return _template_mods[config.template]
 
+@profiling.profile('plot')
+@shards.record_plot('linegraph')
 def plot (data, pconfig=None):
     """ Plot a line graph with X,Y data.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -57,15 +67,21 @@ def plot (data, pconfig=None):
     if type(data) is not list:
         data = [data]
 
-    # Smooth dataset if requested in config
-    if pconfig.get('smooth_points', None) is not None:
+    # Smooth dataset if requested in config, or if any series has too many points
+    smooth_points = pconfig.get('smooth_points', None)
+    if smooth_points is None and config.max_linegraph_points and not pconfig.get('categories'):
+        if any(len(sd) > config.max_linegraph_points for d in data for sd in d.values()):
+            smooth_points = config.max_linegraph_points
+            logger.debug("Plot '{}' has series with more than {} points, downsampling".format(pconfig.get('id'), smooth_points))
+    if smooth_points is not None:
         sumcounts = pconfig.get('smooth_points_sumcounts', True)
+        method = pconfig.get('smooth_points_method', config.smooth_points_method)
         for i, d in enumerate(data):
             if type(sumcounts) is list:
                 sumc = sumcounts[i]
             else:
                 sumc = sumcounts
-            data[i] = smooth_line_data(d, pconfig['smooth_points'], sumc)
+            data[i] = smooth_line_data(d, smooth_points, sumc, method)
 
     # Add sane plotting config defaults
     for idx, yp in enumerate(pconfig.get('yPlotLines', [])):
@@ -224,6 +240,7 @@ def matplotlib_linegraph (plotdata, pconfig=None):
     encoded image within HTML or writes the plot and links to it. Should be called by
     plot_bargraph, which properly formats the input data.
     """
+
     if pconfig is None:
         pconfig = {}
 
@@ -250,10 +267,6 @@ def matplotlib_linegraph (plotdata, pconfig=None):
           '(see the <a href="http://multiqc.info/docs/#flat--interactive-plots" target="_blank">docs</a>).</small></p>'
     html += '<div class="mqc_mplplot_plotgroup" id="{}">'.format(pconfig['id'])
 
-    # Same defaults as HighCharts for consistency
-    default_colors = ['#7cb5ec', '#434348', '#90ed7d', '#f7a35c', '#8085e9',
-                      '#f15c80', '#e4d354', '#2b908f', '#f45b5b', '#91e8e1']
-
     # Buttons to cycle through different datasets
     if len(plotdata) > 1 and not config.simple_output:
         html += '<div class="btn-group mpl_switch_group mqc_mplplot_bargraph_switchds">\n'
@@ -306,160 +319,150 @@ def matplotlib_linegraph (plotdata, pconfig=None):
         else:
             util_functions.write_data_file(fdata, pid)
 
-        # Set up figure
-        fig = plt.figure(figsize=(14, 6), frameon=False)
-        axes = fig.add_subplot(111)
+        # Should this plot be hidden on report load?
+        hidediv = ''
+        if pidx > 0:
+            hidediv = ' style="display:none;"'
 
-        # Go through data series
-        for idx, d in enumerate(pdata):
+        # Draw the plot, or leave it to be drawn by a plot worker
+        src = flat_plots.figure_src(_linegraph_figure, (pdata, pconfig, pidx), pid)
+        html += '<div class="mqc_mplplot" id="{}"{}><img src="{}" /></div>'.format(pid, hidediv, src)
 
-            # Default colour index
-            cidx = idx
-            while cidx >= len(default_colors):
-                cidx -= len(default_colors)
 
-            # Line style
-            linestyle = 'solid'
-            if d.get('dashStyle', None) == 'Dash':
-                linestyle = 'dashed'
+    # Close wrapping div
+    html += '</div>'
 
-            # Reformat data (again)
-            try:
-                axes.plot([x[0] for x in d['data']], [x[1] for x in d['data']], label=d['name'], color=d.get('color', default_colors[cidx]), linestyle=linestyle, linewidth=1, marker=None)
-            except TypeError:
-                # Categorical data on x axis
-                axes.plot(d['data'], label=d['name'], color=d.get('color', default_colors[cidx]), linewidth=1, marker=None)
+    report.num_mpl_plots += 1
 
-        # Tidy up axes
-        axes.tick_params(labelsize=8, direction='out', left=False, right=False, top=False, bottom=False)
-        axes.set_xlabel(pconfig.get('xlab', ''))
-        axes.set_ylabel(pconfig.get('ylab', ''))
+    return html
 
-        # Dataset specific y label
-        try:
-            axes.set_ylabel(pconfig['data_labels'][pidx]['ylab'])
-        except:
-            pass
 
-        # Axis limits
-        default_ylimits = axes.get_ylim()
-        ymin = default_ylimits[0]
-        if 'ymin' in pconfig:
-            ymin = pconfig['ymin']
-        elif 'yFloor' in pconfig:
-            ymin = max(pconfig['yFloor'], default_ylimits[0])
-        ymax = default_ylimits[1]
-        if 'ymax' in pconfig:
-            ymax = pconfig['ymax']
-        elif 'yCeiling' in pconfig:
-            ymax = min(pconfig['yCeiling'], default_ylimits[1])
-        if (ymax - ymin) < pconfig.get('yMinRange', 0):
-            ymax = ymin + pconfig['yMinRange']
-        axes.set_ylim((ymin, ymax))
-
-        # Dataset specific ymax
-        try:
-            axes.set_ylim((ymin, pconfig['data_labels'][pidx]['ymax']))
-        except:
-            pass
+def _linegraph_figure(pdata, pconfig, pidx):
+    """ Make the MatPlotLib figure for one line graph dataset """
+    plt = get_pyplot()
 
-        default_xlimits = axes.get_xlim()
-        xmin = default_xlimits[0]
-        if 'xmin' in pconfig:
-            xmin = pconfig['xmin']
-        elif 'xFloor' in pconfig:
-            xmin = max(pconfig['xFloor'], default_xlimits[0])
-        xmax = default_xlimits[1]
-        if 'xmax' in pconfig:
-            xmax = pconfig['xmax']
-        elif 'xCeiling' in pconfig:
-            xmax = min(pconfig['xCeiling'], default_xlimits[1])
-        if (xmax - xmin) < pconfig.get('xMinRange', 0):
-            xmax = xmin + pconfig['xMinRange']
-        axes.set_xlim((xmin, xmax))
-
-        # Plot title
-        if 'title' in pconfig:
-            plt.text(0.5, 1.05, pconfig['title'], horizontalalignment='center', fontsize=16, transform=axes.transAxes)
-        axes.grid(True, zorder=10, which='both', axis='y', linestyle='-', color='#dedede', linewidth=1)
-
-        # X axis categories, if specified
-        if 'categories' in pconfig:
-            axes.set_xticks([i for i,v in enumerate(pconfig['categories'])])
-            axes.set_xticklabels(pconfig['categories'])
-
-        # Axis lines
-        xlim = axes.get_xlim()
-        axes.plot([xlim[0], xlim[1]], [0, 0], linestyle='-', color='#dedede', linewidth=2)
-        axes.set_axisbelow(True)
-        axes.spines['right'].set_visible(False)
-        axes.spines['top'].set_visible(False)
-        axes.spines['bottom'].set_visible(False)
-        axes.spines['left'].set_visible(False)
-
-        # Background colours, if specified
-        if 'yPlotBands' in pconfig:
-            xlim = axes.get_xlim()
-            for pb in pconfig['yPlotBands']:
-                axes.barh(pb['from'], xlim[1], height = pb['to']-pb['from'], left=xlim[0], color=pb['color'], linewidth=0, zorder=0, align='edge')
-        if 'xPlotBands' in pconfig:
-            ylim = axes.get_ylim()
-            for pb in pconfig['xPlotBands']:
-                axes.bar(pb['from'], ylim[1], width = pb['to']-pb['from'], bottom=ylim[0], color=pb['color'], linewidth=0, zorder=0, align='edge')
-
-        # Tight layout - makes sure that legend fits in and stuff
-        if len(pdata) <= 15:
-            axes.legend(loc='lower center', bbox_to_anchor=(0, -0.22, 1, .102), ncol=5, mode='expand', fontsize=8, frameon=False)
-            plt.tight_layout(rect=[0,0.08,1,0.92])
-        else:
-            plt.tight_layout(rect=[0,0,1,0.92])
+    # Same defaults as HighCharts for consistency
+    default_colors = ['#7cb5ec', '#434348', '#90ed7d', '#f7a35c', '#8085e9',
+                      '#f15c80', '#e4d354', '#2b908f', '#f45b5b', '#91e8e1']
 
-        # Should this plot be hidden on report load?
-        hidediv = ''
-        if pidx > 0:
-            hidediv = ' style="display:none;"'
+    # Set up figure
+    fig = plt.figure(figsize=(14, 6), frameon=False)
+    axes = fig.add_subplot(111)
 
-        # Save the plot to the data directory if export is requests
-        if config.export_plots:
-            for fformat in config.export_plot_formats:
-                # Make the directory if it doesn't already exist
-                plot_dir = os.path.join(config.plots_dir, fformat)
-                if not os.path.exists(plot_dir):
-                    os.makedirs(plot_dir)
-                # Save the plot
-                plot_fn = os.path.join(plot_dir, '{}.{}'.format(pid, fformat))
-                fig.savefig(plot_fn, format=fformat, bbox_inches='tight')
-
-        # Output the figure to a base64 encoded string
-        if getattr(get_template_mod(), 'base64_plots', True) is True:
-            img_buffer = io.BytesIO()
-            fig.savefig(img_buffer, format='png', bbox_inches='tight')
-            b64_img = base64.b64encode(img_buffer.getvalue()).decode('utf8')
-            img_buffer.close()
-            html += '<div class="mqc_mplplot" id="{}"{}><img src="data:image/png;base64,{}" /></div>'.format(pid, hidediv, b64_img)
-
-        # Save to a file and link <img>
-        else:
-            plot_relpath = os.path.join(config.plots_dir_name, 'png', '{}.png'.format(pid))
-            html += '<div class="mqc_mplplot" id="{}"{}><img src="{}" /></div>'.format(pid, hidediv, plot_relpath)
+    # Go through data series
+    for idx, d in enumerate(pdata):
 
-        plt.close(fig)
+        # Default colour index
+        cidx = idx
+        while cidx >= len(default_colors):
+            cidx -= len(default_colors)
 
+        # Line style
+        linestyle = 'solid'
+        if d.get('dashStyle', None) == 'Dash':
+            linestyle = 'dashed'
 
-    # Close wrapping div
-    html += '</div>'
+        # Reformat data (again)
+        try:
+            axes.plot([x[0] for x in d['data']], [x[1] for x in d['data']], label=d['name'], color=d.get('color', default_colors[cidx]), linestyle=linestyle, linewidth=1, marker=None)
+        except TypeError:
+            # Categorical data on x axis
+            axes.plot(d['data'], label=d['name'], color=d.get('color', default_colors[cidx]), linewidth=1, marker=None)
 
-    report.num_mpl_plots += 1
+    # Tidy up axes
+    axes.tick_params(labelsize=8, direction='out', left=False, right=False, top=False, bottom=False)
+    axes.set_xlabel(pconfig.get('xlab', ''))
+    axes.set_ylabel(pconfig.get('ylab', ''))
 
-    return html
+    # Dataset specific y label
+    try:
+        axes.set_ylabel(pconfig['data_labels'][pidx]['ylab'])
+    except:
+        pass
+
+    # Axis limits
+    default_ylimits = axes.get_ylim()
+    ymin = default_ylimits[0]
+    if 'ymin' in pconfig:
+        ymin = pconfig['ymin']
+    elif 'yFloor' in pconfig:
+        ymin = max(pconfig['yFloor'], default_ylimits[0])
+    ymax = default_ylimits[1]
+    if 'ymax' in pconfig:
+        ymax = pconfig['ymax']
+    elif 'yCeiling' in pconfig:
+        ymax = min(pconfig['yCeiling'], default_ylimits[1])
+    if (ymax - ymin) < pconfig.get('yMinRange', 0):
+        ymax = ymin + pconfig['yMinRange']
+    axes.set_ylim((ymin, ymax))
+
+    # Dataset specific ymax
+    try:
+        axes.set_ylim((ymin, pconfig['data_labels'][pidx]['ymax']))
+    except:
+        pass
+
+    default_xlimits = axes.get_xlim()
+    xmin = default_xlimits[0]
+    if 'xmin' in pconfig:
+        xmin = pconfig['xmin']
+    elif 'xFloor' in pconfig:
+        xmin = max(pconfig['xFloor'], default_xlimits[0])
+    xmax = default_xlimits[1]
+    if 'xmax' in pconfig:
+        xmax = pconfig['xmax']
+    elif 'xCeiling' in pconfig:
+        xmax = min(pconfig['xCeiling'], default_xlimits[1])
+    if (xmax - xmin) < pconfig.get('xMinRange', 0):
+        xmax = xmin + pconfig['xMinRange']
+    axes.set_xlim((xmin, xmax))
+
+    # Plot title
+    if 'title' in pconfig:
+        plt.text(0.5, 1.05, pconfig['title'], horizontalalignment='center', fontsize=16, transform=axes.transAxes)
+    axes.grid(True, zorder=10, which='both', axis='y', linestyle='-', color='#dedede', linewidth=1)
+
+    # X axis categories, if specified
+    if 'categories' in pconfig:
+        axes.set_xticks([i for i,v in enumerate(pconfig['categories'])])
+        axes.set_xticklabels(pconfig['categories'])
+
+    # Axis lines
+    xlim = axes.get_xlim()
+    axes.plot([xlim[0], xlim[1]], [0, 0], linestyle='-', color='#dedede', linewidth=2)
+    axes.set_axisbelow(True)
+    axes.spines['right'].set_visible(False)
+    axes.spines['top'].set_visible(False)
+    axes.spines['bottom'].set_visible(False)
+    axes.spines['left'].set_visible(False)
+
+    # Background colours, if specified
+    if 'yPlotBands' in pconfig:
+        xlim = axes.get_xlim()
+        for pb in pconfig['yPlotBands']:
+            axes.barh(pb['from'], xlim[1], height = pb['to']-pb['from'], left=xlim[0], color=pb['color'], linewidth=0, zorder=0, align='edge')
+    if 'xPlotBands' in pconfig:
+        ylim = axes.get_ylim()
+        for pb in pconfig['xPlotBands']:
+            axes.bar(pb['from'], ylim[1], width = pb['to']-pb['from'], bottom=ylim[0], color=pb['color'], linewidth=0, zorder=0, align='edge')
+
+    # Tight layout - makes sure that legend fits in and stuff
+    if len(pdata) <= 15:
+        axes.legend(loc='lower center', bbox_to_anchor=(0, -0.22, 1, .102), ncol=5, mode='expand', fontsize=8, frameon=False)
+        plt.tight_layout(rect=[0,0.08,1,0.92])
+    else:
+        plt.tight_layout(rect=[0,0,1,0.92])
+
+    return fig, None
 
 
-def smooth_line_data(data, numpoints, sumcounts=True):
+def smooth_line_data(data, numpoints, sumcounts=True, method='first'):
     """
-    Function to take an x-y dataset and use binning to smooth to a maximum number of datapoints.
-    Each datapoint in a smoothed dataset corresponds to the first point in a bin.
+    Function to take an x-y dataset and reduce each sample to a maximum number of datapoints.
+    See multiqc.utils.downsample for the methods that can be used:
+    'lttb' (Largest-Triangle-Three-Buckets), 'minmax' or 'first' (the first point in each bin).
 
-    Examples to show the idea:
+    Examples to show the idea of the 'first' method:
 
     d=[0 1 2 3 4 5 6 7 8 9], numpoints=6
     we want to keep the first and the last element, thus excluding the last element from the binning:
@@ -480,14 +483,6 @@ def smooth_line_data(data, numpoints, sumcounts=True):
     """
     smoothed_data = dict()
     for s_name, d in data.items():
-        # Check that we need to smooth this data
-        if len(d) <= numpoints or len(d) == 0:
-            smoothed_data[s_name] = d
-            continue
-
-        binsize = (len(d) - 1) / (numpoints - 1)
-        first_element_indices = [round(binsize * i) for i in range(numpoints)]
-        smoothed_d = OrderedDict(xy for i, xy in enumerate(d.items()) if i in first_element_indices)
-        smoothed_data[s_name] = smoothed_d
+        smoothed_data[s_name] = downsample.downsample_series(d, numpoints, method)
 
     return smoothed_data
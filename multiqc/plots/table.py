@@ -6,12 +6,14 @@ from collections import defaultdict, OrderedDict
 import logging
 import random
 
-from multiqc.utils import config, report, util_functions, mqc_colour
+from multiqc.utils import config, report, util_functions, mqc_colour, profiling, shards
 from multiqc.plots import table_object, beeswarm
 logger = logging.getLogger(__name__)
 
 letters = 'abcdefghijklmnopqrstuvwxyz'
 
+@profiling.profile('plot')
+@shards.record_plot('table')
 def plot (data, headers=None, pconfig=None):
     """ Return HTML for a MultiQC table.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -4,12 +4,81 @@
 
 from collections import defaultdict, OrderedDict
 import logging
+import numpy as np
 import re
 
 from multiqc.utils import config, report
 
 logger = logging.getLogger(__name__)
 
+class ColumnStore (object):
+    """ Columnar copy of one table dataset ({s_name: {key: value}}). Holds one
+    float64 array per column, with NaN where the value is missing or not a number,
+    and a mask of which samples have a value at all. Lets column ranges and
+    'modify' functions be worked out for all samples at once. """
+
+    def __init__ (self, data, keys=None):
+        self.s_names = [str(s_name) for s_name in data.keys()]
+        self.s_idx = { s_name: i for i, s_name in enumerate(self.s_names) }
+        num_samples = len(self.s_names)
+        values = OrderedDict()
+        present = OrderedDict()
+        if keys is not None:
+            for k in keys:
+                values[str(k)] = [np.nan] * num_samples
+                present[str(k)] = [False] * num_samples
+        for i, samp in enumerate(data.values()):
+            for k, v in samp.items():
+                k = str(k)
+                if k not in values:
+                    values[k] = [np.nan] * num_samples
+                    present[k] = [False] * num_samples
+                present[k][i] = True
+                try:
+                    values[k][i] = float(v)
+                except (TypeError, ValueError):
+                    pass
+        self.values = OrderedDict( (k, np.array(v, dtype=np.float64)) for k, v in values.items() )
+        self.present = OrderedDict( (k, np.array(v, dtype=bool)) for k, v in present.items() )
+
+    def __len__ (self):
+        return len(self.s_names)
+
+    def __contains__ (self, k):
+        return k in self.values
+
+    def count (self, k):
+        """ Number of samples with a value for a column """
+        if k not in self.present:
+            return 0
+        return int(np.count_nonzero(self.present[k]))
+
+    def modified (self, k, modify=None):
+        """ Return the numeric values of a column with a 'modify' function applied.
+        The function is called once with the whole array if it can handle that,
+        otherwise with each value in turn. Values that it can't convert are NaN. """
+        vals = self.values[k]
+        if not callable(modify):
+            return vals
+        numeric = ~np.isnan(vals)
+        try:
+            with np.errstate(all='ignore'):
+                mvals = np.asarray(modify(vals), dtype=np.float64)
+            # Only trust the result if it looks like an element-wise operation,
+            # anything else (eg. division by zero) is done one value at a time
+            if mvals.shape == vals.shape and np.array_equal(np.isfinite(mvals[numeric]), np.isfinite(vals[numeric])):
+                return mvals
+        except Exception:
+            pass
+        mvals = np.full(vals.shape, np.nan)
+        for i in np.flatnonzero(numeric):
+            try:
+                mvals[i] = float(modify(float(vals[i])))
+            except ValueError:
+                pass
+        return mvals
+
+
 class datatable (object):
     """ Data table class. Prepares and holds data and configuration
     for either a table or a beeswarm plot. """
@@ -60,19 +129,15 @@ class datatable (object):
             for k,v in data[idx].items():
                 cdata[str(k)] = v
             data[idx] = cdata
-            for s_name in data[idx].keys():
-                for k in list(data[idx][s_name].keys()):
-                    data[idx][s_name][str(k)] = data[idx][s_name].pop(k)
+            for samp in data[idx].values():
+                if not all(isinstance(k, str) for k in samp):
+                    for k in list(samp.keys()):
+                        samp[str(k)] = samp.pop(k)
+
+            cols = ColumnStore(data[idx], keys)
 
             # Check that we have some data in each column
-            empties = list()
-            for k in keys:
-                n = 0
-                for samp in d.values():
-                    if k in samp:
-                        n += 1
-                if n == 0:
-                    empties.append(k)
+            empties = [k for k in keys if cols.count(k) == 0]
             for k in empties:
                 keys = [j for j in keys if j != k]
                 del headers[idx][k]
@@ -163,19 +228,13 @@ class datatable (object):
 
                 # Figure out the min / max if not supplied
                 if setdmax or setdmin:
-                    for s_name, samp in data[idx].items():
-                        try:
-                            val = float(samp[k])
-                            if callable(headers[idx][k]['modify']):
-                                val = float(headers[idx][k]['modify'](val))
-                            if setdmax:
-                                headers[idx][k]['dmax'] = max(headers[idx][k]['dmax'], val)
-                            if setdmin:
-                                headers[idx][k]['dmin'] = min(headers[idx][k]['dmin'], val)
-                        except ValueError:
-                            val = samp[k] # couldn't convert to float - keep as a string
-                        except KeyError:
-                            pass # missing data - skip
+                    vals = cols.modified(k, headers[idx][k]['modify'])
+                    vals = vals[~np.isnan(vals)] # missing data or strings - skip
+                    if len(vals) > 0:
+                        if setdmax and vals.max() > headers[idx][k]['dmax']:
+                            headers[idx][k]['dmax'] = float(vals.max())
+                        if setdmin and vals.min() < headers[idx][k]['dmin']:
+                            headers[idx][k]['dmin'] = float(vals.min())
                     # Limit auto-generated scales with floor, ceiling and minRange.
                     if headers[idx][k]['ceiling'] is not None and headers[idx][k]['max'] is None:
                         headers[idx][k]['dmax'] = min(headers[idx][k]['dmax'], float(headers[idx][k]['ceiling']))
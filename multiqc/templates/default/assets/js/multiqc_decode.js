@@ -0,0 +1,459 @@
+////////////////////////////////////////////////
+// Decode the compressed plot data
+////////////////////////////////////////////////
+
+// Functions to decompress the plot data, by the encoding name set in the report.
+// Plugins with a custom encoder in Python can add a matching function here.
+mqc_plot_data_decoders = {
+  lzstring: function (data) {
+    return LZString.decompressFromBase64(data);
+  },
+  zlib: function (data) {
+    return mqc_utf8_decode(mqc_inflate(mqc_base64_decode(data)));
+  },
+  // JSON followed by binary typed arrays, see multiqc/utils/typed_arrays.py
+  binary: function (data) {
+    var bytes = mqc_inflate(mqc_base64_decode(data));
+    var json_length = new DataView(bytes.buffer, bytes.byteOffset, 4).getUint32(0, true);
+    var plots = JSON.parse(mqc_utf8_decode(bytes.subarray(4, 4 + json_length)));
+    // Copy the binary data to its own buffer, so that the arrays are aligned
+    var buffer = bytes.slice(4 + json_length).buffer;
+    return mqc_unpack_typed_arrays(plots, buffer, {});
+  }
+};
+
+// Decompress and parse plot data. Old reports have no encoding set and use lzstring.
+// Decoders return a JSON string, or the plot data if they parse it themselves.
+function mqc_decode_plot_data(data, encoding) {
+  if (encoding === undefined || encoding === null || encoding === '') {
+    encoding = 'lzstring';
+  }
+  if (!(encoding in mqc_plot_data_decoders)) {
+    throw new Error('Unknown plot data encoding: ' + encoding);
+  }
+  var decoded = mqc_plot_data_decoders[encoding](data);
+  return mqc_resolve_sample_ids(typeof decoded === 'string' ? JSON.parse(decoded) : decoded);
+}
+
+// Sample names shared by all plots. Reports made with the plot_data_sample_ids
+// config option save each name once and refer to it by its index in this list.
+var mqc_sample_names = [];
+var mqc_sample_ids = {};
+
+// Put the sample names back into plot data that refers to them by index.
+// Takes the data for all plots, which has the list of names, or for one plot.
+function mqc_resolve_sample_ids(data) {
+  if (data.mqc_sample_names !== undefined) {
+    mqc_sample_names = data.mqc_sample_names;
+    mqc_sample_ids = {};
+    for (var i = 0; i < mqc_sample_names.length; i++) {
+      mqc_sample_ids[mqc_sample_names[i]] = i;
+    }
+    delete data.mqc_sample_names;
+  }
+  if (data.plot_type !== undefined) {
+    return mqc_resolve_plot_sample_ids(data);
+  }
+  for (var target in data) {
+    if (data.hasOwnProperty(target)) {
+      mqc_resolve_plot_sample_ids(data[target]);
+    }
+  }
+  return data;
+}
+
+function mqc_resolve_plot_sample_ids(plot) {
+  if (!plot.sample_ids) {
+    return plot;
+  }
+  var resolve = function (ids) {
+    for (var i = 0; i < ids.length; i++) {
+      ids[i] = mqc_sample_names[ids[i]];
+    }
+  };
+  var i, j;
+  if (plot.plot_type == 'xy_line' || plot.plot_type == 'scatter') {
+    for (i = 0; i < plot.datasets.length; i++) {
+      for (j = 0; j < plot.datasets[i].length; j++) {
+        plot.datasets[i][j].name = mqc_sample_names[plot.datasets[i][j].name];
+      }
+    }
+  } else if (plot.plot_type == 'heatmap') {
+    resolve(plot.xcats);
+    resolve(plot.ycats);
+  } else {
+    for (i = 0; i < plot.samples.length; i++) {
+      resolve(plot.samples[i]);
+    }
+  }
+  delete plot.sample_ids;
+  return plot;
+}
+
+// Replace the references to typed arrays in the plot data with normal arrays,
+// as the plotting code copies and changes them. Arrays used more than once
+// (such as shared x values) are only read once, using cache.
+var mqc_typed_array_types = { i32: Int32Array, f32: Float32Array, f64: Float64Array };
+function mqc_unpack_typed_arrays(obj, buffer, cache) {
+  if (obj === null || typeof obj !== 'object') {
+    return obj;
+  }
+  if (Array.isArray(obj)) {
+    for (var i = 0; i < obj.length; i++) {
+      obj[i] = mqc_unpack_typed_arrays(obj[i], buffer, cache);
+    }
+    return obj;
+  }
+  if (obj.mqc_array !== undefined) {
+    return mqc_typed_array_values(obj.mqc_array, buffer, cache).slice();
+  }
+  if (obj.mqc_xy !== undefined) {
+    var x = mqc_typed_array_values(obj.mqc_xy[0].mqc_array, buffer, cache);
+    var y = mqc_typed_array_values(obj.mqc_xy[1].mqc_array, buffer, cache);
+    var pairs = new Array(x.length);
+    for (var j = 0; j < x.length; j++) {
+      pairs[j] = [x[j], y[j]];
+    }
+    return pairs;
+  }
+  for (var k in obj) {
+    if (obj.hasOwnProperty(k)) {
+      obj[k] = mqc_unpack_typed_arrays(obj[k], buffer, cache);
+    }
+  }
+  return obj;
+}
+
+// Read a typed array: [type, byte offset, length, significant digits].
+// NaN is missing data (null). Float32 values are rounded to the given digits.
+function mqc_typed_array_values(ref, buffer, cache) {
+  var key = ref[0] + ':' + ref[1];
+  if (cache[key] === undefined) {
+    var arr = new mqc_typed_array_types[ref[0]](buffer, ref[1], ref[2]);
+    var sig_digits = ref[3];
+    var values = new Array(arr.length);
+    for (var i = 0; i < arr.length; i++) {
+      var v = arr[i];
+      if (v !== v) {
+        v = null;
+      } else if (sig_digits !== undefined) {
+        v = parseFloat(v.toPrecision(sig_digits));
+      }
+      values[i] = v;
+    }
+    cache[key] = values;
+  }
+  return cache[key];
+}
+
+// Reports made with the lazy_plot_data config option save the data for each plot
+// in its own script block. Add a property to the plots object for each one, which
+// decodes the data the first time it is used. Returns the number of lazy plots.
+function mqc_add_lazy_plot_data(plots) {
+  var elements = document.querySelectorAll('script.mqc_plot_data');
+  for (var i = 0; i < elements.length; i++) {
+    (function (el) {
+      var target = el.getAttribute('data-plot-id');
+      var set_value = function (value) {
+        Object.defineProperty(plots, target, { value: value, writable: true, configurable: true, enumerable: true });
+      };
+      Object.defineProperty(plots, target, {
+        configurable: true,
+        enumerable: true,
+        get: function () {
+          var value = mqc_decode_plot_data(el.textContent, el.getAttribute('data-encoding'));
+          set_value(value);
+          // The compressed data isn't needed any more
+          el.parentNode.removeChild(el);
+          return value;
+        },
+        set: set_value
+      });
+    })(elements[i]);
+  }
+  return elements.length;
+}
+
+// Base64 string to a Uint8Array
+function mqc_base64_decode(data) {
+  var binary = window.atob(data.replace(/\s/g, ''));
+  var bytes = new Uint8Array(binary.length);
+  for (var i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
+// UTF-8 bytes to a string
+function mqc_utf8_decode(bytes) {
+  if (typeof TextDecoder !== 'undefined') {
+    return new TextDecoder('utf-8').decode(bytes);
+  }
+  // Older browsers
+  var chunks = [];
+  for (var i = 0; i < bytes.length; i += 0x8000) {
+    chunks.push(String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000)));
+  }
+  return decodeURIComponent(escape(chunks.join('')));
+}
+
+// Decompress zlib data (RFC 1950 / 1951), as written by Python zlib.compress().
+// Based on tinf, the tiny inflate library by Joergen Ibsen.
+var mqc_inflate = (function () {
+
+  function Tree() {
+    this.table = new Uint16Array(16); // number of codes of each length
+    this.trans = new Uint16Array(288); // code -> symbol translation table
+  }
+
+  var fixed_ltree = new Tree();
+  var fixed_dtree = new Tree();
+  var code_tree = new Tree();
+  var lengths = new Uint8Array(288 + 32);
+  var offs = new Uint16Array(16);
+
+  // Extra bits and base values for length and distance codes
+  var length_bits = new Uint8Array(30);
+  var length_base = new Uint16Array(30);
+  var dist_bits = new Uint8Array(30);
+  var dist_base = new Uint16Array(30);
+
+  // Order of the code length codes
+  var clcidx = [16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15];
+
+  function build_bits_base(bits, base, delta, first) {
+    var i, sum;
+    for (i = 0; i < delta; i++) {
+      bits[i] = 0;
+    }
+    for (i = 0; i < 30 - delta; i++) {
+      bits[i + delta] = (i / delta) | 0;
+    }
+    for (sum = first, i = 0; i < 30; i++) {
+      base[i] = sum;
+      sum += 1 << bits[i];
+    }
+  }
+
+  function build_fixed_trees(lt, dt) {
+    var i;
+    for (i = 0; i < 7; i++) {
+      lt.table[i] = 0;
+    }
+    lt.table[7] = 24;
+    lt.table[8] = 152;
+    lt.table[9] = 112;
+    for (i = 0; i < 24; i++) {
+      lt.trans[i] = 256 + i;
+    }
+    for (i = 0; i < 144; i++) {
+      lt.trans[24 + i] = i;
+    }
+    for (i = 0; i < 8; i++) {
+      lt.trans[24 + 144 + i] = 280 + i;
+    }
+    for (i = 0; i < 112; i++) {
+      lt.trans[24 + 144 + 8 + i] = 144 + i;
+    }
+    for (i = 0; i < 5; i++) {
+      dt.table[i] = 0;
+    }
+    dt.table[5] = 32;
+    for (i = 0; i < 32; i++) {
+      dt.trans[i] = i;
+    }
+  }
+
+  function build_tree(t, lens, off, num) {
+    var i, sum;
+    for (i = 0; i < 16; i++) {
+      t.table[i] = 0;
+    }
+    for (i = 0; i < num; i++) {
+      t.table[lens[off + i]]++;
+    }
+    t.table[0] = 0;
+    for (sum = 0, i = 0; i < 16; i++) {
+      offs[i] = sum;
+      sum += t.table[i];
+    }
+    for (i = 0; i < num; i++) {
+      if (lens[off + i]) {
+        t.trans[offs[lens[off + i]]++] = i;
+      }
+    }
+  }
+
+  function Data(source) {
+    this.source = source;
+    this.pos = 0;
+    this.tag = 0;
+    this.bitcount = 0;
+    this.dest = new Uint8Array(source.length * 4 + 1024);
+    this.destLen = 0;
+    this.ltree = new Tree();
+    this.dtree = new Tree();
+  }
+
+  function grow(d, n) {
+    if (d.destLen + n > d.dest.length) {
+      var dest = new Uint8Array(Math.max(d.dest.length * 2, d.destLen + n));
+      dest.set(d.dest.subarray(0, d.destLen));
+      d.dest = dest;
+    }
+  }
+
+  function getbit(d) {
+    if (!d.bitcount--) {
+      d.tag = d.source[d.pos++];
+      d.bitcount = 7;
+    }
+    var bit = d.tag & 1;
+    d.tag >>>= 1;
+    return bit;
+  }
+
+  function read_bits(d, num, base) {
+    if (!num) {
+      return base;
+    }
+    while (d.bitcount < 24) {
+      d.tag |= d.source[d.pos++] << d.bitcount;
+      d.bitcount += 8;
+    }
+    var val = d.tag & (0xffff >>> (16 - num));
+    d.tag >>>= num;
+    d.bitcount -= num;
+    return val + base;
+  }
+
+  function decode_symbol(d, t) {
+    while (d.bitcount < 24) {
+      d.tag |= d.source[d.pos++] << d.bitcount;
+      d.bitcount += 8;
+    }
+    var sum = 0, cur = 0, len = 0;
+    var tag = d.tag;
+    do {
+      cur = 2 * cur + (tag & 1);
+      tag >>>= 1;
+      len++;
+      sum += t.table[len];
+      cur -= t.table[len];
+    } while (cur >= 0);
+    d.tag = tag;
+    d.bitcount -= len;
+    return t.trans[sum + cur];
+  }
+
+  function decode_trees(d, lt, dt) {
+    var hlit = read_bits(d, 5, 257);
+    var hdist = read_bits(d, 5, 1);
+    var hclen = read_bits(d, 4, 4);
+    var i, num, length, prev, sym;
+    for (i = 0; i < 19; i++) {
+      lengths[i] = 0;
+    }
+    for (i = 0; i < hclen; i++) {
+      lengths[clcidx[i]] = read_bits(d, 3, 0);
+    }
+    build_tree(code_tree, lengths, 0, 19);
+    for (num = 0; num < hlit + hdist; ) {
+      sym = decode_symbol(d, code_tree);
+      if (sym === 16) {
+        prev = lengths[num - 1];
+        for (length = read_bits(d, 2, 3); length; length--) {
+          lengths[num++] = prev;
+        }
+      } else if (sym === 17) {
+        for (length = read_bits(d, 3, 3); length; length--) {
+          lengths[num++] = 0;
+        }
+      } else if (sym === 18) {
+        for (length = read_bits(d, 7, 11); length; length--) {
+          lengths[num++] = 0;
+        }
+      } else {
+        lengths[num++] = sym;
+      }
+    }
+    build_tree(lt, lengths, 0, hlit);
+    build_tree(dt, lengths, hlit, hdist);
+  }
+
+  function inflate_block_data(d, lt, dt) {
+    var sym, length, dist, start, i;
+    while (true) {
+      sym = decode_symbol(d, lt);
+      if (sym === 256) {
+        return;
+      }
+      if (sym < 256) {
+        if (d.destLen === d.dest.length) {
+          grow(d, 1);
+        }
+        d.dest[d.destLen++] = sym;
+      } else {
+        sym -= 257;
+        length = read_bits(d, length_bits[sym], length_base[sym]);
+        dist = decode_symbol(d, dt);
+        start = d.destLen - read_bits(d, dist_bits[dist], dist_base[dist]);
+        grow(d, length);
+        for (i = start; i < start + length; i++) {
+          d.dest[d.destLen++] = d.dest[i];
+        }
+      }
+    }
+  }
+
+  function inflate_uncompressed_block(d) {
+    // Give back any whole bytes in the bit buffer and skip to the byte boundary
+    while (d.bitcount >= 8) {
+      d.pos--;
+      d.bitcount -= 8;
+    }
+    d.tag = 0;
+    d.bitcount = 0;
+    var length = d.source[d.pos] | (d.source[d.pos + 1] << 8);
+    var invlength = d.source[d.pos + 2] | (d.source[d.pos + 3] << 8);
+    if (length !== (~invlength & 0xffff)) {
+      throw new Error('Invalid stored block length in plot data');
+    }
+    d.pos += 4;
+    grow(d, length);
+    d.dest.set(d.source.subarray(d.pos, d.pos + length), d.destLen);
+    d.destLen += length;
+    d.pos += length;
+  }
+
+  build_fixed_trees(fixed_ltree, fixed_dtree);
+  build_bits_base(length_bits, length_base, 4, 3);
+  build_bits_base(dist_bits, dist_base, 2, 1);
+  // Special case: length code 285 is 258 with no extra bits
+  length_bits[28] = 0;
+  length_base[28] = 258;
+
+  return function (source) {
+    if ((source[0] & 0x0f) !== 8 || ((source[0] << 8) | source[1]) % 31 !== 0) {
+      throw new Error('Plot data is not zlib compressed');
+    }
+    var d = new Data(source);
+    d.pos = 2;
+    var bfinal, btype;
+    do {
+      bfinal = getbit(d);
+      btype = read_bits(d, 2, 0);
+      if (btype === 0) {
+        inflate_uncompressed_block(d);
+      } else if (btype === 1) {
+        inflate_block_data(d, fixed_ltree, fixed_dtree);
+      } else if (btype === 2) {
+        decode_trees(d, d.ltree, d.dtree);
+        inflate_block_data(d, d.ltree, d.dtree);
+      } else {
+        throw new Error('Invalid block type in plot data');
+      }
+    } while (!bfinal);
+    return d.dest.subarray(0, d.destLen);
+  };
+})();
@@ -17,6 +17,87 @@ window.mqc_hide_f_texts = [];
 window.mqc_hide_regex_mode = false;
 window.HCDefaults = undefined;
 
+// Custom templates that don't include multiqc_decode.js can only read plot data
+// compressed with lzstring, as in older versions of MultiQC
+if(typeof mqc_decode_plot_data === 'undefined'){
+  window.mqc_decode_plot_data = function(data, encoding){
+    if(encoding !== undefined && encoding !== null && encoding !== '' && encoding !== 'lzstring'){
+      throw new Error('Plot data encoding ' + encoding + ' needs assets/js/multiqc_decode.js in the report template');
+    }
+    return JSON.parse(LZString.decompressFromBase64(data));
+  };
+}
+if(typeof mqc_add_lazy_plot_data === 'undefined'){
+  window.mqc_add_lazy_plot_data = function(plots){ return 0; };
+}
+
+// Sample names shared by all plots, set by multiqc_decode.js. Custom templates without
+// it need plot_data_sample_ids: false, so that each plot has the names in it instead.
+if(typeof mqc_sample_ids === 'undefined'){
+  window.mqc_sample_names = [];
+  window.mqc_sample_ids = {};
+}
+
+// Toolbox results for each sample in mqc_sample_names (see multiqc_decode.js), by index.
+// Worked out once and used by all plots, until the toolbox filters change.
+window.mqc_sample_toolbox_cache = { filters: [], results: [] };
+
+// Rename, highlight and hide filters for a sample name. Returns the new name, the
+// index of the last highlight filter that matches the new name, with and without
+// the blank filter that matches everything (-1 if none) and whether it is hidden.
+function mqc_sample_toolbox(s_name){
+  if(!Object.prototype.hasOwnProperty.call(mqc_sample_ids, s_name)){
+    return mqc_apply_toolbox_filters(s_name);
+  }
+  var filters = [
+    window.mqc_rename_f_texts, window.mqc_rename_f_texts.length, window.mqc_rename_t_texts, window.mqc_rename_regex_mode,
+    window.mqc_highlight_f_texts, window.mqc_highlight_f_texts.length, window.mqc_highlight_regex_mode,
+    window.mqc_hide_f_texts, window.mqc_hide_f_texts.length, window.mqc_hide_regex_mode, window.mqc_hide_mode
+  ];
+  var cache = window.mqc_sample_toolbox_cache;
+  for (var i = 0; i < filters.length; i++) {
+    if(filters[i] !== cache.filters[i]){
+      cache.filters = filters;
+      cache.results = [];
+      break;
+    }
+  }
+  var s_id = mqc_sample_ids[s_name];
+  if(cache.results[s_id] === undefined){
+    cache.results[s_id] = mqc_apply_toolbox_filters(s_name);
+  }
+  return cache.results[s_id];
+}
+
+function mqc_apply_toolbox_filters(s_name){
+  var result = { name: s_name, highlight: -1, highlight_match: -1, hidden: false };
+  for (var i = 0; i < window.mqc_rename_f_texts.length; i++) {
+    var f_text = window.mqc_rename_f_texts[i];
+    if(window.mqc_rename_regex_mode){
+      f_text = new RegExp(f_text,"g");
+    }
+    result.name = result.name.replace(f_text, window.mqc_rename_t_texts[i]);
+  }
+  for (i = 0; i < window.mqc_highlight_f_texts.length; i++) {
+    var f_text = window.mqc_highlight_f_texts[i];
+    if((window.mqc_highlight_regex_mode && result.name.match(f_text)) || (!window.mqc_highlight_regex_mode && result.name.indexOf(f_text) > -1)){
+      result.highlight = i;
+      if(f_text != ''){ result.highlight_match = i; }
+    }
+  }
+  if(window.mqc_hide_f_texts.length > 0){
+    var match = false;
+    for (i = 0; i < window.mqc_hide_f_texts.length; i++) {
+      var f_text = window.mqc_hide_f_texts[i];
+      if((window.mqc_hide_regex_mode && result.name.match(f_text)) || (!window.mqc_hide_regex_mode && result.name.indexOf(f_text) > -1)){
+        match = true;
+      }
+    }
+    result.hidden = window.mqc_hide_mode == 'show' ? !match : match;
+  }
+  return result;
+}
+
 // Execute when page load has finished loading
 $(function () {
 
@@ -24,7 +105,9 @@ $(function () {
   $('.mqc_loading_warning').show();
 
   // Decompress the JSON plot data
-  mqc_plots = JSON.parse(LZString.decompressFromBase64(mqc_compressed_plotdata));
+  mqc_plots = mqc_decode_plot_data(mqc_compressed_plotdata, window.mqc_plot_data_encoding);
+  // Reports made with lazy_plot_data have separate data for each plot, decoded when first used
+  window.mqc_lazy_plot_data = mqc_add_lazy_plot_data(mqc_plots) > 0;
 
   // HighCharts Defaults
   window.HCDefaults = $.extend(true, {}, Highcharts.getOptions(), {});
@@ -61,22 +144,42 @@ $(function () {
     }
   });
 
-  // Render plots on page load
-  $('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').each(function(){
-    var target = $(this).attr('id');
-    // Only one point per dataset, so multiply limit by arbitrary number.
-    var max_num = mqc_config['num_datasets_plot_limit'] * 50;
-    // Deferring each plot call prevents browser from locking up
-    setTimeout(function(){
-        plot_graph(target, undefined, max_num);
-        if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
-          $('.mqc_loading_warning').hide();
+  // Render plots with lazy data when they scroll into view
+  if(window.mqc_lazy_plot_data && 'IntersectionObserver' in window){
+    var plot_observer = new IntersectionObserver(function(entries){
+      entries.forEach(function(entry){
+        if(entry.isIntersecting){
+          plot_observer.unobserve(entry.target);
+          if($(entry.target).hasClass('not_rendered')){
+            // Only one point per dataset, so multiply limit by arbitrary number.
+            plot_graph(entry.target.id, undefined, mqc_config['num_datasets_plot_limit'] * 50);
+          }
         }
-    }, 50);
-  });
-  if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
+      });
+    }, { rootMargin: '200px' });
+    $('.hc-plot.not_rendered:not(.gt_max_num_ds)').each(function(){
+      plot_observer.observe(this);
+    });
     $('.mqc_loading_warning').hide();
   }
+  // Render plots on page load
+  else {
+    $('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').each(function(){
+      var target = $(this).attr('id');
+      // Only one point per dataset, so multiply limit by arbitrary number.
+      var max_num = mqc_config['num_datasets_plot_limit'] * 50;
+      // Deferring each plot call prevents browser from locking up
+      setTimeout(function(){
+          plot_graph(target, undefined, max_num);
+          if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
+            $('.mqc_loading_warning').hide();
+          }
+      }, 50);
+    });
+    if($('.hc-plot.not_rendered:visible:not(.gt_max_num_ds)').length == 0){
+      $('.mqc_loading_warning').hide();
+    }
+  }
 
   // Render a plot when clicked
   $('body').on('click', '.render_plot', function(e){
@@ -306,29 +409,21 @@ function plot_xy_line_graph(target, ds){
   // Make a clone of the data, so that we can mess with it,
   // while keeping the original data in tact
   var data = JSON.parse(JSON.stringify(mqc_plots[target]['datasets'][ds]));
+  var toolbox = $.map(data, function(s){ return mqc_sample_toolbox(s['name']); });
 
   // Rename samples
   if(window.mqc_rename_f_texts.length > 0){
     $.each(data, function(j, s){
-      $.each(window.mqc_rename_f_texts, function(idx, f_text){
-        if(window.mqc_rename_regex_mode){
-          var re = new RegExp(f_text,"g");
-          data[j]['name'] = data[j]['name'].replace(re, window.mqc_rename_t_texts[idx]);
-        } else {
-          data[j]['name'] = data[j]['name'].replace(f_text, window.mqc_rename_t_texts[idx]);
-        }
-      });
+      data[j]['name'] = toolbox[j].name;
     });
   }
 
   // Highlight samples
   if(window.mqc_highlight_f_texts.length > 0){
     $.each(data, function(j, s){
-      $.each(window.mqc_highlight_f_texts, function(idx, f_text){
-        if((window.mqc_highlight_regex_mode && data[j]['name'].match(f_text)) || (!window.mqc_highlight_regex_mode && data[j]['name'].indexOf(f_text) > -1)){
-          data[j]['color'] = window.mqc_highlight_f_cols[idx];
-        }
-      });
+      if(toolbox[j].highlight > -1){
+        data[j]['color'] = window.mqc_highlight_f_cols[toolbox[j].highlight];
+      }
     });
   }
 
@@ -340,19 +435,7 @@ function plot_xy_line_graph(target, ds){
     var num_total = data.length;
     var j = data.length;
     while (j--) {
-      var match = false;
-      for (i = 0; i < window.mqc_hide_f_texts.length; i++) {
-        var f_text = window.mqc_hide_f_texts[i];
-        if(window.mqc_hide_regex_mode){
-          if(data[j]['name'].match(f_text)){ match = true; }
-        } else {
-          if(data[j]['name'].indexOf(f_text) > -1){ match = true; }
-        }
-      }
-      if(window.mqc_hide_mode == 'show'){
-        match = !match;
-      }
-      if(match){
+      if(toolbox[j].hidden){
         data.splice(j,1);
         num_hidden += 1;
       }
@@ -477,35 +560,28 @@ function plot_stacked_bar_graph(target, ds){
     var minTickInt = undefined;
   }
 
+  var toolbox = $.map(cats, mqc_sample_toolbox);
+
   // Rename samples
   if(window.mqc_rename_f_texts.length > 0){
     $.each(cats, function(j, s_name){
-      $.each(window.mqc_rename_f_texts, function(idx, f_text){
-        if(window.mqc_rename_regex_mode){
-          var re = new RegExp(f_text,"g");
-          cats[j] = cats[j].replace(re, window.mqc_rename_t_texts[idx]);
-        } else {
-          cats[j] = cats[j].replace(f_text, window.mqc_rename_t_texts[idx]);
-        }
-      });
+      cats[j] = toolbox[j].name;
     });
   }
 
   // Highlight samples
   if(window.mqc_highlight_f_texts.length > 0){
     $.each(cats, function(j, s_name){
-      $.each(window.mqc_highlight_f_texts, function(idx, f_text){
-        if(f_text == ''){ return true; } // skip blanks
-        if((window.mqc_highlight_regex_mode && s_name.match(f_text)) || (!window.mqc_highlight_regex_mode && s_name.indexOf(f_text) > -1)){
-          // Make the data point in each series with this index have a border colour
-          $.each(data, function(k, d){
-            data[k]['data'][j] = {
-              'y': data[k]['data'][j],
-              'borderColor': window.mqc_highlight_f_cols[idx]
-            }
-          });
-        }
-      });
+      var idx = toolbox[j].highlight_match;
+      if(idx > -1){ // blank filters are skipped
+        // Make the data point in each series with this index have a border colour
+        $.each(data, function(k, d){
+          data[k]['data'][j] = {
+            'y': data[k]['data'][j],
+            'borderColor': window.mqc_highlight_f_cols[idx]
+          }
+        });
+      }
     });
     // Bump the borderWidth to make the highlights more obvious
     if(config['borderWidth'] <= 2){ config['borderWidth'] = 2; }
@@ -519,20 +595,7 @@ function plot_stacked_bar_graph(target, ds){
     var num_total = cats.length;
     var j = cats.length;
     while (j--) {
-      var s_name = cats[j];
-      var match = false;
-      for (i = 0; i < window.mqc_hide_f_texts.length; i++) {
-        var f_text = window.mqc_hide_f_texts[i];
-        if(window.mqc_hide_regex_mode){
-          if(s_name.match(f_text)){ match = true; }
-        } else {
-          if(s_name.indexOf(f_text) > -1){ match = true; }
-        }
-      }
-      if(window.mqc_hide_mode == 'show'){
-        match = !match;
-      }
-      if(match){
+      if(toolbox[j].hidden){
         cats.splice(j, 1);
         $.each(data, function(k, d){
           data[k]['data'].splice(j, 1);
@@ -657,18 +720,12 @@ function plot_scatter_plot (target, ds){
   // Make a clone of the data, so that we can mess with it,
   // while keeping the original data in tact
   var data = JSON.parse(JSON.stringify(mqc_plots[target]['datasets'][ds]));
+  var toolbox = $.map(data, function(s){ return mqc_sample_toolbox(s['name']); });
 
   // Rename samples
   if(window.mqc_rename_f_texts.length > 0){
     $.each(data, function(j, s){
-      $.each(window.mqc_rename_f_texts, function(idx, f_text){
-        if(window.mqc_rename_regex_mode){
-          var re = new RegExp(f_text,"g");
-          data[j]['name'] = data[j]['name'].replace(re, window.mqc_rename_t_texts[idx]);
-        } else {
-          data[j]['name'] = data[j]['name'].replace(f_text, window.mqc_rename_t_texts[idx]);
-        }
-      });
+      data[j]['name'] = toolbox[j].name;
     });
   }
 
@@ -680,15 +737,10 @@ function plot_scatter_plot (target, ds){
       } else {
         data[j]['marker'] = {'lineWidth': 0};
       }
-      var match = false;
-      $.each(window.mqc_highlight_f_texts, function(idx, f_text){
-        if(f_text == ''){ return true; }
-        if((window.mqc_highlight_regex_mode && data[j]['name'].match(f_text)) || (!window.mqc_highlight_regex_mode && data[j]['name'].indexOf(f_text) > -1)){
-          data[j]['color'] = window.mqc_highlight_f_cols[idx];
-          match = true;
-        }
-      });
-      if(!match) {
+      var idx = toolbox[j].highlight_match;
+      if(idx > -1){
+        data[j]['color'] = window.mqc_highlight_f_cols[idx];
+      } else {
         data[j]['color'] = 'rgba(100,100,100,0.2)';
       }
     });
@@ -702,19 +754,7 @@ function plot_scatter_plot (target, ds){
     var num_total = data.length;
     var j = data.length;
     while (j--) {
-      var match = false;
-      for (i = 0; i < window.mqc_hide_f_texts.length; i++) {
-        var f_text = window.mqc_hide_f_texts[i];
-        if(window.mqc_hide_regex_mode){
-          if(data[j]['name'].match(f_text)){ match = true; }
-        } else {
-          if(data[j]['name'].indexOf(f_text) > -1){ match = true; }
-        }
-      }
-      if(window.mqc_hide_mode == 'show'){
-        match = !match;
-      }
-      if(match){
+      if(toolbox[j].hidden){
         data.splice(j,1);
         num_hidden += 1;
       }
@@ -860,19 +900,16 @@ function plot_beeswarm_graph(target, ds){
   var datasets = JSON.parse(JSON.stringify(mqc_plots[target]['datasets']));
   var samples = JSON.parse(JSON.stringify(mqc_plots[target]['samples']));
   var categories = JSON.parse(JSON.stringify(mqc_plots[target]['categories']));
+  var toolbox = [];
+  for (i=0; i < samples.length; i++) {
+    toolbox.push($.map(samples[i], mqc_sample_toolbox));
+  }
 
   // Rename samples
   if(window.mqc_rename_f_texts.length > 0){
     for (i=0; i < samples.length; i++) {
       for (j=0; j < samples[i].length; j++) {
-        $.each(window.mqc_rename_f_texts, function(idx, f_text){
-          if(window.mqc_rename_regex_mode){
-            var re = new RegExp(f_text,"g");
-            samples[i][j] = samples[i][j].replace(re, window.mqc_rename_t_texts[idx]);
-          } else {
-            samples[i][j] = samples[i][j].replace(f_text, window.mqc_rename_t_texts[idx]);
-          }
-        });
+        samples[i][j] = toolbox[i][j].name;
       }
     }
   }
@@ -884,11 +921,9 @@ function plot_beeswarm_graph(target, ds){
     baseColour = 'rgb(80,80,80)'; // Grey points if no highlight
     for (i=0; i < samples.length; i++) {
       for (j=0; j < samples[i].length; j++) {
-        $.each(window.mqc_highlight_f_texts, function(idx, f_text){
-          if((window.mqc_highlight_regex_mode && samples[i][j].match(f_text)) || (!window.mqc_highlight_regex_mode && samples[i][j].indexOf(f_text) > -1)){
-            seriesColours[samples[i][j]] = window.mqc_highlight_f_cols[idx];
-          }
-        });
+        if(toolbox[i][j].highlight > -1){
+          seriesColours[samples[i][j]] = window.mqc_highlight_f_cols[toolbox[i][j].highlight];
+        }
       }
     }
   }
@@ -904,20 +939,7 @@ function plot_beeswarm_graph(target, ds){
       var j = samples[i].length;
       var hidden_here = 0;
       while (j--) {
-        var s_name = samples[i][j];
-        var match = false;
-        for (k = 0; k < window.mqc_hide_f_texts.length; k++) {
-          var f_text = window.mqc_hide_f_texts[k];
-          if(window.mqc_hide_regex_mode){
-            if(s_name.match(f_text)){ match = true; }
-          } else {
-            if(s_name.indexOf(f_text) > -1){ match = true; }
-          }
-        }
-        if(window.mqc_hide_mode == 'show'){
-          match = !match;
-        }
-        if(match){
+        if(toolbox[i][j].hidden){
           samples[i].splice(j, 1);
           datasets[i].splice(j, 1);
           hidden_here += 1;
@@ -1171,28 +1193,16 @@ function plot_heatmap(target, ds){
   var data = JSON.parse(JSON.stringify(mqc_plots[target]['data']));
   var xcats = JSON.parse(JSON.stringify(mqc_plots[target]['xcats']));
   var ycats = JSON.parse(JSON.stringify(mqc_plots[target]['ycats']));
+  var xcat_toolbox = $.map(xcats, mqc_sample_toolbox);
+  var ycat_toolbox = $.map(ycats, mqc_sample_toolbox);
 
   // Rename samples
   if(window.mqc_rename_f_texts.length > 0){
     for (i=0; i < xcats.length; i++) {
-      $.each(window.mqc_rename_f_texts, function(idx, f_text){
-        if(window.mqc_rename_regex_mode){
-          var re = new RegExp(f_text,"g");
-          xcats[i] = xcats[i].replace(re, window.mqc_rename_t_texts[idx]);
-        } else {
-          xcats[i] = xcats[i].replace(f_text, window.mqc_rename_t_texts[idx]);
-        }
-      });
+      xcats[i] = xcat_toolbox[i].name;
     }
     for (i=0; i < ycats.length; i++) {
-      $.each(window.mqc_rename_f_texts, function(idx, f_text){
-        if(window.mqc_rename_regex_mode){
-          var re = new RegExp(f_text,"g");
-          ycats[i] = ycats[i].replace(re, window.mqc_rename_t_texts[idx]);
-        } else {
-          ycats[i] = ycats[i].replace(f_text, window.mqc_rename_t_texts[idx]);
-        }
-      });
+      ycats[i] = ycat_toolbox[i].name;
     }
   }
 
@@ -1201,32 +1211,29 @@ function plot_heatmap(target, ds){
   if(config['sortHighlights'] == true){
     if(window.mqc_highlight_f_texts.length > 0){
       // Collect the highlighting indices
+      var sort_index = function(result){
+        var idx = result.highlight;
+        if(idx < 0){ return undefined; }
+        return window.mqc_highlight_f_texts[idx] == '' ? 0 : window.mqc_highlight_f_texts.length - idx;
+      };
       var xcat_hl = Array();
       var ycat_hl = Array();
       for (i=0; i < xcats.length; i++) {
-        $.each(window.mqc_highlight_f_texts, function(idx, f_text){
-          if(f_text == ''){ xcat_hl[i] = 0; }
-          else if((window.mqc_highlight_regex_mode && xcats[i].match(f_text)) || (!window.mqc_highlight_regex_mode && xcats[i].indexOf(f_text) > -1)){
-            xcat_hl[i] = window.mqc_highlight_f_texts.length - idx;
-          }
-        });
+        xcat_hl[i] = sort_index(xcat_toolbox[i]);
       }
       for (i=0; i < ycats.length; i++) {
-        $.each(window.mqc_highlight_f_texts, function(idx, f_text){
-          if(f_text == ''){ ycat_hl[i] = 0; }
-          else if((window.mqc_highlight_regex_mode && ycats[i].match(f_text)) || (!window.mqc_highlight_regex_mode && ycats[i].indexOf(f_text) > -1)){
-            ycat_hl[i] = window.mqc_highlight_f_texts.length - idx;
-          }
-        });
+        ycat_hl[i] = sort_index(ycat_toolbox[i]);
       }
       // Reshape the data - needs deepcopy as indexes are updated
       var newdata = JSON.parse(JSON.stringify(mqc_plots[target]['data']));
       var new_xcats = [], new_ycats = [];
+      var new_xcat_toolbox = [], new_ycat_toolbox = [];
       var xidx = 0, yidx = 0;
       for (hl = window.mqc_highlight_f_texts.length; hl >= 0; hl--){
         for (i=0; i < xcats.length; i++) {
           if(xcat_hl[i] == hl){
             new_xcats.push(xcats[i])
+            new_xcat_toolbox.push(xcat_toolbox[i])
             for (j=0; j < data.length; j++) {
               if(data[j][0] == i){ newdata[j][0] = xidx; }
             }
@@ -1236,6 +1243,7 @@ function plot_heatmap(target, ds){
         for (i=0; i < ycats.length; i++) {
           if(ycat_hl[i] == hl){
             new_ycats.push(ycats[i])
+            new_ycat_toolbox.push(ycat_toolbox[i])
             for (j=0; j < data.length; j++) {
               if(data[j][1] == i){ newdata[j][1] = yidx; }
             }
@@ -1246,6 +1254,8 @@ function plot_heatmap(target, ds){
       data = newdata;
       xcats = new_xcats;
       ycats = new_ycats;
+      xcat_toolbox = new_xcat_toolbox;
+      ycat_toolbox = new_ycat_toolbox;
     }
   }
 
@@ -1258,20 +1268,9 @@ function plot_heatmap(target, ds){
     var i = xcats.length;
     var xhidden = 0;
     while (i--) {
-      var match = false;
-      for (j = 0; j < window.mqc_hide_f_texts.length; j++) {
-        var f_text = window.mqc_hide_f_texts[j];
-        if(window.mqc_hide_regex_mode){
-          if(xcats[i].match(f_text)){ match = true; }
-        } else {
-          if(xcats[i].indexOf(f_text) > -1){ match = true; }
-        }
-      }
-      if(window.mqc_hide_mode == 'show'){
-        match = !match;
-      }
-      if(match){
+      if(xcat_toolbox[i].hidden){
         xcats.splice(i, 1);
+        xcat_toolbox.splice(i, 1);
         for (n=0; n < data.length; n++) {
           var x = data[n][1];
           if (x == i){ remove.push(n); }
@@ -1283,20 +1282,9 @@ function plot_heatmap(target, ds){
     var i = ycats.length;
     var yhidden = 0;
     while (i--) {
-      var match = false;
-      for (j = 0; j < window.mqc_hide_f_texts.length; j++) {
-        var f_text = window.mqc_hide_f_texts[j];
-        if(window.mqc_hide_regex_mode){
-          if(ycats[i].match(f_text)){ match = true; }
-        } else {
-          if(ycats[i].indexOf(f_text) > -1){ match = true; }
-        }
-      }
-      if(window.mqc_hide_mode == 'show'){
-        match = !match;
-      }
-      if(match){
+      if(ycat_toolbox[i].hidden){
         ycats.splice(i, 1);
+        ycat_toolbox.splice(i, 1);
         for (n=0; n < data.length; n++) {
           var y = data[n][0];
           if (y == i){
@@ -56,6 +56,8 @@ $(function () {
   // Listener to re-plot graphs if config loaded
   $(document).on('mqc_config_loaded', function(e){
     $('.hc-plot').each(function(){
+      // Lazy plots not shown yet are drawn with the new config when they scroll into view
+      if(window.mqc_lazy_plot_data && $(this).hasClass('not_rendered')){ return true; }
       var target = $(this).attr('id');
       plot_graph(target, undefined, mqc_config['num_datasets_plot_limit']);
     });
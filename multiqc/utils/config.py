@@ -8,71 +8,70 @@ from datetime import datetime
 import inspect
 import collections
 import os
-import pkg_resources
-import subprocess
 import sys
 import yaml
 
 import multiqc
+from multiqc.utils import entrypoints, run_state
 
 # Default logger will be replaced by caller
 import logging
 logger = logging.getLogger(__name__)
 
 # Get the MultiQC version
-version = pkg_resources.get_distribution("multiqc").version
-short_version = pkg_resources.get_distribution("multiqc").version
+version = entrypoints.get_version("multiqc")
+short_version = version
 script_path = os.path.dirname(os.path.realpath(__file__))
-git_hash = None
+git_hash = entrypoints.get_git_hash(script_path)
 git_hash_short = None
-try:
-    git_hash = subprocess.check_output( ['git', 'rev-parse', 'HEAD'],
-                                        cwd=script_path,
-                                        stderr=subprocess.STDOUT,
-                                        universal_newlines=True ).strip()
+if git_hash is not None:
     git_hash_short = git_hash[:7]
     version = '{} ({})'.format(version, git_hash_short)
-except:
-    pass
 
 # Constants
 MULTIQC_DIR = os.path.dirname(os.path.realpath(inspect.getfile(multiqc)))
 
 ##### MultiQC Defaults
-# Default MultiQC config
-searchp_fn = os.path.join( MULTIQC_DIR, 'utils', 'config_defaults.yaml')
-with open(searchp_fn) as f:
-    configs = yaml.safe_load(f)
-    for c, v in configs.items():
-        globals()[c] = v
-# Module filename search patterns
-searchp_fn = os.path.join( MULTIQC_DIR, 'utils', 'search_patterns.yaml')
-with open(searchp_fn) as f:
-    sp = yaml.safe_load(f)
-
-# Other defaults that can't be set in YAML
-data_tmp_dir = '/tmp' # will be overwritten by core script
-modules_dir = os.path.join(MULTIQC_DIR, 'modules')
-creation_date = datetime.now().strftime("%Y-%m-%d, %H:%M")
-working_dir = os.getcwd()
-analysis_dir = [os.getcwd()]
-output_dir = os.path.realpath(os.getcwd())
-megaqc_access_token = os.environ.get('MEGAQC_ACCESS_TOKEN')
+# Use the much faster LibYAML parser for the bundled files, if available
+try:
+    yaml_loader = yaml.CSafeLoader
+except AttributeError:
+    yaml_loader = yaml.SafeLoader
+
+def load_defaults():
+    """ Set all config variables to their defaults """
+    # Default MultiQC config
+    state.searchp_fn = os.path.join( MULTIQC_DIR, 'utils', 'config_defaults.yaml')
+    with open(state.searchp_fn) as f:
+        state.configs = yaml.load(f, Loader=yaml_loader)
+        for c, v in state.configs.items():
+            setattr(state, c, v)
+    # Module filename search patterns
+    state.searchp_fn = os.path.join( MULTIQC_DIR, 'utils', 'search_patterns.yaml')
+    with open(state.searchp_fn) as f:
+        state.sp = yaml.load(f, Loader=yaml_loader)
+
+    # Other defaults that can't be set in YAML
+    state.data_tmp_dir = '/tmp' # will be overwritten by core script
+    state.modules_dir = os.path.join(MULTIQC_DIR, 'modules')
+    state.creation_date = datetime.now().strftime("%Y-%m-%d, %H:%M")
+    state.working_dir = os.getcwd()
+    state.analysis_dir = [os.getcwd()]
+    state.output_dir = os.path.realpath(os.getcwd())
+    state.megaqc_access_token = os.environ.get('MEGAQC_ACCESS_TOKEN')
 
 ##### Available modules
 # Modules must be listed in setup.py under entry_points['multiqc.modules.v1']
 # Get all modules, including those from other extension packages
 avail_modules = dict()
-for entry_point in pkg_resources.iter_entry_points('multiqc.modules.v1'):
-    nicename = str(entry_point).split('=')[0].strip()
+for nicename, entry_point in entrypoints.iter_entry_points('multiqc.modules.v1'):
     avail_modules[nicename] = entry_point
 
 ##### Available templates
 # Templates must be listed in setup.py under entry_points['multiqc.templates.v1']
 # Get all templates, including those from other extension packages
 avail_templates = {}
-for entry_point in pkg_resources.iter_entry_points('multiqc.templates.v1'):
-    nicename = str(entry_point).split('=')[0].strip()
+for nicename, entry_point in entrypoints.iter_entry_points('multiqc.templates.v1'):
     avail_templates[nicename] = entry_point
 
 ##### Check we have modules & templates
@@ -147,20 +146,19 @@ def mqc_cl_config(cl_config):
             mqc_add_config(parsed_clc)
 
 def mqc_add_config(conf, conf_path=None):
-    """ Add to the global config with given MultiQC config dict """
-    global fn_clean_exts, fn_clean_trim
+    """ Add to the config with given MultiQC config dict """
     for c, v in conf.items():
         if c == 'sp':
             # Merge filename patterns instead of replacing
-            sp.update(v)
+            state.sp.update(v)
             logger.debug("Added to filename patterns: {}".format(v))
         elif c == 'extra_fn_clean_exts':
             # Prepend to filename cleaning patterns instead of replacing
-            fn_clean_exts[0:0] = v
+            state.fn_clean_exts[0:0] = v
             logger.debug("Added to filename clean extensions: {}".format(v))
         elif c == 'extra_fn_clean_trim':
             # Prepend to filename cleaning patterns instead of replacing
-            fn_clean_trim[0:0] = v
+            state.fn_clean_trim[0:0] = v
             logger.debug("Added to filename clean trimmings: {}".format(v))
         elif c in ['custom_logo'] and v:
             # Resolve file paths - absolute or cwd, or relative to config file
@@ -182,7 +180,6 @@ def mqc_add_config(conf, conf_path=None):
 # Essentially a fancy way of loading stuff into the sample_names_rename config var
 # As such, can also be done directly using a config file
 def load_sample_names(snames_file):
-    global sample_names_rename_buttons, sample_names_rename
     num_cols = None
     try:
         with open(snames_file) as f:
@@ -196,18 +193,23 @@ def load_sample_names(snames_file):
                     elif num_cols != len(s):
                         logger.warn("Inconsistent number of columns found in sample names file (skipping line): '{}'".format(l.strip()))
                     # Parse the line
-                    if len(sample_names_rename_buttons) == 0:
-                        sample_names_rename_buttons = s
+                    if len(state.sample_names_rename_buttons) == 0:
+                        state.sample_names_rename_buttons = s
                     else:
-                        sample_names_rename.append(s)
+                        state.sample_names_rename.append(s)
                 elif len(l.strip()) > 0:
                     logger.warn("Sample names file line did not have columns (must use tabs): {}".format(l.strip()))
     except (IOError, AttributeError) as e:
         logger.error("Error loading sample names file: {}".format(e))
-    logger.debug("Found {} sample renaming patterns".format(len(sample_names_rename_buttons)))
+    logger.debug("Found {} sample renaming patterns".format(len(state.sample_names_rename_buttons)))
+
+def reset():
+    """ Set the config back to the defaults, removing anything
+    set since the current run started """
+    run_state.reset(__name__)
 
 def update(u):
-    return update_dict(globals(), u)
+    return update_dict(run_state.state_dict(__name__), u)
 
 def update_dict(d, u):
     """ Recursively updates nested dict d from nested dict u
@@ -218,3 +220,6 @@ def update_dict(d, u):
         else:
             d[key] = u[key]
     return d
+
+# The config values are kept separately for each run (see run_state.py)
+state = run_state.state_module(__name__, load_defaults)
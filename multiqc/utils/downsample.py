@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+""" Reduce the number of points in line graph series, using NumPy.
+
+Three methods are available:
+    'lttb' - Largest-Triangle-Three-Buckets. Keeps the points that best
+             preserve the shape of the line, including peaks and dips.
+    'minmax' - Keeps the lowest and highest point in each bin.
+    'first' - Keeps the first point in each bin (the original MultiQC method).
+
+The first and last points are always kept.
+"""
+
+from __future__ import print_function, division
+from collections import OrderedDict
+import numpy as np
+
+# Default logger will be replaced by caller
+import logging
+logger = logging.getLogger(__name__)
+
+methods = ['lttb', 'minmax', 'first']
+
+def downsample_series(d, numpoints, method='lttb'):
+    """ Downsample a dict of x: y values to at most numpoints points.
+    Returns an OrderedDict, or d itself if it is already small enough.
+    Series with non-numeric x or y values are downsampled with the 'first'
+    method, keeping their original order. """
+    if numpoints is None or len(d) <= numpoints or len(d) == 0:
+        return d
+    numpoints = max(int(numpoints), 2)
+    items = list(d.items())
+
+    if method not in methods:
+        logger.warning("Unknown smooth_points_method '{}', using 'lttb'".format(method))
+        method = 'lttb'
+    if method != 'first':
+        try:
+            x = np.array([xy[0] for xy in items], dtype=float)
+            y = np.array([xy[1] for xy in items], dtype=float)
+            if not (np.isfinite(x).all() and np.isfinite(y).all()):
+                method = 'first'
+        except (TypeError, ValueError):
+            method = 'first'
+
+    if method == 'first':
+        idx = first_indices(len(items), numpoints)
+    else:
+        order = np.argsort(x, kind='mergesort')
+        x, y = x[order], y[order]
+        # Min / max needs room for two points per bin
+        if method == 'lttb' or numpoints < 4:
+            idx = order[lttb_indices(x, y, numpoints)]
+        else:
+            idx = order[minmax_indices(y, numpoints)]
+    return OrderedDict(items[i] for i in idx)
+
+def first_indices(n, numpoints):
+    """ Indices of the first point in each of numpoints bins, with the first and
+    last points kept. Eg. n=10, numpoints=6 gives [0, 2, 4, 5, 7, 9] """
+    binsize = (n - 1) / (numpoints - 1)
+    return np.unique(np.round(np.arange(numpoints) * binsize).astype(int))
+
+def lttb_indices(x, y, numpoints):
+    """ Indices of the points chosen by Largest-Triangle-Three-Buckets.
+    x must be sorted. The points between the first and the last are split into
+    numpoints - 2 buckets, and from each bucket the point making the largest
+    triangle with the point chosen from the previous bucket and the mean
+    of the next bucket is kept. """
+    n = len(x)
+    if numpoints >= n:
+        return np.arange(n)
+    if numpoints < 3:
+        return np.array([0, n - 1])
+    num_buckets = numpoints - 2
+    edges = (np.arange(num_buckets + 1) * ((n - 2) / num_buckets) + 1).astype(int)
+    edges[-1] = n - 1
+
+    # Mean of each bucket, plus the last point as the 'next bucket' of the last bucket
+    x_sums = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    y_sums = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    x_means = np.append(x_sums / counts, x[-1])
+    y_means = np.append(y_sums / counts, y[-1])
+
+    idx = np.empty(numpoints, dtype=int)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for i in range(num_buckets):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        cx, cy = x_means[i + 1], y_means[i + 1]
+        areas = np.abs((ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay))
+        a = start + int(np.argmax(areas))
+        idx[i + 1] = a
+    return idx
+
+def minmax_indices(y, numpoints):
+    """ Indices of the lowest and highest point in each bin, in order.
+    The points between the first and the last are split into (numpoints - 2) // 2 bins. """
+    n = len(y)
+    num_bins = (numpoints - 2) // 2
+    inner = np.arange(1, n - 1)
+    bin_ids = (inner - 1) * num_bins // (n - 2)
+    # Sort by bin then by y, so the first and last index in each bin are its min and max
+    order = inner[np.lexsort((y[inner], bin_ids))]
+    bin_starts = np.searchsorted(bin_ids[order - 1], np.arange(num_bins))
+    bin_ends = np.append(bin_starts[1:], len(order)) - 1
+    idx = np.concatenate(([0], order[bin_starts], order[bin_ends], [n - 1]))
+    return np.unique(idx)
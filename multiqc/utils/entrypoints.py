@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+""" Find MultiQC entry points (modules, templates, plugin hooks and
+command line options) and the installed MultiQC version.
+
+Uses importlib.metadata where available, which is much quicker than
+importing pkg_resources. All entry points are read in one go the first
+time they are needed and kept for the rest of the run. """
+
+from __future__ import print_function
+from collections import OrderedDict
+import os
+
+try:
+    from importlib import metadata as importlib_metadata # Python 3.8+
+except ImportError:
+    try:
+        import importlib_metadata # Backport package, if installed
+    except ImportError:
+        importlib_metadata = None
+
+# Entry points by group, then name
+_index = None
+
+def _read_entry_points():
+    """ Return an OrderedDict of groups, each with a list of (name, entry point) """
+    index = OrderedDict()
+    if importlib_metadata is not None:
+        for dist in importlib_metadata.distributions():
+            for ep in dist.entry_points:
+                if ep.group.startswith('multiqc.'):
+                    index.setdefault(ep.group, list()).append((ep.name, ep))
+    else:
+        import pkg_resources
+        for dist in pkg_resources.working_set:
+            for group, eps in dist.get_entry_map().items():
+                if group.startswith('multiqc.'):
+                    for name, ep in eps.items():
+                        index.setdefault(group, list()).append((name, ep))
+    return index
+
+def iter_entry_points(group):
+    """ Yield (name, entry point) for each entry point in a group, eg. 'multiqc.modules.v1'.
+    Use entry_point.load() to import the object it refers to. """
+    global _index
+    if _index is None:
+        _index = _read_entry_points()
+    seen = set()
+    for name, ep in _index.get(group, []):
+        # The same distribution can be found more than once on sys.path
+        if name not in seen:
+            seen.add(name)
+            yield name, ep
+
+def get_version(package='multiqc'):
+    """ Return the installed version of a package """
+    if importlib_metadata is not None:
+        return importlib_metadata.version(package)
+    import pkg_resources
+    return pkg_resources.get_distribution(package).version
+
+def get_git_hash(path):
+    """ Return the commit checked out in the git repository containing path, or None.
+    Reads the files in the .git directory, which is much quicker than running git. """
+    repo_dir = os.path.abspath(path)
+    while not os.path.exists(os.path.join(repo_dir, '.git')):
+        parent = os.path.dirname(repo_dir)
+        if parent == repo_dir:
+            return None
+        repo_dir = parent
+    git_dir = os.path.join(repo_dir, '.git')
+    try:
+        # Worktrees and submodules have a .git file pointing to the real directory
+        if os.path.isfile(git_dir):
+            with open(git_dir) as f:
+                gitdir_line = f.read().strip()
+            if not gitdir_line.startswith('gitdir:'):
+                return None
+            git_dir = os.path.join(repo_dir, gitdir_line[len('gitdir:'):].strip())
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+        if not head.startswith('ref:'):
+            return head # Detached HEAD
+        ref = head[len('ref:'):].strip()
+        # Worktrees keep branches in the main repository directory
+        common_dir = git_dir
+        if os.path.isfile(os.path.join(git_dir, 'commondir')):
+            with open(os.path.join(git_dir, 'commondir')) as f:
+                common_dir = os.path.join(git_dir, f.read().strip())
+        for d in [git_dir, common_dir]:
+            if os.path.isfile(os.path.join(d, ref)):
+                with open(os.path.join(d, ref)) as f:
+                    return f.read().strip()
+        with open(os.path.join(common_dir, 'packed-refs')) as f:
+            for l in f:
+                s = l.strip().split(' ')
+                if len(s) == 2 and s[1] == ref:
+                    return s[0]
+    except (IOError, OSError):
+        pass
+    return None
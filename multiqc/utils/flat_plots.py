@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+""" Draw and save flat (MatPlotLib) plots.
+
+Each figure is laid out once: its tight bounding box is worked out a single
+time and used for every export format, and the PNG is only rendered once for
+both the exported file and the image embedded in the report.
+
+With plot_workers above 1, figures are still made when the plot function is
+called (so errors fall back to interactive plots as before), but they are not
+rendered and saved then. Instead, the plot HTML gets a placeholder for the
+image and the figures are saved after all modules have run, in a pool of
+worker processes forked from the main process (so the figures don't need to
+be pickled). The placeholders in the module HTML are then replaced with the
+images.
+"""
+
+from __future__ import print_function
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import traceback
+
+from multiqc.utils import config, run_state
+
+logger = logging.getLogger(__name__)
+
+try:
+    string_types = basestring # Py2
+except NameError:
+    string_types = str # Py3
+
+def init():
+    """ Clear figures left from an earlier run """
+    # Figures waiting to be saved: (pid, figure, extra artists)
+    state.pending = list()
+
+placeholder_re = re.compile(r'<!--mqc_flat_plot:(.+?)-->')
+
+# MatPlotLib's pyplot isn't thread safe, so reports made in other threads take turns
+pyplot_lock = threading.RLock()
+
+def figure_src(draw_func, args, pid):
+    """ Image src for a flat plot. draw_func(*args) must make the figure
+    and return it with a list of extra artists to fit in the saved image
+    (or None). The figure is saved now, or later if using plot workers. """
+    with pyplot_lock:
+        fig, extra_artists = draw_func(*args)
+        if config.plot_workers > 1 and not multiprocessing.current_process().daemon:
+            # Figures are kept open until they are saved, which is expected
+            from matplotlib import rcParams
+            rcParams['figure.max_open_warning'] = 0
+            state.pending.append((pid, fig, extra_artists))
+            return '<!--mqc_flat_plot:{}-->'.format(pid)
+        try:
+            return save_figure(fig, pid, extra_artists)
+        finally:
+            close_figure(fig)
+
+def close_figure(fig):
+    """ Free the memory used by a figure """
+    from multiqc.plots import linegraph
+    linegraph.get_pyplot().close(fig)
+
+def save_figure(fig, pid, extra_artists=None):
+    """ Save a figure in each export format and return the src for its <img>:
+    a base64 PNG, or the path of the exported PNG if the template links to files """
+    embed = getattr(config.avail_templates[config.template].load(), 'base64_plots', True) is True
+    formats = list(config.export_plot_formats) if config.export_plots else []
+    if embed and 'png' not in formats:
+        formats.append('png')
+    bbox = tight_bbox(fig, extra_artists)
+    png = None
+    for fformat in formats:
+        img_buffer = io.BytesIO()
+        fig.savefig(img_buffer, format=fformat, bbox_inches=bbox, bbox_extra_artists=extra_artists)
+        if fformat == 'png':
+            png = img_buffer.getvalue()
+        if config.export_plots and fformat in config.export_plot_formats:
+            # Make the directory if it doesn't already exist
+            plot_dir = os.path.join(config.plots_dir, fformat)
+            if not os.path.exists(plot_dir):
+                os.makedirs(plot_dir)
+            with io.open(os.path.join(plot_dir, '{}.{}'.format(pid, fformat)), 'wb') as f:
+                f.write(img_buffer.getvalue())
+    if embed:
+        return 'data:image/png;base64,{}'.format(base64.b64encode(png).decode('utf8'))
+    return os.path.join(config.plots_dir_name, 'png', '{}.png'.format(pid))
+
+def tight_bbox(fig, extra_artists=None):
+    """ Bounding box in inches that fits everything drawn in the figure,
+    as found by savefig(bbox_inches='tight'), or 'tight' if this version
+    of MatPlotLib can't give it """
+    try:
+        from matplotlib import rcParams
+        bbox = fig.get_tightbbox(fig.canvas.get_renderer(), bbox_extra_artists=extra_artists)
+        return bbox.padded(rcParams['savefig.pad_inches'])
+    except (AttributeError, TypeError):
+        return 'tight'
+
+def draw_pending(modules):
+    """ Save the figures waiting for plot workers and put them in the module HTML """
+    if len(state.pending) == 0:
+        return
+    logger.info("Saving {} flat plots with {} processes".format(len(state.pending), config.plot_workers))
+    images = dict()
+    for (pid, fig, extra_artists), (src, error) in zip(state.pending, _draw_all()):
+        with pyplot_lock:
+            if src is None:
+                logger.debug("Saving plot '{}' again in the main process: {}".format(pid, error))
+                try:
+                    src = save_figure(fig, pid, extra_artists)
+                except Exception as e:
+                    logger.error("Could not save plot '{}': {}".format(pid, e))
+                    logger.debug(traceback.format_exc())
+                    src = ''
+            close_figure(fig)
+        images[pid] = src
+    init()
+
+    def replace(match):
+        return images.get(match.group(1), match.group(0))
+    for m in modules:
+        if isinstance(getattr(m, 'intro', None), string_types):
+            m.intro = placeholder_re.sub(replace, m.intro)
+        for s in m.sections:
+            for k, v in s.items():
+                if isinstance(v, string_types):
+                    s[k] = placeholder_re.sub(replace, v)
+
+def _draw_all():
+    """ (src, error) for each pending figure, saved in worker processes if possible """
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except AttributeError:
+        ctx = multiprocessing # Python 2 - always forks on posix
+    except ValueError:
+        ctx = None
+        logger.warning("Can't save plots in parallel on this platform, saving them one at a time")
+    pool = None
+    if ctx is not None:
+        try:
+            pool = ctx.Pool(min(config.plot_workers, len(state.pending)), initializer=run_state.bind, initargs=(run_state.current(),))
+        except (ImportError, OSError) as e:
+            logger.warning("Could not start plot worker processes, saving plots one at a time: {}".format(e))
+    if pool is None:
+        return [ (None, 'no worker processes') for p in state.pending ]
+    try:
+        results = pool.map(_draw_worker, range(len(state.pending)), chunksize=1)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
+
+def _draw_worker(idx):
+    """ Save one pending figure in a worker process """
+    pid, fig, extra_artists = state.pending[idx]
+    try:
+        return save_figure(fig, pid, extra_artists), None
+    except Exception as e:
+        return None, '{}: {}'.format(e.__class__.__name__, e)
+
+state = run_state.state_module(__name__, init)
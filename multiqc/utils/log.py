@@ -9,11 +9,27 @@ import os
 import shutil
 import tempfile
 
-from multiqc.utils import config, util_functions
+from multiqc.utils import config, run_state, util_functions
 
 LEVELS = {0: 'INFO', 1: 'DEBUG'}
-log_tmp_dir = None
-log_tmp_fn = '/dev/null'
+
+def init():
+    """ Log file and handlers of the current run """
+    state.log_tmp_dir = None
+    state.log_tmp_fn = '/dev/null'
+    # Handlers added by init_log()
+    state.log_handlers = list()
+
+class ReportFilter(logging.Filter):
+    """ Only pass messages logged by one run, so that runs in other
+    threads don't write to each other's console and log file """
+
+    def __init__(self, report):
+        logging.Filter.__init__(self)
+        self.report = report
+
+    def filter(self, record):
+        return run_state.current() is self.report
 
 def init_log(logger, loglevel=0):
     """
@@ -25,10 +41,15 @@ def init_log(logger, loglevel=0):
     Args:
         loglevel (str): Determines the level of the log output.
     """
+    # Remove the handlers from earlier runs
+    for handler in list(logger.handlers):
+        if any(isinstance(f, ReportFilter) and f.report.replaced for f in handler.filters):
+            logger.removeHandler(handler)
+            handler.close()
+
     # File for logging
-    global log_tmp_dir, log_tmp_fn
-    log_tmp_dir = tempfile.mkdtemp()
-    log_tmp_fn = os.path.join(log_tmp_dir, 'multiqc.log')
+    state.log_tmp_dir = tempfile.mkdtemp()
+    state.log_tmp_fn = os.path.join(state.log_tmp_dir, 'multiqc.log')
 
     # Logging templates
     debug_template = '[%(asctime)s] %(name)-50s [%(levelname)-7s]  %(message)s'
@@ -36,6 +57,7 @@ def init_log(logger, loglevel=0):
 
     # Base level setup
     logger.setLevel(getattr(logging, 'DEBUG'))
+    report_filter = ReportFilter(run_state.current())
 
     # Set up the console logging stream
     console = logging.StreamHandler()
@@ -44,23 +66,31 @@ def init_log(logger, loglevel=0):
         console.setFormatter(logging.Formatter(debug_template))
     else:
         console.setFormatter(logging.Formatter(info_template))
+    console.addFilter(report_filter)
     logger.addHandler(console)
+    state.log_handlers.append(console)
 
     # Now set up the file logging stream if we have a data directory
-    file_handler = logging.FileHandler(log_tmp_fn, encoding='utf-8')
+    file_handler = logging.FileHandler(state.log_tmp_fn, encoding='utf-8')
     file_handler.setLevel(getattr(logging, 'DEBUG')) # always DEBUG for the file
     file_handler.setFormatter(logging.Formatter(debug_template))
+    file_handler.addFilter(report_filter)
     logger.addHandler(file_handler)
+    state.log_handlers.append(file_handler)
 
 def move_tmp_log(logger):
     """ Move the temporary log file to the MultiQC data directory
     if it exists. """
 
     try:
-        # https://stackoverflow.com/questions/15435652/python-does-not-release-filehandles-to-logfile
-        logging.shutdown()
-        shutil.move(log_tmp_fn, os.path.join(config.data_dir, 'multiqc.log'))
-        util_functions.robust_rmtree(log_tmp_dir)
+        # Close the log file before moving it. Only this run's file,
+        # runs in other threads may still be logging.
+        for handler in state.log_handlers:
+            if isinstance(handler, logging.FileHandler):
+                logger.removeHandler(handler)
+                handler.close()
+        shutil.move(state.log_tmp_fn, os.path.join(config.data_dir, 'multiqc.log'))
+        util_functions.robust_rmtree(state.log_tmp_dir)
     except (AttributeError, TypeError, IOError):
         pass
 
@@ -86,3 +116,5 @@ def get_log_stream(logger):
         return file_stream
 
     return log_stream
+
+state = run_state.state_module(__name__, init)
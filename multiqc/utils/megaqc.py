@@ -3,11 +3,13 @@
 """ MultiQC code to export data to MegaQC / flat JSON files """
 
 from __future__ import print_function
+from collections import OrderedDict
 import gzip
 import io
 import json
 import os
-import requests
+import re
+import shutil
 
 from multiqc import config
 log = config.logger
@@ -68,6 +70,115 @@ def multiqc_dump_json(report):
     return exported_data
 
 
+def multiqc_render_json(report):
+    """ Extra data saved to multiqc_data.json so that the report can be made
+    again with multiqc --from-data: the module sections and the results of the
+    General Statistics 'modify' functions for each sample """
+    modules_output = list()
+    for m in report.modules_output:
+        # The run time section is made again if needed
+        if m.anchor == 'multiqc_runtime':
+            continue
+        modules_output.append({
+            'name': m.name,
+            'anchor': m.anchor,
+            'intro': m.intro,
+            'sections': m.sections,
+            'css': getattr(m, 'css', {}),
+            'js': getattr(m, 'js', {})
+        })
+    general_stats_modified = list()
+    for data, headers in zip(report.general_stats_data, report.general_stats_headers):
+        modified = dict()
+        for k, header in headers.items():
+            if not callable(header.get('modify')):
+                continue
+            modified[k] = dict()
+            for s_name, samp in data.items():
+                try:
+                    modified[k][s_name] = header['modify'](samp[k])
+                except Exception:
+                    pass
+        general_stats_modified.append(modified)
+    return {
+        'report_modules_output': modules_output,
+        'report_general_stats_modified': general_stats_modified,
+        'report_general_stats_ordered': [ isinstance(h, OrderedDict) for h in report.general_stats_headers ],
+        'report_num_hc_plots': report.num_hc_plots,
+        'report_num_mpl_plots': report.num_mpl_plots
+    }
+
+def multiqc_load_json(fn, report):
+    """ Load the report data saved in multiqc_data.json by a previous run.
+    Returns the module objects to add to the report. """
+    from multiqc.modules.base_module import BaseMultiqcModule
+    from multiqc.utils import module_runner, util_functions
+    with io.open(fn, encoding='utf-8') as f:
+        data = json.load(f, object_pairs_hook=OrderedDict)
+    if 'report_modules_output' not in data:
+        raise ValueError("'{}' doesn't have the module sections needed to make a report. "
+                         "It must be saved by MultiQC v{} or later.".format(fn, config.short_version))
+    if data.get('config_short_version') != config.short_version:
+        log.warning("'{}' was made with MultiQC v{}, this is v{}".format(fn, data.get('config_short_version'), config.short_version))
+
+    # Report details from the original run, unless set again now
+    config.analysis_dir = data.get('config_analysis_dir_abs', [])
+    for k in ['title', 'subtitle', 'intro_text', 'report_comment', 'report_header_info']:
+        if getattr(config, k, None) is None and data.get('config_{}'.format(k)) is not None:
+            setattr(config, k, data['config_{}'.format(k)])
+
+    for mod, sects in data.get('report_data_sources', {}).items():
+        for sect, sources in sects.items():
+            report.data_sources[mod][sect].update(sources)
+    report.plot_data = data.get('report_plot_data', {})
+    report.num_hc_plots = data.get('report_num_hc_plots', 0)
+    report.num_mpl_plots = data.get('report_num_mpl_plots', 0)
+
+    # JSON can't hold the 'modify' functions, so look up their results for each sample instead
+    report.general_stats_data = data.get('report_general_stats_data', [])
+    report.general_stats_headers = list()
+    for gs_data, headers, modified, ordered in zip(report.general_stats_data, data.get('report_general_stats_headers', []),
+                                                   data['report_general_stats_modified'], data['report_general_stats_ordered']):
+        # Unordered headers are sorted by title in the table
+        if not ordered:
+            headers = dict(headers)
+        report.general_stats_headers.append(headers)
+        for k, header in headers.items():
+            header.pop('modify', None)
+            # Column IDs get the General Statistics prefix again when the table is made
+            rid_prefix = 'mqc-generalstats-{}-'.format(re.sub(r'\W+', '_', header['namespace']).strip().strip('_').lower())
+            if header.get('rid', '').startswith(rid_prefix):
+                header['rid'] = header['rid'][len(rid_prefix):]
+            if k in modified:
+                results = { gs_data[s_name][k]: val for s_name, val in modified[k].items() }
+                header['modify'] = module_runner.ModifyLookup(results.__getitem__, list(results.keys()))
+
+    # Copy the module data files from the earlier run if they are next to the JSON file,
+    # as modules can change their data after writing it. Otherwise write them again.
+    for data_fn, raw_data in data.get('report_saved_raw_data', {}).items():
+        report.saved_raw_data[data_fn] = raw_data
+        if config.data_dir is None:
+            continue
+        for ext in config.data_format_extensions.values():
+            src = os.path.join(os.path.dirname(fn), '{}.{}'.format(data_fn, ext))
+            if os.path.isfile(src):
+                shutil.copy(src, config.data_dir)
+                break
+        else:
+            util_functions.write_data_file(raw_data, data_fn)
+
+    modules = list()
+    for m_data in data['report_modules_output']:
+        m = BaseMultiqcModule.__new__(BaseMultiqcModule)
+        m.__dict__.update(m_data)
+        report.save_htmlid(m.anchor, skiplint=True)
+        for s in m.sections:
+            if s.get('anchor'):
+                report.save_htmlid(s['anchor'], skiplint=True)
+        modules.append(m)
+    report.html_ids.extend(report.plot_data.keys())
+    return modules
+
 def multiqc_api_post(exported_data):
     headers = { 'Content-Type': 'application/json', 'content-encoding': 'gzip' }
     if config.megaqc_access_token is not None:
@@ -82,6 +193,9 @@ def multiqc_api_post(exported_data):
     gzfh.close()
     request_body = sio_obj.getvalue()
 
+    # Imported here as requests is slow to load
+    import requests
+
     log.debug("Sending data to MegaQC")
     log.debug("MegaQC URL: {}".format(config.megaqc_url))
     try:
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+
+""" Run MultiQC modules in parallel worker processes.
+
+Modules report their results through the variables in multiqc.utils.report
+(kept in the current run's Report, see run_state.py). Each worker runs one module with fresh copies of these,
+sends back what the module added and the parent merges the results in the
+original module order. Results are only used if they are exactly what running
+the module in the main process would have given, otherwise the module is run
+again in the main process. """
+
+from __future__ import print_function
+from collections import defaultdict
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import traceback
+
+from multiqc.utils import config, report, parse_cache, profiling, run_state, shards
+
+logger = config.logger
+
+def init():
+    """ Clear the module timings from an earlier run """
+    # Modules dropped by modules_with_files() and the seconds taken to import each module that ran
+    state.skipped_modules = list()
+    state.load_times = list()
+
+def run_module(mod_dict):
+    """ Load and run a single MultiQC module.
+    Returns a list of module objects and an exit code """
+    this_module = list(mod_dict.keys())[0]
+    mod_cust_config = list(mod_dict.values())[0]
+    shards.current_module = this_module
+    try:
+        load_start = time.time()
+        with profiling.timer('import', this_module):
+            mod = config.avail_modules[this_module].load()
+        state.load_times.append(time.time() - load_start)
+        mod.mod_cust_config = mod_cust_config # feels bad doing this, but seems to work
+        with profiling.timer('module', this_module):
+            output = mod()
+        if type(output) != list:
+            output = [output]
+        return output, 0
+    except UserWarning:
+        logger.debug("No samples found: {}".format(this_module))
+        return [], 0
+    except KeyboardInterrupt:
+        raise
+    except:
+        # Flag the error, but carry on
+        logger.error("Oops! The '{}' MultiQC module broke... \n".format(this_module) + \
+                  "  Please copy the following traceback and report it at " + \
+                  "https://github.com/ewels/MultiQC/issues \n" + \
+                  "  If possible, please include a log file that triggers the error - " + \
+                  "the last file found was:\n" + \
+                  "    {}\n".format(report.last_found_file) + \
+                  ('='*60)+"\nModule {} raised an exception: {}".format(
+                      this_module, traceback.format_exc()) + ('='*60))
+        return [], 1
+
+def modules_with_files(run_modules):
+    """ Drop modules that have search patterns but didn't find any files,
+    so that they aren't imported at all. Modules without any search patterns
+    are kept, as they may get their data some other way. Custom Content is
+    kept if any of its search patterns found files, or if data was given
+    in the config. Returns the list of modules to run. """
+    found_mods = set()
+    searched_mods = set()
+    for key, files in report.files.items():
+        mod_name = key.split('/', 1)[0].lower()
+        searched_mods.add(mod_name)
+        if len(files) > 0:
+            found_mods.add(mod_name)
+
+    custom_data = getattr(config, 'custom_data', {})
+    custom_keys = set([ k.lower() for k in custom_data.keys() ])
+    custom_keys.add('custom_content')
+    for k, f in custom_data.items():
+        if isinstance(f, dict) and 'data' in f:
+            found_mods.add('custom_content')
+    if custom_keys & found_mods:
+        found_mods.add('custom_content')
+    searched_mods.add('custom_content')
+
+    keep_modules = list()
+    skipped = list()
+    for mod_dict in run_modules:
+        this_module = list(mod_dict.keys())[0]
+        if this_module.lower() in searched_mods and this_module.lower() not in found_mods:
+            skipped.append(this_module)
+        else:
+            keep_modules.append(mod_dict)
+    if len(skipped) > 0:
+        logger.debug("Skipping {} modules with no matching files: {}".format(len(skipped), ', '.join(skipped)))
+    state.skipped_modules.extend(skipped)
+    return keep_modules
+
+def log_time_saved():
+    """ Log roughly how long the modules skipped by modules_with_files() would
+    have taken to import. They aren't imported, so this is estimated from the
+    median import time of the modules that ran. """
+    if len(state.skipped_modules) == 0 or len(state.load_times) == 0:
+        return
+    times = sorted(state.load_times)
+    median = (times[(len(times) - 1) // 2] + times[len(times) // 2]) / 2.0
+    logger.info("Skipped {} modules with no matching files, saving about {:.2f}s".format(len(state.skipped_modules), median * len(state.skipped_modules)))
+
+def run_modules_parallel(run_modules, num_workers):
+    """ Run modules using a pool of worker processes. Yields the same
+    (output, exit code) tuples as run_module() for each module, in order,
+    after merging its results into the report. """
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except AttributeError:
+        ctx = multiprocessing # Python 2 - always forks on posix
+    except ValueError:
+        logger.warning("Can't run modules in parallel on this platform, running them one at a time")
+        ctx = None
+    pool = None
+    if ctx is not None:
+        try:
+            pool = ctx.Pool(num_workers, initializer=_init_worker, initargs=(run_state.current(),))
+        except (ImportError, OSError) as e:
+            logger.warning("Could not start module worker processes, running modules one at a time: {}".format(e))
+    if pool is None:
+        for mod_dict in run_modules:
+            yield run_module(mod_dict)
+        return
+
+    logger.debug("Running modules with {} worker processes".format(num_workers))
+    try:
+        results = pool.imap(_run_module_worker, run_modules)
+        for mod_dict in run_modules:
+            result = next(results)
+            if result is not None:
+                result = pickle.loads(result)
+                if _merge_result(result):
+                    yield result['output'], result['exit_code']
+                    continue
+                _remove_output_dirs(result)
+            logger.debug("Running module '{}' again in the main process".format(list(mod_dict.keys())[0]))
+            yield run_module(mod_dict)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+class ModifyLookup(object):
+    """ Picklable replacement for a table header 'modify' function, holding
+    its results for every value in the table. """
+
+    def __init__(self, func, values):
+        self.results = dict()
+        self.nan_result = None
+        # JSON encoders save modify functions as their result for 1
+        for val in list(values) + [1]:
+            for v in (val, _try_float(val)):
+                try:
+                    res = (True, func(v))
+                except Exception as e:
+                    res = (False, e)
+                if v != v:
+                    self.nan_result = res
+                else:
+                    try:
+                        self.results[v] = res
+                    except TypeError:
+                        pass # unhashable value
+
+    def __call__(self, val):
+        if val != val:
+            ok, res = self.nan_result
+        else:
+            ok, res = self.results[val]
+        if not ok:
+            raise res
+        return res
+
+def _try_float(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return val
+
+# State of the report before any modules were run, saved in each worker process
+_initial_state = dict()
+
+def _init_worker(run_report):
+    """ Save the starting state, so that each module run by this worker starts
+    from the same point. Make sure that worker processes don't share the
+    parse cache database connection. """
+    run_state.bind(run_report)
+    _initial_state['html_ids'] = list(report.html_ids)
+    _initial_state['config'] = dict(run_state.state_dict(config.__name__))
+    if report.parse_cache is not None:
+        report.parse_cache = parse_cache.ParseCache(report.parse_cache.db_fn)
+
+def _run_module_worker(mod_dict):
+    """ Run a module in a worker process. Returns the pickled module output and
+    everything it added to the report, or None if it can't be pickled. """
+    report.html_ids = list(_initial_state['html_ids'])
+    num_html_ids = len(report.html_ids)
+    config_state = run_state.state_dict(config.__name__)
+    for k in list(config_state.keys()):
+        if k not in _initial_state['config']:
+            del config_state[k]
+    config_state.update(_initial_state['config'])
+    config_before = dict(config_state)
+
+    # Write data files and exported plots to separate directories, so that
+    # they can be thrown away if the module needs to be run again
+    output_dirs = dict()
+    for d in ['data_dir', 'plots_dir']:
+        if getattr(config, d, None) is not None:
+            output_dirs[d] = (getattr(config, d), tempfile.mkdtemp())
+            setattr(config, d, output_dirs[d][1])
+
+    report.general_stats_data = list()
+    report.general_stats_headers = list()
+    report.data_sources = defaultdict(lambda:defaultdict(lambda:defaultdict()))
+    report.plot_data = dict()
+    report.saved_raw_data = dict()
+    report.lint_errors = list()
+    report.num_hc_plots = 0
+    report.num_mpl_plots = 0
+    profiling.timings.clear()
+    del state.load_times[:]
+    shards.plot_inputs.clear()
+    shards.unnamed_plots.clear()
+    shards.data_files.clear()
+
+    output, exit_code = run_module(mod_dict)
+
+    # Replace 'modify' functions in general stats headers with their results
+    for data, headers in zip(report.general_stats_data, report.general_stats_headers):
+        for k, header in headers.items():
+            if callable(header.get('modify')) and not isinstance(header['modify'], ModifyLookup):
+                values = [samp[k] for samp in data.values() if k in samp]
+                header['modify'] = ModifyLookup(header['modify'], values)
+
+    for d, (final_dir, worker_dir) in output_dirs.items():
+        setattr(config, d, final_dir)
+
+    # Config values set by the module
+    config_changes = dict()
+    for k, v in config_state.items():
+        if k.startswith('__') or (k in config_before and config_before[k] is v):
+            continue
+        if _can_pickle(v):
+            config_changes[k] = v
+
+    # Drop module attributes that can't be sent back, they aren't needed to build the report
+    for m in output:
+        if not _can_pickle(m):
+            m.__dict__ = { k: v for k, v in m.__dict__.items() if _can_pickle(v) }
+
+    result = {
+        'output': output,
+        'exit_code': exit_code,
+        'html_ids': report.html_ids[num_html_ids:],
+        'general_stats_data': report.general_stats_data,
+        'general_stats_headers': report.general_stats_headers,
+        'data_sources': { mod: { sect: dict(sources) for sect, sources in sects.items() } for mod, sects in report.data_sources.items() },
+        'plot_data': report.plot_data,
+        'saved_raw_data': { fn: dict(d) if isinstance(d, defaultdict) else d for fn, d in report.saved_raw_data.items() },
+        'lint_errors': report.lint_errors,
+        'num_hc_plots': report.num_hc_plots,
+        'num_mpl_plots': report.num_mpl_plots,
+        'last_found_file': report.last_found_file,
+        'config': config_changes,
+        'output_dirs': output_dirs,
+        'runtimes': list(profiling.timings.values()),
+        'load_times': list(state.load_times),
+        'shard_plot_inputs': shards.plot_inputs,
+        'shard_unnamed_plots': shards.unnamed_plots,
+        'shard_data_files': shards.data_files,
+        'parse_cache': None
+    }
+    if report.parse_cache is not None:
+        result['parse_cache'] = (report.parse_cache.new_entries, report.parse_cache.num_hits)
+        report.parse_cache.new_entries = list()
+        report.parse_cache.num_hits = 0
+    try:
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.debug("Could not send back results for module '{}': {}".format(list(mod_dict.keys())[0], e))
+        _remove_output_dirs(result)
+        return None
+
+def _merge_result(result):
+    """ Add the results from a worker to the report. Returns False without
+    changing anything if the module needs to be run again instead. """
+
+    # The module may have given an HTML ID that a module before it has taken
+    # since the worker started. IDs are written into the module output, so run
+    # it again rather than try to rename them.
+    existing_ids = set(report.html_ids)
+    if any(html_id in existing_ids for html_id in result['html_ids']):
+        return False
+
+    for final_dir, worker_dir in result['output_dirs'].values():
+        for root, dirnames, filenames in os.walk(worker_dir):
+            dest = os.path.join(final_dir, os.path.relpath(root, worker_dir))
+            if not os.path.isdir(dest):
+                os.makedirs(dest)
+            for fn in filenames:
+                shutil.move(os.path.join(root, fn), os.path.join(dest, fn))
+    _remove_output_dirs(result)
+
+    report.html_ids.extend(result['html_ids'])
+    report.general_stats_data.extend(result['general_stats_data'])
+    report.general_stats_headers.extend(result['general_stats_headers'])
+    for mod, sects in result['data_sources'].items():
+        for sect, sources in sects.items():
+            for s_name, source in sources.items():
+                report.data_sources[mod][sect][s_name] = source
+    report.plot_data.update(result['plot_data'])
+    report.saved_raw_data.update(result['saved_raw_data'])
+    report.lint_errors.extend(result['lint_errors'])
+    report.num_hc_plots += result['num_hc_plots']
+    report.num_mpl_plots += result['num_mpl_plots']
+    report.last_found_file = result['last_found_file']
+    profiling.merge(result['runtimes'])
+    state.load_times.extend(result['load_times'])
+    shards.plot_inputs.update(result['shard_plot_inputs'])
+    shards.unnamed_plots.update(result['shard_unnamed_plots'])
+    shards.data_files.update(result['shard_data_files'])
+    for k, v in result['config'].items():
+        setattr(config, k, v)
+    if result['parse_cache'] is not None and report.parse_cache is not None:
+        new_entries, num_hits = result['parse_cache']
+        report.parse_cache.new_entries.extend(new_entries)
+        report.parse_cache.num_hits += num_hits
+    return True
+
+def _remove_output_dirs(result):
+    for final_dir, worker_dir in result['output_dirs'].values():
+        shutil.rmtree(worker_dir, ignore_errors=True)
+
+def _can_pickle(obj):
+    try:
+        pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        return True
+    except Exception:
+        return False
+
+state = run_state.state_module(__name__, init)
@@ -4,7 +4,6 @@ Helper functions to manipulate colours and colour scales
 """
 
 from __future__ import print_function
-import spectra
 import numpy as np
 import re
 
@@ -49,6 +48,9 @@ class mqc_colour_scale(object):
 			val = max(val, self.minval)
 			val = min(val, self.maxval)
 
+			# Imported here as spectra is slow to load
+			import spectra
+
 			domain_nums = list( np.linspace(self.minval, self.maxval, len(self.colours)) )
 			my_scale = spectra.scale(self.colours).domain(domain_nums)
 
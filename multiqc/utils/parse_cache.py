@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+""" MultiQC parse cache. Saves the data that module parsing functions
+return for each log file, so that unchanged files don't need to be read
+and parsed again when a report is regenerated. Stored as an SQLite
+database in the MultiQC cache directory. """
+
+from __future__ import print_function
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+
+from multiqc.utils import config
+from multiqc.utils.search_cache import get_cache_dir, file_signature
+
+logger = logging.getLogger(__name__)
+
+def parser_name(parse_func):
+    """ Return a name identifying a parsing function """
+    return '{}.{}'.format(parse_func.__module__, getattr(parse_func, '__qualname__', parse_func.__name__))
+
+def parser_hash(parse_func):
+    """ Hash the MultiQC version and the source file of a parsing function, so
+    that cached results are thrown away if the parsing code could have changed """
+    try:
+        mod_fn = sys.modules[parse_func.__module__].__file__
+        mod_mtime = os.path.getmtime(mod_fn)
+    except (KeyError, AttributeError, OSError):
+        mod_fn, mod_mtime = None, None
+    pstring = json.dumps([config.version, parser_name(parse_func), mod_fn, mod_mtime])
+    return hashlib.sha1(pstring.encode('utf-8')).hexdigest()
+
+class ParseCache(object):
+    """ On-disk cache of parsed log file data, keyed by file path and parsing function """
+
+    def __init__(self, db_fn=None):
+        if db_fn is None:
+            db_fn = os.path.join(get_cache_dir(), 'parse_cache.sqlite')
+        self.db_fn = db_fn
+        self.parser_hashes = dict()
+        self.new_entries = list()
+        self.num_hits = 0
+        self.conn = sqlite3.connect(self.db_fn, timeout=60)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS parse_cache (
+            path TEXT NOT NULL,
+            parser TEXT NOT NULL,
+            parser_hash TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (path, parser)
+        )""")
+        self.conn.commit()
+        logger.debug("Using parse cache: {}".format(self.db_fn))
+
+    def key(self, path, parse_func):
+        """ Return the cache key for a file and parsing function,
+        or None if the file can't be found """
+        try:
+            signature = json.dumps(file_signature(path))
+        except OSError:
+            return None
+        name = parser_name(parse_func)
+        if name not in self.parser_hashes:
+            self.parser_hashes[name] = parser_hash(parse_func)
+        return (os.path.abspath(path), name, self.parser_hashes[name], signature)
+
+    def get(self, key):
+        """ Return the cached parsed data for a key, or None if it isn't
+        cached or the file or parsing function have changed since """
+        if key is None:
+            return None
+        path, name, phash, signature = key
+        row = self.conn.execute(
+            "SELECT data FROM parse_cache WHERE path = ? AND parser = ? AND parser_hash = ? AND signature = ?",
+            (path, name, phash, signature)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            data = pickle.loads(bytes(row[0]))
+        except Exception as e:
+            logger.debug("Could not load cached data for {}: {}".format(path, e))
+            return None
+        self.num_hits += 1
+        return data
+
+    def add(self, key, data):
+        """ Remember the parsed data for a key. The data is pickled straight
+        away, so modules are free to modify it afterwards. """
+        if key is None or data is None:
+            return
+        try:
+            pdata = pickle.dumps(data, 2)
+        except Exception as e:
+            logger.debug("Could not cache parsed data for {}: {}".format(key[0], e))
+            return
+        self.new_entries.append(key + (pdata,))
+
+    def save(self):
+        """ Write new results to disk and close the database """
+        try:
+            logger.debug("Reused cached parsing results for {} files".format(self.num_hits))
+            if len(self.new_entries) > 0:
+                logger.debug("Saving {} new parsing results to cache".format(len(self.new_entries)))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO parse_cache (path, parser, parser_hash, signature, data) VALUES (?, ?, ?, ?, ?)",
+                    [ entry[:-1] + (sqlite3.Binary(entry[-1]),) for entry in self.new_entries ]
+                )
+                self.conn.commit()
+        finally:
+            self.conn.close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+""" MultiQC run time profiling. When config.profile_runtime is set, records the
+wall time, CPU time and memory use of each step of a run, so that the slow
+steps can be found when running with large numbers of samples.
+
+The operating system only gives the peak memory of the process so far, not the
+peak during a step. So for each step, rss_increase_mb is how much the step
+raised the peak (zero if it never used more memory than an earlier step), and
+peak_rss_mb is the process peak by the end of the step. """
+
+from __future__ import print_function
+from collections import OrderedDict
+from contextlib import contextmanager
+import functools
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None # Not available on Windows
+
+from multiqc.utils import config, run_state
+
+def cpu_time():
+    """ CPU time used by this process and its finished child processes, in seconds """
+    t = os.times()
+    try:
+        # Higher resolution than os.times() on Python 3
+        return time.process_time() + t[2] + t[3]
+    except AttributeError:
+        return t[0] + t[1] + t[2] + t[3]
+
+def peak_rss_mb(who='self'):
+    """ Peak resident memory of this process (or its largest child process), in MB """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if who == 'children' else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss / (1024.0 * 1024.0)
+    return usage.ru_maxrss / 1024.0
+
+def init():
+    """ Start timing a run """
+    state.start_time = time.time()
+    state.start_cpu = cpu_time()
+    # Timings for each step of the run, keyed by (stage, name)
+    state.timings = OrderedDict()
+
+def add_timing(stage, name, wall_time, cpu_time, peak_rss=None, count=1, rss_increase=0.0):
+    """ Add a timing for a step. Steps that run more than once are summed,
+    apart from peak_rss_mb which is the highest seen. """
+    key = (stage, name)
+    if key not in state.timings:
+        state.timings[key] = OrderedDict([
+            ('stage', stage),
+            ('name', name),
+            ('count', 0),
+            ('wall_time', 0.0),
+            ('cpu_time', 0.0),
+            ('rss_increase_mb', 0.0),
+            ('peak_rss_mb', None)
+        ])
+    t = state.timings[key]
+    t['count'] += count
+    t['wall_time'] += wall_time
+    t['cpu_time'] += cpu_time
+    t['rss_increase_mb'] += rss_increase or 0.0
+    if peak_rss is None:
+        peak_rss = peak_rss_mb()
+    if peak_rss is not None:
+        t['peak_rss_mb'] = max(t['peak_rss_mb'] or 0, peak_rss)
+
+def merge(entries):
+    """ Add timings recorded in a worker process """
+    for t in entries:
+        add_timing(t['stage'], t['name'], t['wall_time'], t['cpu_time'], t['peak_rss_mb'], t['count'], t.get('rss_increase_mb'))
+
+@contextmanager
+def timer(stage, name, count=1):
+    """ Time the code run in a with block """
+    if not getattr(config, 'profile_runtime', False):
+        yield
+        return
+    wall_start = time.time()
+    cpu_start = cpu_time()
+    rss_start = peak_rss_mb()
+    try:
+        yield
+    finally:
+        peak_rss = peak_rss_mb()
+        rss_increase = peak_rss - rss_start if peak_rss is not None else None
+        add_timing(stage, name, time.time() - wall_start, cpu_time() - cpu_start, peak_rss, count, rss_increase)
+
+def profile(stage, name=None):
+    """ Decorator to time every call to a function """
+    def decorator(func):
+        func_name = name
+        if func_name is None:
+            func_name = '{}.{}'.format(func.__module__.split('.')[-1], func.__name__)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage, func_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def profile_iter(iterable, stage, name):
+    """ Time how long an iterator takes to give each item, not counting the time
+    spent by the caller in between. The count is the number of items. """
+    if not getattr(config, 'profile_runtime', False):
+        return iterable
+    return _profile_iter(iterable, stage, name)
+
+def _profile_iter(iterable, stage, name):
+    it = iter(iterable)
+    while True:
+        with timer(stage, name, count=0):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        add_timing(stage, name, 0.0, 0.0)
+        yield item
+
+def runtime_data():
+    """ Return the totals for the run so far and the timings for each step """
+    total = OrderedDict([
+        ('wall_time', time.time() - state.start_time),
+        ('cpu_time', cpu_time() - state.start_cpu),
+        ('peak_rss_mb', peak_rss_mb()),
+        ('peak_rss_mb_children', peak_rss_mb('children'))
+    ])
+    return OrderedDict([
+        ('total', total),
+        ('steps', list(state.timings.values()))
+    ])
+
+def add_report_section():
+    """ Make a 'Run time' report section with a table of the steps timed so far.
+    Returns a module object to add to report.modules_output. """
+    from multiqc.modules.base_module import BaseMultiqcModule
+    from multiqc.plots import table
+
+    data = OrderedDict()
+    for t in state.timings.values():
+        # Skip search patterns that didn't match any files
+        if t['count'] > 0:
+            data['{}: {}'.format(t['stage'], t['name'])] = t
+    headers = OrderedDict()
+    headers['count'] = {
+        'title': 'Count',
+        'description': 'Number of times the step was run (number of files for find_log_files)',
+        'format': '{:,.0f}',
+        'scale': False
+    }
+    headers['wall_time'] = {
+        'title': 'Wall time',
+        'description': 'Elapsed time, in seconds',
+        'suffix': ' s',
+        'format': '{:,.2f}',
+        'scale': 'Reds'
+    }
+    headers['cpu_time'] = {
+        'title': 'CPU time',
+        'description': 'CPU time used, in seconds',
+        'suffix': ' s',
+        'format': '{:,.2f}',
+        'scale': 'Oranges'
+    }
+    headers['rss_increase_mb'] = {
+        'title': 'Memory increase',
+        'description': 'How much the step raised the peak resident memory of the MultiQC process, in MB',
+        'suffix': ' MB',
+        'format': '{:,.0f}',
+        'scale': 'Purples'
+    }
+    headers['peak_rss_mb'] = {
+        'title': 'Process peak memory',
+        'description': 'Peak resident memory of the MultiQC process so far, at the end of the step, in MB. '
+                       'Steps after the one that used the most memory all show the same value.',
+        'suffix': ' MB',
+        'format': '{:,.0f}',
+        'scale': 'Blues'
+    }
+    pconfig = {
+        'id': 'multiqc_runtime_table',
+        'table_title': 'MultiQC run time',
+        'col1_header': 'Step',
+        'save_file': False,
+        'sortRows': False
+    }
+
+    mod = BaseMultiqcModule(
+        name = 'Run time',
+        anchor = 'multiqc_runtime',
+        info = 'shows how long each step of this MultiQC run took. Steps after this section was made '
+               '(compressing plot data, rendering and writing the report) are only in '
+               '<code>multiqc_runtime.json</code> in the data directory.'
+    )
+    mod.add_section(plot = table.plot(data, headers, pconfig))
+    return mod
+
+state = run_state.state_module(__name__, init)
@@ -6,6 +6,7 @@ helper functions to generate markup for report. """
 
 from __future__ import print_function
 from collections import defaultdict, OrderedDict
+import base64
 import click
 import fnmatch
 import io
@@ -13,11 +14,22 @@ import json
 import inspect
 import lzstring
 import mimetypes
+from multiprocessing.pool import ThreadPool
 import os
 import re
+import sqlite3
+import struct
+import sys
 import yaml
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from multiqc import config
+from multiqc.utils import search_cache, profiling, run_state
 logger = config.logger
 
 # Treat defaultdict and OrderedDict as normal dicts for YAML output
@@ -29,22 +41,35 @@ try:
 except NameError:
     pass # Python 3
 
-# Set up global variables shared across modules
-general_stats_data = list()
-general_stats_headers = list()
-general_stats_html = ''
-data_sources = defaultdict(lambda:defaultdict(lambda:defaultdict()))
-plot_data = dict()
-html_ids = list()
-lint_errors = list()
-num_hc_plots = 0
-num_mpl_plots = 0
-saved_raw_data = dict()
-last_found_file = None
-
-# Make a dict of discovered files for each seach key
-searchfiles = list()
-files = dict()
+try:
+    string_types = basestring # Py2
+except NameError:
+    string_types = str # Py3
+
+def init():
+    """ Set up the variables shared across modules. Each run has its own
+    copy of these (see run_state.py). """
+    state.general_stats_data = list()
+    state.general_stats_headers = list()
+    state.general_stats_html = ''
+    state.data_sources = defaultdict(lambda:defaultdict(lambda:defaultdict()))
+    state.plot_data = dict()
+    state.plot_data_encoding = 'lzstring'
+    state.plot_compressed_lazy = OrderedDict()
+    state.html_ids = list()
+    state.lint_errors = list()
+    state.num_hc_plots = 0
+    state.num_mpl_plots = 0
+    state.saved_raw_data = dict()
+    state.last_found_file = None
+    state.parse_cache = None
+    state.modules_output = list()
+
+    # Make a dict of discovered files for each seach key
+    state.searchfiles = list()
+    state.files = dict()
+
+@profiling.profile('search')
 def get_filelist(run_module_names):
     """
     Go through all supplied search directories and assembly a master
@@ -59,7 +84,7 @@ def get_filelist(run_module_names):
         if mod_name.lower() not in [m.lower() for m in run_module_names]:
             ignored_patterns.append(key)
             continue
-        files[key] = list()
+        state.files[key] = list()
         if not isinstance(sps, list):
             sps = [sps]
 
@@ -102,167 +127,360 @@ def get_filelist(run_module_names):
     if len(ignored_patterns) > 0:
         logger.debug("Ignored {} search patterns as didn't match running modules.".format(len(ignored_patterns)))
 
-    def add_file(fn, root):
+    # Use the results from previous runs for files that haven't changed
+    cache = None
+    if config.search_cache:
+        try:
+            cache = search_cache.SearchCache(spatterns)
+        except (sqlite3.Error, IOError, OSError) as e:
+            logger.warning("Could not open the file search cache, searching all files: {}".format(e))
+
+    # Tidy up the exclude_ search pattern keys once, before any searching starts.
+    # Files can be searched from several threads at once, so search patterns
+    # should not be modified in place after this point.
+    for patterns in spatterns:
+        for sps in patterns.values():
+            for sp in sps:
+                for k in ['exclude_fn', 'exclude_fn_re', 'exclude_contents', 'exclude_contents_re']:
+                    if k in sp and not isinstance(sp[k], list):
+                        sp[k] = [sp[k]]
+                if 'exclude_contents_re' in sp:
+                    sp['exclude_contents_re'] = [re.compile(pat) for pat in sp['exclude_contents_re']]
+
+    def add_file(sf):
         """
         Function applied to each file found when walking the analysis
-        directories. Runs through all search patterns and returns True
-        if a match is found.
+        directories. Returns the file dict, a list of the search pattern
+        keys that it matched and, if the result should be saved to the
+        search cache, the file signature. Does not modify any shared state,
+        so that it can be run in parallel.
         """
+        fn, root = sf
         f = {'fn': fn, 'root': root}
+        path = os.path.join(root, fn)
 
         # Check that this is a file and not a pipe or anything weird
-        if not os.path.isfile(os.path.join(root, fn)):
-            return None
+        if not os.path.isfile(path):
+            return f, [], None, False
 
         # Check that we don't want to ignore this file
         i_matches = [n for n in config.fn_ignore_files if fnmatch.fnmatch(fn, n)]
         if len(i_matches) > 0:
             logger.debug("Ignoring file as matched an ignore pattern: {}".format(fn))
-            return None
+            return f, [], None, False
 
         # Limit search to small files, to avoid 30GB FastQ files etc.
         try:
-            f['filesize'] = os.path.getsize(os.path.join(root,fn))
+            f['filesize'] = os.path.getsize(path)
         except (IOError, OSError, ValueError, UnicodeDecodeError):
             logger.debug("Couldn't read file when checking filesize: {}".format(fn))
         else:
             if f['filesize'] > config.log_filesize_limit:
-                return False
+                return f, [], None, False
+
+        # Skip searching the file if it hasn't changed since last time
+        signature = None
+        if cache is not None:
+            try:
+                signature = search_cache.file_signature(path)
+            except OSError:
+                pass
+            else:
+                cached_keys = cache.get(path, signature)
+                if cached_keys is not None:
+                    return f, cached_keys, None, True
+
+        return f, search_patterns(f), signature, False
+
+    def search_patterns(f):
+        """ Runs through all search patterns for a file and returns
+        a list of the search pattern keys that it matched """
+        matched_keys = list()
+        # Test file for each search pattern. The file is read at most once.
+        reader = SearchFileReader(f)
+        try:
+            for patterns in spatterns:
+                for key, sps in patterns.items():
+                    for sp in sps:
+                        if search_file (sp, f, key, reader):
+                            # Check that we shouldn't exclude this file
+                            if not exclude_file(sp, f, reader):
+                                # Looks good! Remember this file
+                                matched_keys.append(key)
+                            # Don't keep searching this file for other modules
+                            if not sp.get('shared', False):
+                                return matched_keys
+                            # Don't look at other patterns for this module
+                            else:
+                                break
+        finally:
+            reader.close()
+        return matched_keys
+
+    # Load the mimetypes database before any threads need it
+    if not mimetypes.inited:
+        mimetypes.init()
+
+    # Set up a pool of worker threads if we're searching in parallel
+    search_threads = max(1, int(getattr(config, 'search_threads', 1) or 1))
+    pool = None
+    if search_threads > 1:
+        try:
+            pool = ThreadPool(search_threads, initializer=run_state.bind, initargs=(run_state.current(),))
+            logger.debug("Searching for files using {} threads".format(search_threads))
+        except (ImportError, OSError) as e:
+            logger.warning("Could not start threads to search for files, searching serially: {}".format(e))
+    try:
+        # Go through the analysis directories and get file list
+        for path in config.analysis_dir:
+            if os.path.islink(path) and config.ignore_symlinks:
+                continue
+            elif os.path.isfile(path):
+                state.searchfiles.append([os.path.basename(path), os.path.dirname(path)])
+            elif os.path.isdir(path):
+                state.searchfiles.extend(walk_analysis_dir(path, pool))
+            else:
+                continue
+            if cache is not None:
+                cache.load(path)
+
+        # Search through collected files. Results come back in the same order
+        # as searchfiles, so report.files is the same whatever the number of threads.
+        if pool is not None:
+            chunksize = max(1, min(1000, len(state.searchfiles) // (search_threads * 4)))
+            results = pool.imap(add_file, state.searchfiles, chunksize)
+        else:
+            results = (add_file(sf) for sf in state.searchfiles)
+        num_cached = 0
+        # Keep the progress bar out of the report when it is printed to stdout
+        progress_fh = sys.stderr if getattr(config, 'output_fn', None) is sys.stdout else None
+        with click.progressbar(results, length=len(state.searchfiles), label="Searching {} files..".format(len(state.searchfiles)), file=progress_fh) as sfiles:
+            for f, matched_keys, signature, cached in sfiles:
+                for key in matched_keys:
+                    state.files[key].append(f)
+                if cached:
+                    num_cached += 1
+                elif signature is not None:
+                    cache.add(os.path.join(f['root'], f['fn']), signature, matched_keys)
+        if cache is not None:
+            logger.debug("Used cached search results for {} of {} files".format(num_cached, len(state.searchfiles)))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if cache is not None:
+            try:
+                cache.save()
+            except sqlite3.Error as e:
+                logger.warning("Could not save the file search cache: {}".format(e))
+
+def walk_analysis_dir(path, pool=None):
+    """
+    Walk an analysis directory and return a list of [filename, root] pairs,
+    skipping any directories and paths matching the ignore config.
+    The file order is the same as a top-down os.walk(). If given a pool of
+    worker threads, each level of the directory tree is listed in parallel.
+    """
+    def list_dir(dirpath):
+        """ List a single directory. Returns the files that should be searched
+        and the sub-directories that we should descend in to next """
+        for root, dirnames, filenames in os.walk(dirpath, followlinks=(not config.ignore_symlinks), topdown=True):
+            bname = os.path.basename(root)
+
+            # Skip any sub-directories matching ignore params
+            orig_dirnames = dirnames[:]
+            for n in config.fn_ignore_dirs:
+                dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(d, n.rstrip(os.sep))]
+                if len(orig_dirnames) != len(dirnames):
+                    removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
+                    logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(", ".join(removed_dirs)))
+                    orig_dirnames = dirnames[:]
+            for n in config.fn_ignore_paths:
+                dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(os.path.join(root, d), n.rstrip(os.sep))]
+                if len(orig_dirnames) != len(dirnames):
+                    removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
+                    logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(", ".join(removed_dirs)))
+
+            # Only descend into symlinked directories if os.walk() would
+            subdirs = [os.path.join(root, d) for d in dirnames]
+            if config.ignore_symlinks:
+                subdirs = [d for d in subdirs if not os.path.islink(d)]
+
+            # Skip *this* directory if matches ignore params
+            d_matches = [n for n in config.fn_ignore_dirs if fnmatch.fnmatch(bname, n.rstrip(os.sep))]
+            if len(d_matches) > 0:
+                logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(bname))
+                return [], subdirs
+            p_matches = [n for n in config.fn_ignore_paths if fnmatch.fnmatch(root, n.rstrip(os.sep))]
+            if len(p_matches) > 0:
+                logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(root))
+                return [], subdirs
+            # Search filenames in this directory
+            return [[fn, root] for fn in filenames], subdirs
+        # Directory could not be listed
+        return [], []
+
+    # List the tree one level at a time, remembering the children of each directory
+    listings = dict()
+    level = [path]
+    while len(level) > 0:
+        if pool is not None:
+            level_listings = pool.map(list_dir, level)
+        else:
+            level_listings = [list_dir(d) for d in level]
+        next_level = list()
+        for d, listing in zip(level, level_listings):
+            listings[d] = listing
+            next_level.extend(listing[1])
+        level = next_level
+
+    # Put the files back together in top-down walk order
+    dir_files = list()
+    stack = [path]
+    while len(stack) > 0:
+        d = stack.pop()
+        d_files, subdirs = listings.pop(d)
+        dir_files.extend(d_files)
+        stack.extend(reversed(subdirs))
+    return dir_files
+
+class SearchFileReader(object):
+    """
+    Reads the contents of a single file for searching. Lines are read lazily
+    and remembered, so that the file is opened and read at most once however
+    many search patterns it is tested against.
+    """
 
-        # Test file for each search pattern
-        for patterns in spatterns:
-            for key, sps in patterns.items():
-                for sp in sps:
-                    if search_file (sp, f, key):
-                        # Check that we shouldn't exclude this file
-                        if not exclude_file(sp, f):
-                            # Looks good! Remember this file
-                            files[key].append(f)
-                        # Don't keep searching this file for other modules
-                        if not sp.get('shared', False):
-                            return
-                        # Don't look at other patterns for this module
-                        else:
-                            break
-
-    # Go through the analysis directories and get file list
-    for path in config.analysis_dir:
-        if os.path.islink(path) and config.ignore_symlinks:
-            continue
-        elif os.path.isfile(path):
-            searchfiles.append([os.path.basename(path), os.path.dirname(path)])
-        elif os.path.isdir(path):
-            for root, dirnames, filenames in os.walk(path, followlinks=(not config.ignore_symlinks), topdown=True):
-                bname = os.path.basename(root)
-
-                # Skip any sub-directories matching ignore params
-                orig_dirnames = dirnames[:]
-                for n in config.fn_ignore_dirs:
-                    dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(d, n.rstrip(os.sep))]
-                    if len(orig_dirnames) != len(dirnames):
-                        removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
-                        logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(", ".join(removed_dirs)))
-                        orig_dirnames = dirnames[:]
-                for n in config.fn_ignore_paths:
-                    dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(os.path.join(root, d), n.rstrip(os.sep))]
-                    if len(orig_dirnames) != len(dirnames):
-                        removed_dirs = [os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))]
-                        logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(", ".join(removed_dirs)))
-
-                # Skip *this* directory if matches ignore params
-                d_matches = [n for n in config.fn_ignore_dirs if fnmatch.fnmatch(bname, n.rstrip(os.sep))]
-                if len(d_matches) > 0:
-                    logger.debug("Ignoring directory as matched fn_ignore_dirs: {}".format(bname))
-                    continue
-                p_matches = [n for n in config.fn_ignore_paths if fnmatch.fnmatch(root, n.rstrip(os.sep))]
-                if len(p_matches) > 0:
-                    logger.debug("Ignoring directory as matched fn_ignore_paths: {}".format(root))
-                    continue
-                # Search filenames in this directory
-                for fn in filenames:
-                    searchfiles.append([fn, root])
-    # Search through collected files
-    with click.progressbar(searchfiles, label="Searching {} files..".format(len(searchfiles))) as sfiles:
-        for sf in sfiles:
-            add_file(sf[0], sf[1])
-
-def search_file (pattern, f, module_key):
+    def __init__(self, f):
+        self.f = f
+        self.fh = None
+        self.lines = list()
+        self.line_ends = list()
+        self.text = ''
+        self.finished = False
+        self.skip = None
+
+    def is_searchable(self):
+        """ Use mimetypes to exclude binary files where possible """
+        if self.skip is None:
+            self.skip = False
+            if not re.match(r'.+_mqc\.(png|jpg|jpeg)', self.f['fn']):
+                (ftype, encoding) = mimetypes.guess_type(os.path.join(self.f['root'], self.f['fn']))
+                if encoding is not None:
+                    self.skip = True
+                if ftype is not None and ftype.startswith('image'):
+                    self.skip = True
+        return not self.skip
+
+    def get_lines(self, num_lines=None):
+        """ Return the first num_lines lines of the file (all lines if None),
+        reading more of the file if we haven't already got them """
+        while not self.finished and (not num_lines or len(self.lines) < num_lines):
+            try:
+                if self.fh is None:
+                    self.fh = io.open (os.path.join(self.f['root'], self.f['fn']), "r", encoding='utf-8')
+                line = self.fh.readline()
+            except (IOError, OSError, ValueError, UnicodeDecodeError):
+                if config.report_readerrors:
+                    logger.debug("Couldn't read file when looking for output: {}".format(self.f['fn']))
+                line = ''
+            if line == '':
+                self.close()
+                self.finished = True
+            else:
+                self.lines.append(line)
+                self.line_ends.append(len(line) + (self.line_ends[-1] if len(self.line_ends) > 0 else 0))
+        if num_lines:
+            return self.lines[:num_lines]
+        return self.lines
+
+    def contains(self, contents, num_lines=None):
+        """ Check whether any of the first num_lines lines contain a string """
+        lines = self.get_lines(num_lines)
+        if len(lines) == 0:
+            return False
+        # Search the joined-up text in one go, unless the string could run over a line break
+        if '\n' in contents:
+            return any(contents in line for line in lines)
+        if len(self.text) != self.line_ends[-1]:
+            self.text = ''.join(self.lines)
+        return self.text.find(contents, 0, self.line_ends[len(lines) - 1]) != -1
+
+    def search(self, repattern, num_lines=None):
+        """ Check whether any of the first num_lines lines match a regex """
+        return any(repattern.search(line) for line in self.get_lines(num_lines))
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+def search_file (pattern, f, module_key=None, reader=None):
     """
     Function to searach a single file for a single search pattern.
+    Supply a SearchFileReader to share the file contents between searches.
     """
 
     fn_matched = False
     contents_matched = False
-
-    # Use mimetypes to exclude binary files where possible
-    if not re.match(r'.+_mqc\.(png|jpg|jpeg)', f['fn']):
-        (ftype, encoding) = mimetypes.guess_type(os.path.join(f['root'], f['fn']))
-        if encoding is not None:
-            return False
-        if ftype is not None and ftype.startswith('image'):
+    search_contents = pattern.get('contents') is not None or pattern.get('contents_re') is not None
+    own_reader = reader is None
+    if own_reader:
+        reader = SearchFileReader(f)
+
+    try:
+        # Use mimetypes to exclude binary files where possible
+        if not reader.is_searchable():
             return False
 
-    # Search pattern specific filesize limit
-    if pattern.get('max_filesize') is not None and 'filesize' in f:
-        if f['filesize'] > pattern.get('max_filesize'):
-            logger.debug("File ignored by {} because it exceeded search pattern filesize limit: {}".format(module_key, f['fn']))
-            return False
+        # Search pattern specific filesize limit
+        if pattern.get('max_filesize') is not None and 'filesize' in f:
+            if f['filesize'] > pattern.get('max_filesize'):
+                logger.debug("File ignored by {} because it exceeded search pattern filesize limit: {}".format(module_key, f['fn']))
+                return False
 
-    # Search by file name (glob)
-    if pattern.get('fn') is not None:
-        if fnmatch.fnmatch(f['fn'], pattern['fn']):
-            fn_matched = True
-            if pattern.get('contents') is None and pattern.get('contents_re') is None:
-                return True
+        # Search by file name (glob)
+        if pattern.get('fn') is not None:
+            if fnmatch.fnmatch(f['fn'], pattern['fn']):
+                fn_matched = True
+                if not search_contents:
+                    return True
+
+        # Search by file name (regex)
+        if pattern.get('fn_re') is not None:
+            if re.match( pattern['fn_re'], f['fn']):
+                fn_matched = True
+                if not search_contents:
+                    return True
+
+        # No need to read the file if the filename has already ruled it out
+        if (pattern.get('fn') is not None or pattern.get('fn_re') is not None) and not fn_matched:
+            return False
 
-    # Search by file name (regex)
-    if pattern.get('fn_re') is not None:
-        if re.match( pattern['fn_re'], f['fn']):
-            fn_matched = True
-            if pattern.get('contents') is None and pattern.get('contents_re') is None:
+        # Search by file contents
+        if search_contents:
+            # Search by file contents (string)
+            if pattern.get('contents') is not None:
+                contents_matched = reader.contains(pattern['contents'], pattern.get('num_lines'))
+            # Search by file contents (regex)
+            else:
+                contents_matched = reader.search(re.compile(pattern['contents_re']), pattern.get('num_lines'))
+            if contents_matched and pattern.get('fn') is None and pattern.get('fn_re') is None:
                 return True
 
-    # Search by file contents
-    if pattern.get('contents') is not None or pattern.get('contents_re') is not None:
-        if pattern.get('contents_re') is not None:
-            repattern = re.compile(pattern['contents_re'])
-        try:
-            with io.open (os.path.join(f['root'],f['fn']), "r", encoding='utf-8') as f:
-                l = 1
-                for line in f:
-                    # Search by file contents (string)
-                    if pattern.get('contents') is not None:
-                        if pattern['contents'] in line:
-                            contents_matched = True
-                            if pattern.get('fn') is None and pattern.get('fn_re') is None:
-                                return True
-                            break
-                    # Search by file contents (regex)
-                    elif pattern.get('contents_re') is not None:
-                        if re.search(repattern, line):
-                            contents_matched = True
-                            if pattern.get('fn') is None and pattern.get('fn_re') is None:
-                                return True
-                            break
-                    # Break if we've searched enough lines for this pattern
-                    if pattern.get('num_lines') and l >= pattern.get('num_lines'):
-                        break
-                    l += 1
-        except (IOError, OSError, ValueError, UnicodeDecodeError):
-            if config.report_readerrors:
-                logger.debug("Couldn't read file when looking for output: {}".format(f['fn']))
-                return False
-
-    return fn_matched and contents_matched
+        return fn_matched and contents_matched
+    finally:
+        if own_reader:
+            reader.close()
 
-def exclude_file(sp, f):
+def exclude_file(sp, f, reader=None):
     """
     Exclude discovered files if they match the special exclude_
     search pattern keys
     """
     # Make everything a list if it isn't already
     for k in sp:
-        if k in ['exclude_fn', 'exclude_fn_re' 'exclude_contents', 'exclude_contents_re']:
+        if k in ['exclude_fn', 'exclude_fn_re', 'exclude_contents', 'exclude_contents_re']:
             if not isinstance(sp[k], list):
                 sp[k] = [sp[k]]
 
@@ -280,34 +498,30 @@ def exclude_file(sp, f):
 
     # Search the contents of the file
     if 'exclude_contents' in sp or 'exclude_contents_re' in sp:
-        # Compile regex patterns if we have any
-        if 'exclude_contents_re' in sp:
-            sp['exclude_contents_re'] = [re.compile(pat) for pat in sp['exclude_contents_re']]
-        with io.open (os.path.join(f['root'],f['fn']), "r", encoding='utf-8') as fh:
-            for line in fh:
-                if 'exclude_contents' in sp:
-                    for pat in sp['exclude_contents']:
-                        if pat in line:
-                            return True
-                if 'exclude_contents_re' in sp:
-                    for pat in sp['exclude_contents_re']:
-                        if re.search(pat, line):
-                            return True
+        if reader is None:
+            reader = SearchFileReader(f)
+        for pat in sp.get('exclude_contents', []):
+            if reader.contains(pat):
+                return True
+        for pat in sp.get('exclude_contents_re', []):
+            if reader.search(re.compile(pat)):
+                return True
     return False
 
+@profiling.profile('write')
 def data_sources_tofile ():
     fn = 'multiqc_sources.{}'.format(config.data_format_extensions[config.data_format])
     with io.open (os.path.join(config.data_dir, fn), 'w', encoding='utf-8') as f:
         if config.data_format == 'json':
-            jsonstr = json.dumps(data_sources, indent=4, ensure_ascii=False)
+            jsonstr = json.dumps(state.data_sources, indent=4, ensure_ascii=False)
             print( jsonstr.encode('utf-8', 'ignore').decode('utf-8'), file=f)
         elif config.data_format == 'yaml':
-            yaml.dump(data_sources, f, default_flow_style=False)
+            yaml.dump(state.data_sources, f, default_flow_style=False)
         else:
             lines = [['Module', 'Section', 'Sample Name', 'Source']]
-            for mod in data_sources:
-                for sec in data_sources[mod]:
-                    for s_name, source in data_sources[mod][sec].items():
+            for mod in state.data_sources:
+                for sec in state.data_sources[mod]:
+                    for s_name, source in state.data_sources[mod][sec].items():
                         lines.append([mod, sec, s_name, source])
             body = '\n'.join(["\t".join(l) for l in lines])
             print( body.encode('utf-8', 'ignore').decode('utf-8'), file=f)
@@ -315,8 +529,6 @@ def data_sources_tofile ():
 def save_htmlid(html_id, skiplint=False):
     """ Take a HTML ID, sanitise for HTML, check for duplicates and save.
     Returns sanitised, unique ID """
-    global html_ids
-    global lint_errors
 
     # Trailing whitespace
     html_id_clean = html_id.strip()
@@ -345,28 +557,125 @@ def save_htmlid(html_id, skiplint=False):
     if config.lint and not skiplint and html_id != html_id_clean:
         errmsg = "LINT: {}HTML ID was not clean ('{}' -> '{}') ## {}".format(modname, html_id, html_id_clean, codeline)
         logger.error(errmsg)
-        lint_errors.append(errmsg)
+        state.lint_errors.append(errmsg)
 
     # Check for duplicates
     i = 1
     html_id_base = html_id_clean
-    while html_id_clean in html_ids:
+    while html_id_clean in state.html_ids:
         html_id_clean = '{}-{}'.format(html_id_base, i)
         i += 1
         if config.lint and not skiplint:
             errmsg = "LINT: {}HTML ID was a duplicate ({}) ## {}".format(modname, html_id_clean, codeline)
             logger.error(errmsg)
-            lint_errors.append(errmsg)
+            state.lint_errors.append(errmsg)
 
     # Remember and return
-    html_ids.append(html_id_clean)
+    state.html_ids.append(html_id_clean)
     return html_id_clean
 
 
-def compress_json(data):
-    """ Take a Python data object. Convert to JSON and compress using lzstring """
-    json_string = json.dumps(data).encode('utf-8', 'ignore').decode('utf-8')
+def plot_data_json(data):
+    """ Convert plot data to a JSON string. Uses orjson if it's installed, as it's much faster """
+    if orjson is not None:
+        try:
+            # NaN and Infinity are written as null
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+        except TypeError as e:
+            logger.debug("Could not write plot data with orjson, using json instead: {}".format(e))
+    json_string = json.dumps(data, separators=(',', ':')).encode('utf-8', 'ignore').decode('utf-8')
     # JSON.parse() doesn't handle `NaN`, but it does handle `null`.
-    json_string = json_string.replace('NaN', 'null');
-    x = lzstring.LZString()
-    return x.compressToBase64(json_string)
+    return json_string.replace('NaN', 'null')
+
+def encode_lzstring(json_string):
+    """ Compress a string with lzstring. Slow, but works with any MultiQC report template """
+    return lzstring.LZString().compressToBase64(json_string)
+
+def encode_zlib(json_string):
+    """ Compress a string with zlib and base64 encode it """
+    return base64.b64encode(zlib.compress(json_string.encode('utf-8'))).decode('ascii')
+
+def encode_binary(data):
+    """ Pack the line and bar graph series as binary typed arrays (see typed_arrays.py).
+    The JSON length (4 bytes, little-endian), the JSON padded to 8 bytes and the
+    binary data are compressed together with zlib and base64 encoded. """
+    from multiqc.utils import typed_arrays
+    packer = typed_arrays.TypedArrayPacker(config.plot_data_sig_digits)
+    if 'plot_type' in data:
+        # Data for one plot, when each plot is compressed separately
+        packed = packer.pack_plot(data)
+    else:
+        packed = { plot_id: packer.pack_plot(pdata) for plot_id, pdata in data.items() }
+    json_bytes = plot_data_json(packed).encode('utf-8')
+    json_bytes += b' ' * (-(len(json_bytes) + 4) % 8)
+    payload = struct.pack('<I', len(json_bytes)) + json_bytes + packer.buffer()
+    return base64.b64encode(zlib.compress(payload)).decode('ascii')
+
+def intern_sample_names(plot_data):
+    """ Replace the sample names in the plot data with their index in a list
+    of all names, so that names used by many plots are only saved once.
+    Returns the list of names and a copy of the plot data, with 'sample_ids'
+    set in each plot that was changed. Plots with any names that aren't
+    strings are left as they are. The names are put back by the report
+    JavaScript (mqc_resolve_sample_ids in multiqc_decode.js). """
+    s_names = list()
+    s_ids = dict()
+    def s_id(s_name):
+        if s_name not in s_ids:
+            s_ids[s_name] = len(s_names)
+            s_names.append(s_name)
+        return s_ids[s_name]
+
+    interned = OrderedDict()
+    for plot_id, pdata in plot_data.items():
+        interned[plot_id] = pdata
+        plot_type = pdata.get('plot_type') if isinstance(pdata, dict) else None
+        try:
+            if plot_type in ['xy_line', 'scatter']:
+                names = [ s['name'] for ds in pdata['datasets'] for s in ds ]
+            elif plot_type in ['bar_graph', 'beeswarm']:
+                names = [ s_name for ds in pdata['samples'] for s_name in ds ]
+            elif plot_type == 'heatmap':
+                names = list(pdata['xcats']) + list(pdata['ycats'])
+            else:
+                continue
+        except (KeyError, TypeError):
+            continue
+        if not all(isinstance(s_name, string_types) for s_name in names):
+            continue
+        pdata = dict(pdata, sample_ids=True)
+        if plot_type in ['xy_line', 'scatter']:
+            pdata['datasets'] = [ [ dict(s, name=s_id(s['name'])) for s in ds ] for ds in pdata['datasets'] ]
+        elif plot_type in ['bar_graph', 'beeswarm']:
+            pdata['samples'] = [ [ s_id(s_name) for s_name in ds ] for ds in pdata['samples'] ]
+        else:
+            pdata['xcats'] = [ s_id(s_name) for s_name in pdata['xcats'] ]
+            pdata['ycats'] = [ s_id(s_name) for s_name in pdata['ycats'] ]
+        interned[plot_id] = pdata
+    return s_names, interned
+
+# Functions to compress the plot data, by config.plot_data_encoding value.
+# Each needs a decoder with the same name in mqc_plot_data_decoders (multiqc_decode.js)
+plot_data_encoders = OrderedDict([
+    ('zlib', encode_zlib),
+    ('lzstring', encode_lzstring),
+])
+# Encoders that take the plot data instead of its JSON
+plot_data_binary_encoders = OrderedDict([
+    ('binary', encode_binary),
+])
+
+@profiling.profile('compress')
+def compress_json(data):
+    """ Take a Python data object. Convert to JSON and compress using the encoder
+    set in config.plot_data_encoding. Saves the encoding used in report.plot_data_encoding """
+    encoding = getattr(config, 'plot_data_encoding', 'lzstring')
+    if encoding not in plot_data_encoders and encoding not in plot_data_binary_encoders:
+        logger.warning("Plot data encoding '{}' not recognised, using lzstring".format(encoding))
+        encoding = 'lzstring'
+    state.plot_data_encoding = encoding
+    if encoding in plot_data_binary_encoders:
+        return plot_data_binary_encoders[encoding](data)
+    return plot_data_encoders[encoding](plot_data_json(data))
+
+state = run_state.state_module(__name__, init)
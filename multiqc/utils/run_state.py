@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+""" The state of a MultiQC run.
+
+The config, the report and the other modules that hold the results of a run
+keep them in a Report object instead of in their module globals, so that
+several reports can be made at once in different threads of one process.
+
+Each thread has a current Report. Getting or setting an attribute of one of
+these modules (for example config.title or report.plot_data) uses the module's
+state in the current Report. Code that isn't part of a run uses the default
+Report, which is the last run to finish (or the state set up when MultiQC was
+imported, before the first run).
+
+A module keeps its state in a Report by calling state_module() at the end of
+the module, with a function that sets the starting values. Inside the module,
+use the returned object instead of global variables:
+
+    def init():
+        state.files = dict()
+
+    state = run_state.state_module(__name__, init)
+
+Module class assignment needs Python 3.5+. On older versions the state stays
+in the module globals, a new Report sets them back to their starting values
+and only one report can be made at a time.
+"""
+
+from contextlib import contextmanager
+import functools
+import sys
+import threading
+import types
+
+per_thread = sys.version_info >= (3, 5)
+
+# Functions that set the starting state of each module, by module name
+_inits = dict()
+# Python < 3.5: names in each module that aren't part of its state
+_constants = dict()
+
+class Namespace(object):
+    """ The attributes of one module in one Report """
+    pass
+
+class Report(object):
+    """ The config, results and everything else set by one MultiQC run """
+
+    def __init__(self):
+        self.states = dict()
+        # Set when a later run finishes and becomes the default
+        self.replaced = False
+        self._lock = threading.RLock()
+        if not per_thread:
+            for name in _inits:
+                reset(name)
+
+    def state(self, name):
+        """ The Namespace of a module, set to its starting values if it's new """
+        try:
+            return self.states[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self.states:
+                self.states[name] = Namespace()
+                with activate(self):
+                    _inits[name]()
+        return self.states[name]
+
+class _Local(threading.local):
+    # The Report of each thread, None to use the default
+    report = None
+
+# The Report used by threads that haven't been given one
+default = Report()
+_default_used = False
+_default_lock = threading.Lock()
+_local = _Local()
+
+def current():
+    """ The Report of this thread """
+    return _local.report or default
+
+def bind(report):
+    """ Use a Report for the rest of this thread. Used as a pool
+    initializer, so that worker threads and processes use the
+    Report of the run that started them. """
+    _local.report = report
+
+@contextmanager
+def activate(report):
+    """ Use a Report in this thread inside a with block """
+    previous = _local.report
+    _local.report = report
+    try:
+        yield report
+    finally:
+        _local.report = previous
+
+@contextmanager
+def new_report():
+    """ Run a with block with a new Report, which becomes the default
+    when it finishes. The first run uses the state set up when MultiQC
+    was imported, so that anything set before then is kept. """
+    global default, _default_used
+    with _default_lock:
+        if _default_used:
+            report = Report()
+        else:
+            report = default
+            _default_used = True
+    try:
+        with activate(report):
+            yield report
+    finally:
+        with _default_lock:
+            if default is not report:
+                default.replaced = True
+                default = report
+
+def in_new_report(func):
+    """ Decorator to call a function with a new Report (see new_report()) """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with new_report():
+            return func(*args, **kwargs)
+    wrapper.__wrapped__ = func
+    return wrapper
+
+def state_dict(name):
+    """ Dict of the state of a module in the current Report """
+    if not per_thread:
+        return vars(sys.modules[name])
+    return vars(current().state(name))
+
+def reset(name):
+    """ Set the state of a module in the current Report back to its starting values """
+    d = state_dict(name)
+    for k in list(d.keys()):
+        if not per_thread and k in _constants[name]:
+            continue
+        del d[k]
+    _inits[name]()
+
+_module_getattribute = types.ModuleType.__getattribute__
+
+class StateModule(types.ModuleType):
+    """ Module that keeps its state in the current Report """
+
+    def __getattribute__(self, name):
+        # Config values are read a lot, so this avoids the slow failed
+        # attribute lookup of a module __getattr__()
+        module_dict = _module_getattribute(self, '__dict__')
+        if name in module_dict:
+            return module_dict[name]
+        report = _local.report or default
+        try:
+            state = report.states[module_dict['__name__']]
+        except KeyError:
+            state = report.state(module_dict['__name__'])
+        try:
+            return state.__dict__[name]
+        except KeyError:
+            return _module_getattribute(self, name)
+
+    def __setattr__(self, name, value):
+        if name in self.__dict__ or name.startswith('__'):
+            types.ModuleType.__setattr__(self, name, value)
+        else:
+            setattr(current().state(self.__name__), name, value)
+
+    def __delattr__(self, name):
+        if name in self.__dict__:
+            types.ModuleType.__delattr__(self, name)
+        else:
+            delattr(current().state(self.__name__), name)
+
+def state_module(name, init):
+    """ Keep the state of a module in the current Report. init() sets its
+    starting values. Returns the module, to set and get the state with. """
+    module = sys.modules[name]
+    _inits[name] = init
+    if per_thread:
+        module.__class__ = StateModule
+    else:
+        _constants[name] = set(vars(module).keys()) | {'state'}
+        module.state = module
+        init()
+    return module
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+""" MultiQC file search cache. Remembers which search patterns each
+file matched, so that unchanged files don't need to be searched again
+on the next run. Stored as an SQLite database in the MultiQC cache directory. """
+
+from __future__ import print_function
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+from multiqc.utils import config
+
+logger = logging.getLogger(__name__)
+
+def get_cache_dir():
+    """ Return the directory used for MultiQC caches, creating it if needed """
+    cache_dir = getattr(config, 'cache_dir', None)
+    if cache_dir is None:
+        cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        cache_dir = os.path.join(cache_home, 'multiqc')
+    cache_dir = os.path.expanduser(cache_dir)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return cache_dir
+
+def file_signature(path):
+    """ Return a (size, mtime, inode) tuple used to tell if a file has changed """
+    st = os.stat(path)
+    return [st.st_size, getattr(st, 'st_mtime_ns', st.st_mtime), st.st_ino]
+
+def patterns_hash(patterns):
+    """ Hash the effective set of search patterns so that cached results
+    are thrown away if the search patterns or MultiQC version change """
+    pstring = json.dumps({'version': config.version, 'patterns': patterns}, sort_keys=True, default=str)
+    return hashlib.sha1(pstring.encode('utf-8')).hexdigest()
+
+class SearchCache(object):
+    """ On-disk cache of search pattern matches, keyed by file path """
+
+    def __init__(self, patterns, db_fn=None):
+        if db_fn is None:
+            db_fn = os.path.join(get_cache_dir(), 'search_cache.sqlite')
+        self.db_fn = db_fn
+        self.sp_hash = patterns_hash(patterns)
+        self.entries = dict()
+        self.new_entries = list()
+        self.conn = sqlite3.connect(self.db_fn, timeout=60)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS search_cache (
+            path TEXT PRIMARY KEY,
+            signature TEXT NOT NULL,
+            sp_hash TEXT NOT NULL,
+            matched_keys TEXT NOT NULL
+        )""")
+        self.conn.commit()
+        logger.debug("Using search cache: {}".format(self.db_fn))
+
+    def load(self, path):
+        """ Load cached results for all files under an analysis path """
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            path = os.path.join(path, '')
+        path_end = path[:-1] + chr(ord(path[-1]) + 1)
+        rows = self.conn.execute(
+            "SELECT path, signature, matched_keys FROM search_cache WHERE path >= ? AND path < ? AND sp_hash = ?",
+            (path, path_end, self.sp_hash)
+        )
+        for fpath, signature, matched_keys in rows:
+            self.entries[fpath] = (signature, matched_keys)
+
+    def get(self, path, signature):
+        """ Return the cached list of matched search keys for a file,
+        or None if it isn't cached or has changed since """
+        try:
+            cached_signature, matched_keys = self.entries[os.path.abspath(path)]
+        except KeyError:
+            return None
+        if cached_signature != json.dumps(signature):
+            return None
+        return json.loads(matched_keys)
+
+    def add(self, path, signature, matched_keys):
+        """ Remember the search result for a file. Not thread safe. """
+        self.new_entries.append((os.path.abspath(path), json.dumps(signature), self.sp_hash, json.dumps(matched_keys)))
+
+    def save(self):
+        """ Write new results to disk and close the database """
+        try:
+            if len(self.new_entries) > 0:
+                logger.debug("Saving {} new file search results to cache".format(len(self.new_entries)))
+                self.conn.executemany("INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?)", self.new_entries)
+                self.conn.commit()
+        finally:
+            self.conn.close()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+
+""" MultiQC server mode. Keeps MultiQC running so that it can make reports
+for jobs sent to it over HTTP, on a local port or a Unix socket.
+
+Modules, templates and plotting libraries are imported once when the server
+starts. Each job then runs in a new process forked from the server, so it
+starts with everything already loaded and with a clean report state.
+"""
+
+from __future__ import print_function
+from collections import OrderedDict
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import stat
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, UnixStreamServer
+    import queue
+except ImportError: # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+    import Queue as queue
+
+from multiqc.utils import config, plugin_hooks, template_bundle
+logger = config.logger
+
+# Number of finished jobs to keep the status of
+max_finished_jobs = 1000
+
+# Hosts that only accept connections from this machine
+local_hosts = ['localhost', '127.0.0.1']
+
+class Job(object):
+    """ A report to make, with its MultiQC command line arguments """
+
+    def __init__(self, job_id, request):
+        self.id = job_id
+        self.args = job_args(request)
+        self.cwd = request.get('cwd')
+        if self.cwd is not None and not os.path.isdir(self.cwd):
+            raise ValueError("Job directory '{}' not found".format(self.cwd))
+        self.status = 'queued'
+        self.exit_code = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return OrderedDict([
+            ('id', self.id),
+            ('status', self.status),
+            ('exit_code', self.exit_code),
+            ('args', self.args),
+            ('cwd', self.cwd),
+            ('submitted', self.submitted),
+            ('started', self.started),
+            ('finished', self.finished)
+        ])
+
+def job_args(request):
+    """ Make the MultiQC command line arguments for a job request.
+    Requests are JSON objects with any of the keys:
+        analysis_dir - a directory or list of directories to search
+        outdir - the output directory
+        filename - the report filename
+        config - a dict of config options, as given with --cl_config
+        args - a list of any other command line arguments
+    """
+    if not isinstance(request, dict):
+        raise ValueError("Job must be a JSON object")
+    args = request.get('args', [])
+    if not isinstance(args, list):
+        raise ValueError("'args' must be a list")
+    args = [ str(a) for a in args ]
+    if request.get('outdir') is not None:
+        args.extend(['--outdir', str(request['outdir'])])
+    if request.get('filename') is not None:
+        args.extend(['--filename', str(request['filename'])])
+    job_config = request.get('config', {})
+    if not isinstance(job_config, dict):
+        raise ValueError("'config' must be an object")
+    for k, v in job_config.items():
+        args.extend(['--cl_config', json.dumps({k: v})])
+    analysis_dir = request.get('analysis_dir', [])
+    if not isinstance(analysis_dir, list):
+        analysis_dir = [analysis_dir]
+    if len(analysis_dir) > 0:
+        args.append('--')
+        args.extend([ str(d) for d in analysis_dir ])
+    if '--server' in args:
+        raise ValueError("Jobs can't start another server")
+    return args
+
+class JobQueue(object):
+    """ Runs jobs with a fixed number of worker threads, each of which waits
+    for the process running its current job to finish """
+
+    def __init__(self, command, workers, queue_size):
+        self.command = command
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.last_id = 0
+        try:
+            self.ctx = multiprocessing.get_context('fork')
+        except AttributeError:
+            self.ctx = multiprocessing # Python 2 - always forks on posix
+        for i in range(workers):
+            t = threading.Thread(target=self._worker)
+            t.daemon = True
+            t.start()
+
+    def submit(self, request):
+        """ Add a job to the queue. Raises queue.Full if the queue is full """
+        with self.lock:
+            job = Job(self.last_id + 1, request)
+            self.queue.put_nowait(job)
+            self.last_id = job.id
+            self.jobs[job.id] = job
+            finished = [ j for j in self.jobs.values() if j.done.is_set() ]
+            for j in finished[:len(finished) - max_finished_jobs]:
+                del self.jobs[j.id]
+        logger.info("Job {} queued: multiqc {}".format(job.id, ' '.join(job.args)))
+        return job
+
+    def status(self):
+        with self.lock:
+            statuses = [ j.status for j in self.jobs.values() ]
+        return OrderedDict([
+            ('version', config.version),
+            ('workers', self.workers),
+            ('queue_size', self.queue.maxsize),
+            ('queued', statuses.count('queued')),
+            ('running', statuses.count('running')),
+            ('done', statuses.count('done')),
+            ('failed', statuses.count('failed'))
+        ])
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            job.status = 'running'
+            job.started = time.time()
+            try:
+                p = self.ctx.Process(target=_run_job, args=(self.command, job.args, job.cwd))
+                p.start()
+                p.join()
+                job.exit_code = p.exitcode
+            except Exception as e:
+                logger.error("Job {} could not be started: {}".format(job.id, e))
+            job.finished = time.time()
+            job.status = 'done' if job.exit_code == 0 else 'failed'
+            logger.info("Job {} {} in {:.2f}s (exit code {})".format(job.id, job.status, job.finished - job.started, job.exit_code))
+            job.done.set()
+
+def _run_job(command, args, cwd):
+    """ Run MultiQC for a job, in a process forked from the server """
+    # The job sets up its own logging
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    if cwd is not None:
+        os.chdir(cwd)
+    # Load the config defaults again, as the date and paths were set when the server started
+    config.load_defaults()
+    sys.argv = ['multiqc'] + args
+    command.main(args=args, prog_name='multiqc')
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """ HTTP API:
+        POST /jobs - submit a job, add "wait": true to respond when it has finished
+        GET /jobs - status of all jobs
+        GET /jobs/<id> - status of a job, add ?wait=1 to respond when it has finished
+        GET /status - number of jobs queued, running and finished
+    """
+
+    def do_POST(self):
+        if self.path.split('?')[0].rstrip('/') != '/jobs':
+            return self.send_json(404, {'error': 'Not found: {}'.format(self.path)})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            job = self.server.jobs.submit(request)
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+        except queue.Full:
+            return self.send_json(503, {'error': 'Job queue is full'})
+        if request.get('wait'):
+            job.done.wait()
+            return self.send_json(200, job.to_dict())
+        self.send_json(202, job.to_dict())
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        parts = [ p for p in path.split('/') if p ]
+        if parts == ['status']:
+            return self.send_json(200, self.server.jobs.status())
+        if parts == ['jobs']:
+            with self.server.jobs.lock:
+                jobs = [ j.to_dict() for j in self.server.jobs.jobs.values() ]
+            return self.send_json(200, jobs)
+        if len(parts) == 2 and parts[0] == 'jobs':
+            try:
+                job = self.server.jobs.jobs[int(parts[1])]
+            except (ValueError, KeyError):
+                return self.send_json(404, {'error': 'Job not found: {}'.format(parts[1])})
+            if 'wait=1' in query.split('&') or 'wait=true' in query.split('&'):
+                job.done.wait()
+            return self.send_json(200, job.to_dict())
+        self.send_json(404, {'error': 'Not found: {}'.format(self.path)})
+
+    def send_json(self, code, data):
+        body = json.dumps(data, indent=4).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+def preload():
+    """ Import everything that a job would otherwise import when it starts """
+    for name, ep in config.avail_modules.items():
+        try:
+            ep.load()
+        except Exception as e:
+            logger.warning("Could not load module '{}': {}".format(name, e))
+    # Other templates can change the config when they are imported, so they are left to each job
+    if 'default' in config.avail_templates:
+        default_mod = config.avail_templates['default'].load()
+        template_bundle.get_bundle('default', default_mod).env.get_template(default_mod.base_fn)
+    plugin_hooks.load_hooks()
+    # The plot modules are imported here for their import time set up
+    for name in ['bargraph', 'beeswarm', 'heatmap', 'scatter', 'table']:
+        importlib.import_module('multiqc.plots.{}'.format(name))
+    from multiqc.plots import linegraph
+    linegraph.get_pyplot()
+
+def serve(command, address, workers=2, queue_size=100, loglevel='INFO'):
+    """ Run the server until it is interrupted. command is the MultiQC click
+    command, address is a host:port, a port or a Unix socket path. """
+    console = logging.StreamHandler()
+    console.setLevel(getattr(logging, loglevel))
+    console.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)-7s] %(message)s'))
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(console)
+
+    socket_path = None
+    if address.startswith('unix:') or '/' in address:
+        socket_path = address[5:] if address.startswith('unix:') else address
+        if os.path.exists(socket_path):
+            if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                raise ValueError("'{}' exists and is not a socket".format(socket_path))
+            os.remove(socket_path)
+    else:
+        host, _, port = address.rpartition(':')
+        host = host or 'localhost'
+        if host not in local_hosts:
+            logger.warning("Listening on {} - anyone who can connect can make reports as this user".format(host))
+
+    logger.info("This is MultiQC v{} - loading modules".format(config.version))
+    preload()
+
+    if socket_path is not None:
+        httpd = ThreadingUnixHTTPServer(socket_path, RequestHandler)
+        logger.info("Listening on Unix socket {}".format(socket_path))
+    else:
+        httpd = ThreadingHTTPServer((host, int(port)), RequestHandler)
+        logger.info("Listening on http://{}:{}".format(host, httpd.server_address[1]))
+    httpd.jobs = JobQueue(command, workers, queue_size)
+    logger.info("Running up to {} jobs at once, with up to {} waiting".format(workers, queue_size))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping server")
+    finally:
+        httpd.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
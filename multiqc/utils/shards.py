@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+
+""" Split a MultiQC run into shards that are merged into one report.
+
+With --shard-out, MultiQC searches its analysis directories and runs the modules
+as usual, but instead of making a report it saves everything the modules added
+to the report to a shard file: the module sections, General Statistics data,
+data sources, module data files and the inputs to every plot function. Plots aren't
+drawn in a shard. Instead, the plot function returns a placeholder that is
+written into the module HTML.
+
+With --merge, the shard files are read and combined. Plot inputs from all
+shards are merged sample by sample and the plots are drawn once for all
+samples, replacing the placeholders. The merge step doesn't need the log files.
+
+Shard files are gzipped Python pickles. Only merge shard files that you trust.
+"""
+
+from __future__ import print_function
+from collections import OrderedDict
+import copy
+import functools
+import gzip
+import inspect
+import pickle
+import re
+
+from multiqc.utils import config, report, run_state
+
+logger = config.logger
+
+try:
+    string_types = basestring # Py2
+except NameError:
+    string_types = str # Py3
+
+SHARD_FORMAT = 2
+
+def init():
+    """ Clear everything recorded by an earlier run """
+    # Plot function inputs recorded in this run, keyed by placeholder key
+    state.plot_inputs = OrderedDict()
+    # Number of plots without an ID, by module, plot type and title
+    state.unnamed_plots = OrderedDict()
+    # Data files written in this run: (data, sort_cols, data_format), keyed by filename
+    state.data_files = OrderedDict()
+    # Name of the module being run, used to make the placeholder keys
+    state.current_module = None
+
+placeholder_re = re.compile(r'<!--mqc_shard_plot:(.+?)-->')
+
+def record_plot(plot_type):
+    """ Decorator for plot functions. When making a shard, saves the arguments
+    and returns a placeholder instead of drawing the plot. """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not getattr(config, 'shard_out', None):
+                return func(*args, **kwargs)
+            callargs = inspect.getcallargs(func, *args, **kwargs)
+            key = _plot_key(plot_type, callargs.get('pconfig'))
+            _lookup_header_modify(callargs)
+            try:
+                state.plot_inputs[key] = (plot_type, pickle.dumps(callargs, pickle.HIGHEST_PROTOCOL))
+            except Exception as e:
+                # Can't save the inputs, so draw the plot with just the samples in this shard
+                logger.debug("Could not save inputs for plot '{}', drawing it now: {}".format(key, e))
+                plot_ids = set(report.plot_data.keys())
+                html = func(*args, **kwargs)
+                plot_data = { k: v for k, v in report.plot_data.items() if k not in plot_ids }
+                state.plot_inputs[key] = (plot_type, { 'html': html, 'plot_data': plot_data })
+            return '<!--mqc_shard_plot:{}-->'.format(key)
+        return wrapper
+    return decorator
+
+def record_data_file(data, fn, sort_cols=False, data_format=None):
+    """ Save a copy of a module data file for the shard, as the module
+    may change the data after writing it """
+    state.data_files[fn] = (pickle.dumps(data, pickle.HIGHEST_PROTOCOL), sort_cols, data_format)
+
+def _plot_key(plot_type, pconfig):
+    """ Placeholder key for a plot, the same in every shard if possible. Plots
+    without an ID are keyed by their module, type and title, numbered if the
+    module makes more than one. The numbers only match between shards if each
+    shard has the same number of them, which is checked when merging. """
+    prefix = '{}/'.format(state.current_module)
+    num_plots = len([k for k in state.plot_inputs if k.startswith(prefix)])
+    plot_id = None
+    if isinstance(pconfig, dict):
+        plot_id = pconfig.get('id')
+    if plot_id is None:
+        title = pconfig.get('title') if isinstance(pconfig, dict) else None
+        base = '{}{}'.format(prefix, plot_type)
+        if isinstance(title, string_types) and title != '':
+            base = '{}:{}'.format(base, re.sub(r'\W+', '_', title).strip('_'))
+        idx = state.unnamed_plots.get(base, 0)
+        state.unnamed_plots[base] = idx + 1
+        return '{}#{}'.format(base, idx)
+    key = '{}{}'.format(prefix, plot_id)
+    if key in state.plot_inputs:
+        key = '{}-{}'.format(key, num_plots)
+    return key
+
+def _lookup_header_modify(callargs):
+    """ Replace table header 'modify' functions with their results, as functions can't be saved """
+    from multiqc.utils import module_runner
+    headers = callargs.get('headers')
+    data = callargs.get('data')
+    if not isinstance(headers, dict) or not isinstance(data, dict):
+        return
+    for k, header in headers.items():
+        if isinstance(header, dict) and callable(header.get('modify')) and not isinstance(header['modify'], module_runner.ModifyLookup):
+            values = [samp[k] for samp in data.values() if isinstance(samp, dict) and k in samp]
+            header['modify'] = module_runner.ModifyLookup(header['modify'], values)
+
+def write_shard(fn):
+    """ Save the module results of this run to a shard file """
+    from multiqc.utils import module_runner
+    for data, headers in zip(report.general_stats_data, report.general_stats_headers):
+        _lookup_header_modify({ 'data': data, 'headers': headers })
+    modules = list()
+    for m in report.modules_output:
+        if not module_runner._can_pickle(m):
+            m.__dict__ = { k: v for k, v in m.__dict__.items() if module_runner._can_pickle(v) }
+        modules.append(m)
+    shard = {
+        'format': SHARD_FORMAT,
+        'version': config.short_version,
+        'analysis_dir': list(config.analysis_dir),
+        'modules': modules,
+        'plot_inputs': state.plot_inputs,
+        'unnamed_plots': state.unnamed_plots,
+        'general_stats': list(zip(report.general_stats_data, report.general_stats_headers)),
+        'data_sources': { mod: { sect: dict(sources) for sect, sources in sects.items() } for mod, sects in report.data_sources.items() },
+        'data_files': state.data_files
+    }
+    with gzip.open(fn, 'wb') as f:
+        pickle.dump(shard, f, pickle.HIGHEST_PROTOCOL)
+    logger.info("Shard       : {} ({} modules, {} plots)".format(fn, len(modules), len(state.plot_inputs)))
+
+def read_shard(fn):
+    with gzip.open(fn, 'rb') as f:
+        shard = pickle.load(f)
+    if shard.get('format') != SHARD_FORMAT:
+        raise ValueError("'{}' is not a MultiQC shard file that this version can read".format(fn))
+    if shard['version'] != config.short_version:
+        logger.warning("Shard '{}' was made with MultiQC v{}, this is v{}".format(fn, shard['version'], config.short_version))
+    return shard
+
+def merge_shards(fns, samples=None):
+    """ Read shard files and add their combined results to the report.
+    Plots are drawn with the data from all shards. If samples is given, the
+    data for any other samples is left out (see split.py). Returns the module
+    objects in report order. """
+    from multiqc.utils import split
+    shards = list()
+    for fn in fns:
+        logger.info("Reading shard {}".format(fn))
+        shard = read_shard(fn)
+        if samples is not None:
+            shard = split.filter_shard(shard, samples)
+        shards.append(shard)
+
+    # Use the analysis directories of all shards in the report
+    config.analysis_dir = [d for shard in shards for d in shard['analysis_dir']]
+
+    # Data sources and data files
+    for shard in shards:
+        for mod, sects in shard['data_sources'].items():
+            for sect, sources in sects.items():
+                report.data_sources[mod][sect].update(sources)
+    merged_files = OrderedDict()
+    for shard in shards:
+        for fn, (data, sort_cols, data_format) in shard['data_files'].items():
+            data = pickle.loads(data)
+            if fn in merged_files:
+                data = merge_data(merged_files[fn][0], data)
+            merged_files[fn] = (data, sort_cols, data_format)
+
+    # General Statistics columns, matched by their namespaces. A module can add
+    # columns more than once, so these are numbered in each shard. Shards that
+    # found different columns for a module have their headers combined.
+    general_stats = OrderedDict()
+    for shard in shards:
+        num_added = dict()
+        for data, headers in shard['general_stats']:
+            namespaces = tuple(OrderedDict((h.get('namespace'), None) for h in headers.values()).keys())
+            key = (namespaces, num_added.get(namespaces, 0))
+            num_added[namespaces] = key[1] + 1
+            if key in general_stats:
+                general_stats[key] = (merge_data(general_stats[key][0], data), merge_headers(general_stats[key][1], headers))
+            else:
+                general_stats[key] = (data, headers)
+
+    # Plots without an ID are numbered in each shard. If the shards that have
+    # them have different numbers of them, the numbers don't match up.
+    unnamed_counts = dict()
+    for shard in shards:
+        for base, count in shard['unnamed_plots'].items():
+            unnamed_counts.setdefault(base, set()).add(count)
+    unmatched = set( base for base, counts in unnamed_counts.items() if len(counts) > 1 )
+    for base in sorted(unmatched):
+        logger.warning("Could not match plots '{}' between shards as they have no ID and the shards have different numbers of them, "
+                       "only showing samples from the first shard. Set an 'id' in the plot config to fix this.".format(base))
+
+    # Plot inputs
+    merged_inputs = OrderedDict()
+    for shard in shards:
+        for key, (plot_type, inputs) in shard['plot_inputs'].items():
+            if not isinstance(inputs, dict):
+                inputs = pickle.loads(inputs)
+            if key not in merged_inputs:
+                merged_inputs[key] = (plot_type, inputs)
+            elif key.rpartition('#')[0] in unmatched:
+                continue
+            elif merged_inputs[key][0] != plot_type or plot_type == 'heatmap' or 'html' in inputs or 'html' in merged_inputs[key][1]:
+                # Heatmap rows and columns can't be joined without the data that made them
+                logger.warning("Could not merge plot '{}' between shards, only showing samples from the first shard".format(key))
+            else:
+                merged_inputs[key] = (plot_type, merge_plot_inputs(merged_inputs[key][1], inputs))
+
+    # Module sections, in the order they were found
+    modules = OrderedDict()
+    for shard in shards:
+        last_anchor = None
+        for m in shard['modules']:
+            if m.anchor in modules:
+                modules[m.anchor].sections = merge_sections(modules[m.anchor].sections, m.sections)
+            else:
+                modules = _insert_after(modules, last_anchor, m.anchor, m)
+            last_anchor = m.anchor
+
+    # Section IDs were checked for duplicates in each shard, but not between shards
+    for m in modules.values():
+        report.save_htmlid(m.anchor, skiplint=True)
+        for s in m.sections:
+            if s.get('anchor'):
+                s['anchor'] = report.save_htmlid(s['anchor'], skiplint=True)
+
+    # Draw the plots in report order and put them in the module HTML
+    report.general_stats_data = [ d for d, h in general_stats.values() ]
+    report.general_stats_headers = [ h for d, h in general_stats.values() ]
+    plot_html = dict()
+    def draw_plot(match):
+        key = match.group(1)
+        if key not in plot_html:
+            plot_html[key] = _draw_plot(key, merged_inputs.get(key))
+        return plot_html[key]
+    for m in modules.values():
+        if isinstance(getattr(m, 'intro', None), string_types):
+            m.intro = placeholder_re.sub(draw_plot, m.intro)
+        for s in m.sections:
+            for k, v in s.items():
+                if isinstance(v, string_types):
+                    s[k] = placeholder_re.sub(draw_plot, v)
+
+    from multiqc.utils import util_functions
+    for fn, (data, sort_cols, data_format) in merged_files.items():
+        report.saved_raw_data[fn] = data
+        util_functions.write_data_file(data, fn, sort_cols, data_format)
+
+    logger.info("Merged {} shards: {} modules, {} plots".format(len(shards), len(modules), len(plot_html)))
+    return list(modules.values())
+
+def _draw_plot(key, plot):
+    if plot is None:
+        logger.warning("Plot '{}' was not found in any shard".format(key))
+        return ''
+    plot_type, inputs = plot
+    if 'html' in inputs:
+        report.plot_data.update(inputs['plot_data'])
+        report.html_ids.extend(inputs['plot_data'].keys())
+        return inputs['html']
+    from multiqc.plots import bargraph, beeswarm, heatmap, linegraph, scatter, table
+    plot_funcs = {
+        'bargraph': bargraph.plot,
+        'beeswarm': beeswarm.plot,
+        'heatmap': heatmap.plot,
+        'linegraph': linegraph.plot,
+        'scatter': scatter.plot,
+        'table': table.plot
+    }
+    return plot_funcs[plot_type](**inputs)
+
+def _insert_after(d, after_key, key, value):
+    """ Return an OrderedDict with key added after after_key, or at the end """
+    if after_key is None and len(d) > 0:
+        items = [(key, value)] + list(d.items())
+    else:
+        items = list(d.items())
+        idx = [k for k, v in items].index(after_key) + 1 if after_key in d else len(items)
+        items.insert(idx, (key, value))
+    return OrderedDict(items)
+
+def merge_sections(a, b):
+    """ Combine two lists of module sections. Sections are matched by anchor,
+    and sections only in b are added after the section before them in b. """
+    anchors = [s['anchor'] for s in a]
+    merged = list(a)
+    last_idx = -1
+    for s in b:
+        if s['anchor'] in anchors:
+            last_idx = anchors.index(s['anchor'])
+        else:
+            last_idx += 1
+            merged.insert(last_idx, s)
+            anchors.insert(last_idx, s['anchor'])
+    return merged
+
+def merge_data(a, b):
+    """ Combine data from two shards. Dicts keyed by sample name are joined,
+    lists of datasets are joined one by one and lists of category names are
+    joined without duplicates. Anything else is taken from the first shard.
+    Dicts keep their type, as plots only sort samples that aren't in an OrderedDict. """
+    if isinstance(a, dict) and isinstance(b, dict):
+        merged = copy.copy(a)
+        for k, v in b.items():
+            # A sample found in more than one shard keeps the values from all of them
+            if isinstance(merged.get(k), dict) and isinstance(v, dict):
+                merged[k] = copy.copy(merged[k])
+                merged[k].update(v)
+            else:
+                merged[k] = v
+        return merged
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) == len(b) and all(isinstance(x, dict) for x in a + b):
+            return [ merge_data(x, y) for x, y in zip(a, b) ]
+        try:
+            return a + [x for x in b if x not in a]
+        except TypeError:
+            return a
+    return a
+
+def merge_headers(a, b):
+    """ Combine table headers from two shards, including the results of any 'modify' functions """
+    from multiqc.utils import module_runner
+    merged = OrderedDict(a)
+    for k, header in b.items():
+        if k not in merged:
+            merged[k] = header
+            continue
+        ma, mb = merged[k].get('modify'), header.get('modify')
+        if isinstance(ma, module_runner.ModifyLookup) and isinstance(mb, module_runner.ModifyLookup):
+            ma.results.update(mb.results)
+            if ma.nan_result is None:
+                ma.nan_result = mb.nan_result
+    return merged
+
+def merge_plot_inputs(a, b):
+    """ Combine the arguments given to a plot function in two shards """
+    merged = dict(a)
+    merged['data'] = merge_data(a['data'], b['data'])
+    if a.get('cats') is not None and b.get('cats') is not None:
+        merged['cats'] = merge_data(a['cats'], b['cats'])
+    if isinstance(a.get('headers'), dict) and isinstance(b.get('headers'), dict):
+        merged['headers'] = merge_headers(a['headers'], b['headers'])
+    if isinstance(a.get('pconfig'), dict) and isinstance(b.get('pconfig'), dict):
+        merged['pconfig'] = merge_pconfig(a['pconfig'], b['pconfig'], sample_names(b['data']))
+    return merged
+
+def sample_names(data):
+    """ Sample names in the data given to a plot function: the keys of
+    the data dict, or of each dict in a list of datasets """
+    datasets = data if isinstance(data, list) else [data]
+    return set( k for d in datasets if isinstance(d, dict) for k in d )
+
+def merge_pconfig(a, b, s_names):
+    """ Plot config from the first shard, with any dicts keyed by sample name
+    (such as 'colors') joined with those from the second shard """
+    merged = copy.copy(a)
+    for k, v in b.items():
+        if not isinstance(v, dict) or not any(s_name in v for s_name in s_names):
+            continue
+        if isinstance(merged.get(k), dict):
+            merged[k] = merge_data(merged[k], v)
+        elif k not in merged:
+            merged[k] = v
+    return merged
+
+state = run_state.state_module(__name__, init)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+""" Make a report for each group of samples from one MultiQC run.
+
+With --split-by, MultiQC searches for files and runs the modules once, saving
+the module results as for a shard (see shards.py). It then makes a report
+for all samples, and one for each group of samples from those results,
+with the data for other samples removed before the plots are drawn.
+
+Groups are given with one or more specs:
+    regex:PATTERN - group samples by the first group in a regular expression
+                    matched against the sample name (or the whole match)
+    dir:N - group samples by the Nth directory of the paths of their files,
+            counted from the analysis directory they were found in
+    sheet:FILE - a tab or comma separated file with a sample name and a group
+                 name on each line. Samples can be in more than one group.
+Samples that aren't in a group are only in the report for all samples.
+"""
+
+from __future__ import print_function
+from collections import OrderedDict
+import copy
+import csv
+import io
+import multiprocessing
+import os
+import pickle
+import re
+
+from multiqc.utils import config, run_state
+
+logger = config.logger
+
+spec_types = ['regex', 'dir', 'sheet']
+
+def parse_spec(spec):
+    """ Split a --split-by spec into its type and value """
+    spec_type, _, value = spec.partition(':')
+    if spec_type not in spec_types or value == '':
+        raise ValueError("--split-by must be one of {}, not '{}'".format(', '.join('{}:...'.format(t) for t in spec_types), spec))
+    if spec_type == 'regex':
+        value = re.compile(value)
+    elif spec_type == 'dir':
+        try:
+            value = int(value)
+        except ValueError:
+            value = 0
+        if value < 1:
+            raise ValueError("--split-by dir:N needs a directory level of 1 or more, not '{}'".format(spec))
+    elif not os.path.isfile(value):
+        raise ValueError("--split-by sample sheet '{}' not found".format(value))
+    return spec_type, value
+
+def shard_samples(shard):
+    """ Names of all samples in a shard, from the data sources and General Statistics """
+    samples = set()
+    for sects in shard['data_sources'].values():
+        for sources in sects.values():
+            samples.update(sources.keys())
+    for data, headers in shard['general_stats']:
+        samples.update(data.keys())
+    return samples
+
+def sample_groups(specs, shard):
+    """ Groups of samples for the --split-by specs, as an OrderedDict of group name: set of samples """
+    samples = shard_samples(shard)
+    groups = OrderedDict()
+    def add(group, s_name):
+        groups.setdefault(group, set()).add(s_name)
+
+    for spec in specs:
+        spec_type, value = parse_spec(spec)
+        if spec_type == 'regex':
+            for s_name in sorted(samples):
+                match = value.search(s_name)
+                if match:
+                    add(match.group(1) if value.groups > 0 else match.group(0), s_name)
+        elif spec_type == 'dir':
+            analysis_dirs = [ os.path.abspath(d) if os.path.isdir(d) else os.path.dirname(os.path.abspath(d)) for d in shard['analysis_dir'] ]
+            for sects in shard['data_sources'].values():
+                for sources in sects.values():
+                    for s_name, path in sources.items():
+                        group = path_group(path, analysis_dirs, value)
+                        if group is not None:
+                            add(group, s_name)
+        else:
+            with io.open(value, 'r', encoding='utf-8') as f:
+                dialect = 'excel-tab' if '\t' in f.readline() else 'excel'
+                f.seek(0)
+                for row in csv.reader(f, dialect):
+                    if len(row) >= 2 and not row[0].startswith('#') and row[0].strip() in samples:
+                        add(row[1].strip(), row[0].strip())
+
+    for group, s_names in groups.items():
+        logger.info("Split group : {} ({} samples)".format(group, len(s_names)))
+    if len(groups) == 0:
+        logger.warning("No samples matched --split-by {}".format(', '.join(specs)))
+    return groups
+
+def path_group(path, analysis_dirs, level):
+    """ The directory at level below the analysis directory that path is in,
+    or None if path isn't that deep in any analysis directory """
+    for d in analysis_dirs:
+        rel = os.path.relpath(path, d)
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            continue
+        parts = os.path.dirname(rel).split(os.sep)
+        if len(parts) >= level and parts[level - 1] not in ['', os.curdir]:
+            return parts[level - 1]
+    return None
+
+def group_filename(base, group):
+    """ Report filename for a group, from the filename of the report for all samples """
+    if base.endswith('.html'):
+        base = base[:-5]
+    return '{}_{}'.format(base, re.sub(r'[^\w\.-]', '_', group))
+
+def make_reports(run_func, run_args, shard_fn, groups, workers=1):
+    """ Make a report from the shard file for all samples and for each group.
+    run_func is multiqc.multiqc.run and run_args are the arguments it was
+    called with. Returns the results of the report for all samples, with the
+    result for each group in 'split_reports'. """
+    args = dict(run_args)
+    args.update(args.pop('kwargs', {}))
+    args.update({
+        'analysis_dir': (shard_fn,),
+        'merge_shards': True,
+        'split_by': (),
+        'shard_out': None,
+        'file_list': False,
+        'search_cache': False,
+        'incremental': False
+    })
+    # split_by may also be set in a config file
+    args['cl_config'] = list(args.get('cl_config', ())) + [{'split_by': []}]
+    jobs = [ (run_func, args, None, None) ]
+    for group, samples in groups.items():
+        group_args = dict(args, filename=group_filename(config.output_fn_name, group))
+        group_args['title'] = '{}: {}'.format(config.title, group) if config.title is not None else group
+        jobs.append((run_func, group_args, group, sorted(samples)))
+
+    pool = None
+    if workers > 1 and len(jobs) > 1:
+        try:
+            ctx = multiprocessing.get_context('fork')
+        except AttributeError:
+            ctx = multiprocessing # Python 2 - always forks on posix
+        except ValueError:
+            ctx = None
+            logger.warning("Can't make reports in parallel on this platform, making them one at a time")
+        if ctx is not None:
+            try:
+                pool = ctx.Pool(min(workers, len(jobs)), initializer=run_state.bind, initargs=(run_state.current(),), maxtasksperchild=1)
+            except (ImportError, OSError) as e:
+                logger.warning("Could not start report worker processes, making reports one at a time: {}".format(e))
+    if pool is not None:
+        try:
+            results = pool.map(_make_report, jobs, chunksize=1)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        results = [ _make_report(job) for job in jobs ]
+
+    result = dict(results[0])
+    result['split_reports'] = OrderedDict()
+    for (run_func, group_args, group, samples), group_result in zip(jobs[1:], results[1:]):
+        result['split_reports'][group] = group_result
+        result['sys_exit_code'] = max(result['sys_exit_code'], group_result['sys_exit_code'])
+    return result
+
+def _make_report(job):
+    """ Make one report, in this process or a worker process """
+    run_func, args, group, samples = job
+    if group is not None:
+        args = dict(args, cl_config=list(args.get('cl_config', ())) + [{'split_samples': samples}])
+    return run_func(**args)
+
+def filter_shard(shard, samples):
+    """ Remove the data for samples that aren't in samples from a shard.
+    Dicts with sample names as keys have the other samples removed, as do
+    heatmap rows and columns. Modules with no samples left are removed. """
+    all_samples = shard_samples(shard)
+    keep = set(samples)
+    drop = all_samples - keep
+
+    def filter_data(data):
+        if isinstance(data, dict):
+            if not any(k in drop for k in data):
+                return data
+            # Keep the dict type, as plots only sort samples that aren't in an OrderedDict
+            filtered = copy.copy(data)
+            for k in drop.intersection(data):
+                del filtered[k]
+            return filtered
+        if isinstance(data, list):
+            return [ filter_data(d) for d in data ]
+        return data
+
+    shard['general_stats'] = [ (filter_data(data), headers) for data, headers in shard['general_stats'] ]
+    shard['data_sources'] = { mod: { sect: filter_data(sources) for sect, sources in sects.items() } for mod, sects in shard['data_sources'].items() }
+    shard['data_files'] = OrderedDict(
+        (fn, (pickle.dumps(filter_data(pickle.loads(data)), pickle.HIGHEST_PROTOCOL), sort_cols, data_format))
+        for fn, (data, sort_cols, data_format) in shard['data_files'].items()
+    )
+    plot_inputs = OrderedDict()
+    for key, (plot_type, inputs) in shard['plot_inputs'].items():
+        if isinstance(inputs, dict):
+            logger.warning("Could not split plot '{}' by sample, it shows all samples".format(key))
+        else:
+            inputs = pickle.loads(inputs)
+            if plot_type == 'heatmap':
+                inputs = filter_heatmap(inputs, drop)
+            else:
+                inputs['data'] = filter_data(inputs['data'])
+        plot_inputs[key] = (plot_type, inputs)
+    shard['plot_inputs'] = plot_inputs
+
+    # Modules that only had other samples
+    modules = list()
+    for m in shard['modules']:
+        mod_samples = set()
+        for sources in shard['data_sources'].get(m.name, {}).values():
+            mod_samples.update(sources.keys())
+        if len(mod_samples) > 0 or m.name not in shard['data_sources']:
+            modules.append(m)
+    shard['modules'] = modules
+    return shard
+
+def filter_heatmap(inputs, drop):
+    """ Remove the rows and columns of other samples from heatmap.plot() arguments """
+    xcats = inputs.get('xcats')
+    ycats = inputs.get('ycats') if inputs.get('ycats') is not None else xcats
+    if not isinstance(xcats, list) or not isinstance(ycats, list):
+        return inputs
+    x_keep = [ i for i, c in enumerate(xcats) if c not in drop ]
+    y_keep = [ i for i, c in enumerate(ycats) if c not in drop ]
+    inputs['xcats'] = [ xcats[i] for i in x_keep ]
+    inputs['ycats'] = [ ycats[i] for i in y_keep ]
+    inputs['data'] = [ [ inputs['data'][y][x] for x in x_keep ] for y in y_keep ]
+    return inputs
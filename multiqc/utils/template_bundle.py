@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+""" MultiQC report template bundles. A bundle is a report template resolved
+with its parent template (files in the child template replace those in the
+parent), with a Jinja environment that loads templates from both directories
+without copying them anywhere.
+
+Bundles are kept for the rest of the process, so later runs in the same
+process (e.g. server jobs or multiqc.run()) reuse the compiled templates and
+included files. With template_cache, the compiled Jinja bytecode and the
+files included with include_file() (base64 encoded for images and fonts) are
+also saved in the MultiQC cache directory, keyed by the template name and
+version, to be used by the next run. Cached files are checked against the
+size and modification time of their source file before they are used.
+
+With asset_dir set, the JavaScript, CSS, fonts and images that are normally
+included in the report are instead written to that directory with a hash of
+their contents in the filename (e.g. highcharts.3f2a6b1c9d0e.js), optionally
+with a gzipped copy next to each one. Reports link to them, either relative
+to the report or under the asset_url prefix. Many reports can share one
+asset directory, and the files never change, so browsers can cache them.
+"""
+
+from __future__ import print_function
+from distutils.dir_util import copy_tree
+import base64
+import gzip
+import hashlib
+import io
+import jinja2
+import json
+import logging
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+
+try:
+    from urllib.parse import quote
+except ImportError: # Python 2
+    from urllib import quote
+
+from multiqc.utils import config, search_cache
+
+logger = logging.getLogger(__name__)
+
+# Bundles made in this process, by template name
+bundles = dict()
+
+# Default for include_file(), to look for files in the template directories
+template_files = object()
+
+def get_bundle(name, template_mod):
+    """ Return the bundle for a template module, making it if needed """
+    parent_mod = None
+    if getattr(template_mod, 'template_parent', None) is not None:
+        parent_mod = config.avail_templates[template_mod.template_parent].load()
+    key = bundle_key(name, template_mod, parent_mod)
+    if name not in bundles or bundles[name].key != key:
+        bundles[name] = TemplateBundle(name, key, template_mod, parent_mod)
+    else:
+        logger.debug("Using template bundle '{}' from an earlier run".format(name))
+    return bundles[name]
+
+def bundle_key(name, template_mod, parent_mod=None):
+    """ Cache key for a template, from its name, version and location, and those of its parent """
+    parts = [name, config.version]
+    for mod in [template_mod, parent_mod]:
+        if mod is not None:
+            parts.extend([mod.__name__, getattr(mod, '__version__', None), os.path.abspath(mod.template_dir)])
+    key_hash = hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()[:12]
+    return re.sub(r'[^\w\.-]', '_', '{}-{}-{}'.format(name, config.short_version, key_hash))
+
+class TemplateBundle(object):
+    """ A template with its parent, compiled Jinja templates and encoded included files """
+
+    def __init__(self, name, key, template_mod, parent_mod=None):
+        self.name = name
+        self.key = key
+        self.template_dirs = [template_mod.template_dir]
+        if parent_mod is not None:
+            self.template_dirs.append(parent_mod.template_dir)
+        self.assets = dict()
+        self.assets_changed = False
+        self.shared_assets = dict()
+        self.cache_dir = None
+        bytecode_cache = None
+        if config.template_cache:
+            try:
+                self.cache_dir = os.path.join(search_cache.get_cache_dir(), 'templates', key)
+                if not os.path.isdir(self.cache_dir):
+                    os.makedirs(self.cache_dir)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(self.cache_dir)
+                self.load_assets()
+            except (OSError, IOError) as e:
+                logger.warning("Could not use template cache directory '{}': {}".format(self.cache_dir, e))
+                self.cache_dir = None
+        self.env = jinja2.Environment(loader=jinja2.FileSystemLoader(self.template_dirs), bytecode_cache=bytecode_cache)
+        self.env.globals['include_file'] = self.include_file
+        self.env.globals['include_script'] = self.include_script
+        self.env.globals['include_style'] = self.include_style
+        self.env.globals['include_url'] = self.include_url
+        logger.debug("Loaded template bundle '{}' ({})".format(name, ', '.join(self.template_dirs)))
+
+    def template_path(self, name):
+        """ Path of a template file, from the child template if it has it """
+        for d in self.template_dirs:
+            path = os.path.join(d, name)
+            if os.path.exists(path):
+                return path
+        return os.path.join(self.template_dirs[0], name)
+
+    def include_file(self, name, fdir=template_files, b64=False):
+        """ Contents of a file for the Jinja templates, base64 encoded if b64
+        is True. Files are found in the template directories, unless fdir is
+        given (None for paths relative to the working directory). """
+        try:
+            if fdir is not template_files:
+                return read_file(os.path.join(fdir or '', name), b64)
+            path = self.template_path(name)
+            signature = search_cache.file_signature(path)
+            cached = self.assets.get((path, b64))
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            contents = read_file(path, b64)
+            self.assets[(path, b64)] = (signature, contents)
+            self.assets_changed = True
+            return contents
+        except (OSError, IOError) as e:
+            logger.error("Could not include file '{}': {}".format(name, e))
+
+    def include_script(self, name, fdir=template_files):
+        """ Script tag for a JavaScript file, with the file contents in the
+        report or linking to the shared asset directory """
+        url = self.shared_asset_url(name, fdir)
+        if url is not None:
+            return '<script type="text/javascript" src="{}"></script>'.format(url)
+        return '<script type="text/javascript">{}</script>'.format(self.include_file(name, fdir))
+
+    def include_style(self, name, fdir=template_files):
+        """ Style tag for a CSS file, with the file contents in the report
+        or linking to the shared asset directory """
+        url = self.shared_asset_url(name, fdir)
+        if url is not None:
+            return '<link rel="stylesheet" type="text/css" href="{}">'.format(url)
+        return '<style type="text/css">{}</style>'.format(self.include_file(name, fdir))
+
+    def include_url(self, name, mimetype=None, fdir=template_files):
+        """ URL for an image or font: a base64 data URI, or the URL of the
+        file in the shared asset directory """
+        url = self.shared_asset_url(name, fdir)
+        if url is not None:
+            return url
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        return 'data:{};base64,{}'.format(mimetype, self.include_file(name, fdir, b64=True))
+
+    def shared_asset_url(self, name, fdir=template_files):
+        """ Write a file to the shared asset directory and return its URL,
+        or None if the report includes files itself """
+        if not config.asset_dir:
+            return None
+        path = self.template_path(name) if fdir is template_files else os.path.join(fdir or '', name)
+        try:
+            signature = search_cache.file_signature(path)
+            key = (path, config.asset_dir, config.asset_gzip)
+            cached = self.shared_assets.get(key)
+            if cached is not None and cached[0] == signature:
+                fn = cached[1]
+            else:
+                fn = write_shared_asset(path, config.asset_dir, config.asset_gzip)
+                self.shared_assets[key] = (signature, fn)
+        except (OSError, IOError) as e:
+            logger.error("Could not write shared asset '{}': {}".format(name, e))
+            return None
+        if config.asset_url:
+            return '{}/{}'.format(config.asset_url.rstrip('/'), quote(fn))
+        # Relative to the report, so that the report and assets can be moved together
+        report_dir = os.getcwd() if config.output_fn is sys.stdout else os.path.dirname(os.path.abspath(config.output_fn))
+        rel_dir = os.path.relpath(config.asset_dir, report_dir).replace(os.sep, '/')
+        return quote('{}/{}'.format(rel_dir, fn))
+
+    def load_assets(self):
+        """ Load the included files saved by an earlier run """
+        assets_fn = os.path.join(self.cache_dir, 'assets.json')
+        if os.path.isfile(assets_fn):
+            try:
+                with io.open(assets_fn, 'r', encoding='utf-8') as f:
+                    for path, b64, signature, contents in json.load(f):
+                        self.assets[(path, b64)] = (signature, contents)
+                logger.debug("Loaded {} included files from template cache".format(len(self.assets)))
+            except ValueError as e:
+                logger.debug("Ignoring template cache file '{}': {}".format(assets_fn, e))
+
+    def save(self):
+        """ Save the included files for the next run, if any have changed """
+        if self.cache_dir is None or not self.assets_changed:
+            return
+        assets = [ [path, b64, signature, contents] for (path, b64), (signature, contents) in self.assets.items() ]
+        try:
+            # Write to a temporary file first so that other runs never read a partly written file
+            fh, tmp_fn = tempfile.mkstemp(dir=self.cache_dir)
+            with io.open(fh, 'wb') as f:
+                f.write(json.dumps(assets).encode('utf-8'))
+            os.rename(tmp_fn, os.path.join(self.cache_dir, 'assets.json'))
+            self.assets_changed = False
+        except (OSError, IOError) as e:
+            logger.warning("Could not save template cache: {}".format(e))
+
+    def copy_files(self, files, dest_dir):
+        """ Copy directories from the template to the report directory,
+        with the child template files replacing the parent's """
+        for f in files:
+            for d in reversed(self.template_dirs):
+                if os.path.isdir(os.path.join(d, f)):
+                    copy_tree(os.path.join(d, f), os.path.join(dest_dir, f))
+
+def write_shared_asset(path, asset_dir, compress=False):
+    """ Copy a file to the asset directory with a hash of its contents in the
+    filename, plus a gzipped copy if compress is True. Files that are already
+    there aren't written again. Returns the new filename. """
+    with io.open(path, 'rb') as f:
+        data = f.read()
+    base, ext = os.path.splitext(os.path.basename(path))
+    fn = '{}.{}{}'.format(base, hashlib.sha1(data).hexdigest()[:12], ext)
+    if not os.path.isdir(asset_dir):
+        os.makedirs(asset_dir)
+    outputs = [(fn, data)]
+    if compress:
+        gz_buffer = io.BytesIO()
+        # No timestamp in the gzip header, so the same file always gives the same bytes
+        with gzip.GzipFile(filename='', mode='wb', fileobj=gz_buffer, compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+        outputs.append(('{}.gz'.format(fn), gz_buffer.getvalue()))
+    for out_fn, out_data in outputs:
+        if not os.path.exists(os.path.join(asset_dir, out_fn)):
+            # Other reports may be writing the same file, so write it to a temporary file first
+            fh, tmp_fn = tempfile.mkstemp(dir=asset_dir)
+            with io.open(fh, 'wb') as f:
+                f.write(out_data)
+            os.chmod(tmp_fn, 0o644)
+            os.rename(tmp_fn, os.path.join(asset_dir, out_fn))
+    return fn
+
+def read_file(path, b64=False):
+    """ Read a file as text, or as base64 encoded text if b64 is True """
+    if b64:
+        with io.open(path, 'rb') as f:
+            return base64.b64encode(f.read()).decode('utf-8')
+    with io.open(path, 'r', encoding='utf-8') as f:
+        return f.read()
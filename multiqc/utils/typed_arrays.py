@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+""" Pack the numeric series in plot data into binary typed arrays, using NumPy.
+
+Line graph points and bar graph values are replaced with references to a
+binary buffer, which the report JavaScript reads with typed arrays:
+    {"mqc_array": [dtype, offset, length, sig_digits]} - a list of numbers
+    {"mqc_xy": [x, y]} - a list of [x, y] pairs, with x and y as above
+dtype is 'i32', 'f32' or 'f64'. Float32 values are rounded to sig_digits
+significant digits when they are read, which is left out for other types.
+Identical arrays, such as x values shared by every series in a line graph,
+are only stored once. Each array starts on an 8 byte boundary.
+"""
+
+from __future__ import print_function, division
+from collections import OrderedDict
+from itertools import chain
+import numbers
+import numpy as np
+
+# Typed array names and NumPy dtypes. Little-endian, as used by browsers.
+dtypes = OrderedDict([
+    ('i32', '<i4'),
+    ('f32', '<f4'),
+    ('f64', '<f8'),
+])
+
+# Most significant digits that a 32 bit float can hold
+float32_digits = 7
+int32_range = (-2**31, 2**31 - 1)
+float32_max = 3.4e38
+
+class TypedArrayPacker(object):
+    """ Packs plot data, collecting the binary data for all of the arrays """
+
+    def __init__(self, sig_digits=float32_digits):
+        self.sig_digits = sig_digits
+        self.chunks = list()
+        self.offset = 0
+        self.refs = dict()
+
+    def buffer(self):
+        """ The binary data for all arrays packed so far """
+        return b''.join(self.chunks)
+
+    def pack_plot(self, pdata):
+        """ Return a copy of the data for one plot with its series packed.
+        Only line and bar graphs are changed. Series that aren't all numbers
+        and anything else in the data are left as they are. """
+        plot_type = pdata.get('plot_type') if isinstance(pdata, dict) else None
+        if plot_type not in ['xy_line', 'bar_graph'] or not isinstance(pdata.get('datasets'), list):
+            return pdata
+        sig_digits = pdata.get('config', {}).get('sig_digits', self.sig_digits)
+        datasets = list()
+        for dataset in pdata['datasets']:
+            series = list()
+            for s in dataset:
+                if isinstance(s, dict) and isinstance(s.get('data'), list) and len(s['data']) > 0:
+                    packed = self.pack_series(s['data'], sig_digits, plot_type == 'xy_line')
+                    if packed is not None:
+                        s = dict(s, data=packed)
+                series.append(s)
+            datasets.append(series)
+        return dict(pdata, datasets=datasets)
+
+    def pack_series(self, data, sig_digits, xy=False):
+        """ Pack a list of numbers, or of [x, y] pairs if xy is True.
+        Returns None if the series can't be packed. """
+        arr = to_array(data, 2 if xy else 1)
+        if arr is None:
+            return None
+        if xy:
+            if arr.shape[1] != 2 or np.isnan(arr[:, 0]).any():
+                return None
+            return { 'mqc_xy': [self.add(arr[:, 0], sig_digits), self.add(arr[:, 1], sig_digits)] }
+        return self.add(arr, sig_digits)
+
+    def add(self, arr, sig_digits):
+        """ Add a NumPy array of numbers and return the reference to it """
+        name = array_type(arr, sig_digits)
+        raw = arr.astype(dtypes[name]).tobytes()
+        # Float32 arrays with the same bytes are rounded differently when read
+        # if their sig_digits differ, so they are only shared if it matches
+        key = (name, sig_digits if name == 'f32' else None, raw)
+        if key not in self.refs:
+            ref = [name, self.offset, len(arr)]
+            if name == 'f32':
+                ref.append(sig_digits)
+            self.refs[key] = { 'mqc_array': ref }
+            padding = b'\0' * (-len(raw) % 8)
+            self.chunks.extend([raw, padding])
+            self.offset += len(raw) + len(padding)
+        return self.refs[key]
+
+def to_array(values, ndim=1):
+    """ NumPy array with ndim dimensions of a (nested) list of numbers, with
+    None as NaN. Returns None if there's anything other than numbers. """
+    try:
+        arr = np.array(values)
+    except ValueError:
+        return None
+    if arr.ndim != ndim:
+        return None
+    if arr.dtype.kind in 'iuf':
+        # NumPy turns True and False into numbers, which would change the data
+        flat = values if ndim == 1 else chain.from_iterable(values)
+        return None if bool in set(map(type, flat)) else arr
+    if arr.dtype.kind == 'O' and all(v is None or (isinstance(v, numbers.Real) and not isinstance(v, bool)) for v in arr.flat):
+        return arr.astype(float)
+    return None
+
+def array_type(arr, sig_digits):
+    """ Smallest typed array that holds the values exactly: 32 bit integers
+    if they are whole numbers that fit, 32 bit floats if sig_digits is small
+    enough, otherwise 64 bit floats """
+    finite = arr if arr.dtype.kind in 'iu' else arr[np.isfinite(arr)]
+    if len(finite) == 0:
+        return 'f32' if sig_digits <= float32_digits else 'f64'
+    if len(finite) == len(arr) and finite.min() >= int32_range[0] and finite.max() <= int32_range[1]:
+        if arr.dtype.kind in 'iu' or np.array_equal(arr, np.floor(arr)):
+            return 'i32'
+    if sig_digits <= float32_digits and arr.dtype.kind == 'f' and np.abs(finite).max() < float32_max:
+        return 'f32'
+    return 'f64'
@@ -3,6 +3,8 @@
 """ MultiQC Utility functions, used in a variety of places. """
 
 from __future__ import print_function
+import contextlib
+import gzip
 import io
 import json
 import os
@@ -12,6 +14,7 @@ import shutil
 import sys
 
 from multiqc import config
+from multiqc.utils import profiling
 
 def robust_rmtree(path, logger=None, max_retries=10):
     """Robustly tries to delete paths.
@@ -37,6 +40,7 @@ def robust_rmtree(path, logger=None, max_retries=10):
     shutil.rmtree(path)
 
 
+@profiling.profile('write')
 def write_data_file(data, fn, sort_cols=False, data_format=None):
     """ Write a data file to the report directory. Will not do anything
     if config.data_dir is not set.
@@ -93,6 +97,31 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
 
                 print( body.encode('utf-8', 'ignore').decode('utf-8'), file=f)
 
+@contextlib.contextmanager
+def open_report(fn, compress=False):
+    """ Open the report file to write bytes to, with a large write buffer.
+    :param: fn - Report filename, or sys.stdout to write to standard out
+    :param: compress - Compress the report with gzip as it is written
+    :return: A file object, closed (or flushed for standard out) afterwards """
+
+    if fn is sys.stdout:
+        fh = getattr(sys.stdout, 'buffer', sys.stdout) # Python 2 has no buffer
+        gz_name = ''
+    else:
+        fh = io.open(fn, 'wb', buffering=config.report_write_buffer)
+        gz_name = os.path.basename(fn)
+    try:
+        if compress:
+            with gzip.GzipFile(filename=gz_name, mode='wb', fileobj=fh, compresslevel=config.gzip_report_level) as gz:
+                yield gz
+        else:
+            yield fh
+    finally:
+        if fn is sys.stdout:
+            fh.flush()
+        else:
+            fh.close()
+
 def view_all_tags(ctx, param, value):
     """ List available tags and associated modules
     Called by eager click option: --view-tags
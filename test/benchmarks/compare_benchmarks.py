@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+""" Compare two results files from run_benchmarks.py, for example from
+before and after a change. Prints the time for each benchmark in both
+and flags any that got slower by more than the threshold.
+
+Usage: python test/benchmarks/compare_benchmarks.py BEFORE.json AFTER.json [--threshold 1.2]
+"""
+
+from __future__ import print_function, division
+import click
+import json
+import sys
+
+def load_results(fn):
+    with open(fn) as f:
+        data = json.load(f)
+    results = dict()
+    for r in data['results']:
+        results[(r['samples'], r['benchmark'])] = r
+    return data, results
+
+@click.command()
+@click.argument('before', type=click.Path(exists=True))
+@click.argument('after', type=click.Path(exists=True))
+@click.option('--threshold', default=1.2, show_default=True, help="Flag benchmarks that take this many times as long")
+@click.option('--min-time', default=0.05, show_default=True, help="Ignore benchmarks quicker than this in both files (seconds)")
+@click.option('--cpu', is_flag=True, help="Compare CPU time instead of wall time")
+def main(before, after, threshold, min_time, cpu):
+    before_data, before_results = load_results(before)
+    after_data, after_results = load_results(after)
+    measure = 'cpu_time' if cpu else 'wall_time'
+    print("Before: {} ({})".format(before, before_data.get('commit')))
+    print("After:  {} ({})".format(after, after_data.get('commit')))
+    print("{:>7}  {:<50} {:>10} {:>10} {:>7}".format('Samples', 'Benchmark', 'Before', 'After', 'Ratio'))
+
+    num_slower = 0
+    keys = sorted(set(before_results) | set(after_results))
+    for key in keys:
+        b = before_results.get(key, {}).get(measure)
+        a = after_results.get(key, {}).get(measure)
+        if b is None or a is None:
+            print("{:>7}  {:<50} {:>10} {:>10}".format(key[0], key[1],
+                '-' if b is None else '{:.3f}s'.format(b), '-' if a is None else '{:.3f}s'.format(a)))
+            continue
+        if b < min_time and a < min_time:
+            continue
+        ratio = a / b if b > 0 else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            num_slower += 1
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        print("{:>7}  {:<50} {:>9.3f}s {:>9.3f}s {:>6.2f}x{}".format(key[0], key[1], b, a, ratio, flag))
+
+    if num_slower > 0:
+        print("{} benchmarks were more than {}x slower".format(num_slower, threshold))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
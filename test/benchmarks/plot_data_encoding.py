@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+""" Micro-benchmark for the plot data encoders in multiqc.utils.report.
+Builds a synthetic plot data payload and prints the time taken to
+write it as JSON and to compress it with each encoder, with the output size.
+
+Usage: python test/benchmarks/plot_data_encoding.py [--samples 5000] [--repeats 3]
+"""
+
+from __future__ import print_function
+import click
+import json
+import random
+import timeit
+
+from multiqc.utils import report
+
+def synthetic_plot_data(num_samples, num_points=100, seed=1):
+    """ Plot data similar to a report with one line graph and one
+    bar graph per sample, as produced by the plotting functions """
+    rand = random.Random(seed)
+    s_names = ['sample_{:05d}'.format(i) for i in range(num_samples)]
+    line_data = [{
+        'name': s_name,
+        'data': [ [x, round(rand.gauss(30, 3), 2)] for x in range(1, num_points + 1) ]
+    } for s_name in s_names]
+    bar_data = [{
+        'name': cat,
+        'data': [ rand.randint(0, 10000000) for s_name in s_names ]
+    } for cat in ['Aligned', 'Unaligned', 'Multimapped']]
+    return {
+        'benchmark_linegraph': {
+            'plot_type': 'xy_line',
+            'datasets': [line_data],
+            'config': { 'id': 'benchmark_linegraph', 'title': 'Benchmark line graph' }
+        },
+        'benchmark_bargraph': {
+            'plot_type': 'bar_graph',
+            'samples': [s_names],
+            'datasets': [bar_data],
+            'config': { 'id': 'benchmark_bargraph', 'title': 'Benchmark bar graph' }
+        }
+    }
+
+def best_time(func, repeats):
+    return min(timeit.repeat(func, number=1, repeat=repeats))
+
+@click.command()
+@click.option('--samples', default=5000, show_default=True, help="Number of samples in the payload")
+@click.option('--repeats', default=3, show_default=True, help="Number of times to repeat each timing (best is shown)")
+def main(samples, repeats):
+    data = synthetic_plot_data(samples)
+
+    print("Plot data JSON, {} samples".format(samples))
+    json_time = best_time(lambda: json.dumps(data), repeats)
+    print("  {:<12} {:>8.3f}s".format('json', json_time))
+    if report.orjson is not None:
+        orjson_time = best_time(lambda: report.orjson.dumps(data), repeats)
+        print("  {:<12} {:>8.3f}s".format('orjson', orjson_time))
+    json_string = report.plot_data_json(data)
+    print("  {:<12} {:>8.3f}s  {:>12,} bytes".format('used', best_time(lambda: report.plot_data_json(data), repeats), len(json_string)))
+
+    print("Plot data encoders")
+    for name, encoder in report.plot_data_encoders.items():
+        encoded = encoder(json_string)
+        enc_time = best_time(lambda: encoder(json_string), repeats)
+        print("  {:<12} {:>8.3f}s  {:>12,} bytes".format(name, enc_time, len(encoded)))
+    for name, encoder in report.plot_data_binary_encoders.items():
+        encoded = encoder(data)
+        enc_time = best_time(lambda: encoder(data), repeats)
+        print("  {:<12} {:>8.3f}s  {:>12,} bytes".format(name, enc_time, len(encoded)))
+
+if __name__ == "__main__":
+    main()
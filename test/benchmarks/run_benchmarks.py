@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+""" Benchmark suite for MultiQC with synthetic data.
+
+For each number of samples, writes synthetic log files (see synthetic_data.py)
+and runs MultiQC on them with --profile-runtime, to time the file search, each
+module, each plot function, plot data compression and template rendering.
+Each plot function and compress_json() are also timed on their own with
+synthetic plot data. Results are written to a JSON file, which can be
+compared with the results from another commit with compare_benchmarks.py.
+
+Usage: python test/benchmarks/run_benchmarks.py [--samples 10 --samples 1000] [-o benchmark_results.json]
+"""
+
+from __future__ import print_function
+from collections import OrderedDict
+import click
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+
+from multiqc.utils import config, report, profiling
+import synthetic_data
+
+def timed(func, repeats):
+    """ Run a function repeats times, returning the best wall and CPU time """
+    wall_times, cpu_times = [], []
+    for i in range(repeats):
+        wall_start, cpu_start = time.time(), profiling.cpu_time()
+        func()
+        wall_times.append(time.time() - wall_start)
+        cpu_times.append(profiling.cpu_time() - cpu_start)
+    return min(wall_times), min(cpu_times)
+
+def run_multiqc(multiqc_cmd, data_dir, out_dir, modules):
+    """ Run MultiQC with run time profiling and return the timings """
+    cmd = shlex.split(multiqc_cmd) + [data_dir, '-o', out_dir, '-f', '-q', '--profile-runtime',
+        '--cl_config', 'no_version_check: true', '--cl_config', 'profile_runtime_section: false']
+    for m in modules:
+        cmd.extend(['-m', m])
+    subprocess.check_call(cmd)
+    with io.open(os.path.join(out_dir, 'multiqc_data', 'multiqc_runtime.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+def multiqc_results(num_samples, runtimes):
+    """ Benchmark results from the timings of MultiQC runs, using the best time for each step """
+    results = OrderedDict()
+    for runtime in runtimes:
+        steps = [dict(t, stage='total', name='multiqc', count=1) for t in [runtime['total']]] + runtime['steps']
+        for t in steps:
+            # Skip search patterns that didn't match any files
+            if t['stage'] == 'find_log_files' and t['count'] == 0:
+                continue
+            name = '{}: {}'.format(t['stage'], t['name'])
+            if name not in results or t['wall_time'] < results[name]['wall_time']:
+                results[name] = OrderedDict([
+                    ('samples', num_samples),
+                    ('benchmark', name),
+                    ('count', t['count']),
+                    ('wall_time', t['wall_time']),
+                    ('cpu_time', t['cpu_time']),
+                    ('peak_rss_mb', t['peak_rss_mb'])
+                ])
+    return list(results.values())
+
+def plot_inputs(num_samples, seed=1):
+    """ Synthetic data for each plot function, as (name, function, args) """
+    from multiqc.plots import bargraph, beeswarm, heatmap, linegraph, scatter, table
+    rand = random.Random(seed)
+    s_names = synthetic_data.sample_names(num_samples)
+    line_data = OrderedDict( (s, OrderedDict( (x, rand.gauss(30, 3)) for x in range(1, 101) )) for s in s_names )
+    bar_data = OrderedDict( (s, OrderedDict( (c, rand.randint(0, 10000000)) for c in ['aligned', 'unaligned', 'multimapped'] )) for s in s_names )
+    table_data = OrderedDict( (s, OrderedDict( ('col_{}'.format(i), rand.uniform(0, 100)) for i in range(10) )) for s in s_names )
+    scatter_data = OrderedDict( (s, {'x': rand.gauss(0, 1), 'y': rand.gauss(0, 1)}) for s in s_names )
+    # Heatmaps grow with the square of the number of samples, so only use some
+    hm_names = s_names[:100]
+    hm_data = [ [rand.uniform(0, 1) for s in hm_names] for s in hm_names ]
+    return [
+        ('linegraph.plot', linegraph.plot, (line_data, {'id': 'benchmark_linegraph'})),
+        ('bargraph.plot', bargraph.plot, (bar_data, None, {'id': 'benchmark_bargraph'})),
+        ('table.plot', table.plot, (table_data, None, {'id': 'benchmark_table'})),
+        ('beeswarm.plot', beeswarm.plot, (table_data, None, {'id': 'benchmark_beeswarm'})),
+        ('scatter.plot', scatter.plot, (scatter_data, {'id': 'benchmark_scatter'})),
+        ('heatmap.plot', heatmap.plot, (hm_data, hm_names, hm_names, {'id': 'benchmark_heatmap'})),
+    ]
+
+def plot_results(num_samples, repeats, data_dir):
+    """ Time each plot function and the plot data compression in this process """
+    # Flat plots save their data to the data directory, as in a normal run
+    config.data_dir = data_dir
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+    results = []
+    def add(name, times):
+        results.append(OrderedDict([
+            ('samples', num_samples),
+            ('benchmark', name),
+            ('count', 1),
+            ('wall_time', times[0]),
+            ('cpu_time', times[1]),
+            ('peak_rss_mb', None)
+        ]))
+    report.plot_data = dict()
+    for name, func, args in plot_inputs(num_samples):
+        add('plots: {}'.format(name), timed(lambda: func(*args), repeats))
+    plot_data = report.plot_data
+    add('plots: report.compress_json', timed(lambda: report.compress_json(plot_data), repeats))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+@click.command()
+@click.option('--samples', type=int, multiple=True, default=[10, 1000], show_default=True,
+              help="Number of samples to benchmark with. Can specify multiple times.")
+@click.option('--tool', 'tool_names', type=click.Choice(list(synthetic_data.tools.keys())), multiple=True,
+              help="Only use synthetic data for this tool. Can specify multiple times.")
+@click.option('--repeats', default=1, show_default=True, help="Number of times to repeat each benchmark (best is saved)")
+@click.option('--multiqc', 'multiqc_cmd', default='multiqc', show_default=True, help="Command to run MultiQC")
+@click.option('--data-dir', type=click.Path(), help="Keep the synthetic data in this directory, and reuse it next time")
+@click.option('--skip-plots', is_flag=True, help="Don't time the plot functions on their own")
+@click.option('-o', '--output', default='benchmark_results.json', show_default=True, help="Results file")
+def main(samples, tool_names, repeats, multiqc_cmd, data_dir, skip_plots, output):
+    if not tool_names:
+        tool_names = list(synthetic_data.tools.keys())
+    modules = sorted(set(synthetic_data.tools[t][1] for t in tool_names))
+
+    tmp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for num_samples in samples:
+            if data_dir is not None:
+                samples_dir = os.path.join(data_dir, 'samples_{}_{}'.format(num_samples, '_'.join(tool_names)))
+            else:
+                samples_dir = os.path.join(tmp_dir, 'samples_{}'.format(num_samples))
+            if not os.path.isdir(samples_dir):
+                print("Writing synthetic data for {} samples".format(num_samples))
+                synthetic_data.generate(samples_dir, num_samples, tool_names)
+
+            print("Running MultiQC with {} samples".format(num_samples))
+            out_dir = os.path.join(tmp_dir, 'multiqc_{}'.format(num_samples))
+            runtimes = [run_multiqc(multiqc_cmd, samples_dir, out_dir, modules) for i in range(repeats)]
+            results.extend(multiqc_results(num_samples, runtimes))
+
+            if not skip_plots:
+                print("Timing plot functions with {} samples".format(num_samples))
+                results.extend(plot_results(num_samples, repeats, os.path.join(tmp_dir, 'plots_data_{}'.format(num_samples))))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    data = OrderedDict([
+        ('multiqc_version', config.version),
+        ('commit', git_commit()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('date', datetime.datetime.now().isoformat()),
+        ('results', results)
+    ])
+    with open(output, 'w') as f:
+        json.dump(data, f, indent=4)
+    for r in results:
+        print("  {:>6} samples  {:<50} {:>9.3f}s".format(r['samples'], r['benchmark'], r['wall_time']))
+    print("Results saved to {}".format(output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+""" Benchmark for MultiQC start up time. Runs each command in a new Python
+process and prints the best wall time, with the modules that are imported
+by the time the MultiQC config has loaded. Slow imports such as matplotlib
+should only be loaded when they are first used.
+
+Results can be saved in the same format as run_benchmarks.py and compared
+with compare_benchmarks.py.
+
+Usage: python test/benchmarks/startup_time.py [--repeats 10] [-o startup_results.json]
+"""
+
+from __future__ import print_function
+from collections import OrderedDict
+import click
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+
+# Python code to time, each run in a new interpreter
+commands = OrderedDict([
+    ('python', 'pass'),
+    ('import multiqc', 'import multiqc'),
+    ('import multiqc.utils.config', 'from multiqc.utils import config'),
+    ('import multiqc.plots', 'from multiqc.plots import bargraph, linegraph, table'),
+    ('import multiqc.modules.base_module', 'from multiqc.modules import base_module'),
+])
+
+# Modules that should not be imported at start up
+slow_imports = ['matplotlib', 'markdown', 'spectra', 'requests', 'pkg_resources']
+
+def time_command(args, repeats):
+    """ Run a command repeats times and return the best wall time """
+    times = []
+    for i in range(repeats):
+        start = time.time()
+        subprocess.check_call(args)
+        times.append(time.time() - start)
+    return min(times)
+
+def loaded_slow_imports():
+    """ Return the slow modules imported along with the MultiQC config and plots """
+    code = "import sys\nfrom multiqc.utils import config\nfrom multiqc.plots import bargraph, linegraph, table\n" \
+           "from multiqc.modules import base_module\nprint(' '.join(sorted(sys.modules)))"
+    loaded = subprocess.check_output([sys.executable, '-c', code]).decode().split()
+    return [m for m in slow_imports if m in loaded]
+
+@click.command()
+@click.option('--repeats', default=10, show_default=True, help="Number of times to run each command (best is saved)")
+@click.option('--multiqc', 'multiqc_cmd', default='multiqc', show_default=True, help="Command to run MultiQC")
+@click.option('-o', '--output', help="Save results to this file")
+def main(repeats, multiqc_cmd, output):
+    results = []
+    def add(name, wall_time):
+        results.append(OrderedDict([
+            ('samples', 0),
+            ('benchmark', 'startup: {}'.format(name)),
+            ('count', 1),
+            ('wall_time', wall_time),
+            ('cpu_time', None),
+            ('peak_rss_mb', None)
+        ]))
+        print("  {:<50} {:>7.3f}s".format(name, wall_time))
+
+    for name, code in commands.items():
+        add(name, time_command([sys.executable, '-c', code], repeats))
+    add('multiqc --version', time_command([multiqc_cmd, '--version'], repeats))
+
+    slow = loaded_slow_imports()
+    if slow:
+        print("Slow modules imported at start up: {}".format(', '.join(slow)))
+
+    if output is not None:
+        from multiqc.utils import config
+        data = OrderedDict([
+            ('multiqc_version', config.version),
+            ('commit', config.git_hash),
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('date', datetime.datetime.now().isoformat()),
+            ('results', results)
+        ])
+        with open(output, 'w') as f:
+            json.dump(data, f, indent=4)
+        print("Results saved to {}".format(output))
+
+if __name__ == "__main__":
+    main()
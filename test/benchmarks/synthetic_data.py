@@ -0,0 +1,451 @@
+#!/usr/bin/env python
+
+""" Generate synthetic log files for benchmarking MultiQC with large numbers
+of samples. The files are written in the same formats as the real tools, with
+random (but reproducible) values, so that they are found and parsed by the
+MultiQC modules as usual.
+
+Usage: python test/benchmarks/synthetic_data.py OUTDIR [--samples 1000] [--tool fastqc ...]
+"""
+
+from __future__ import print_function, division
+from collections import OrderedDict
+import click
+import io
+import json
+import os
+import random
+import zipfile
+
+def sample_names(num_samples):
+    return ['sample_{:05d}'.format(i) for i in range(1, num_samples + 1)]
+
+def sample_random(s_name, seed, tool):
+    """ Random number generator for one sample and tool, so that each file
+    is the same whichever other files are generated """
+    return random.Random('{}-{}-{}'.format(seed, tool, s_name))
+
+def _status(rand):
+    return rand.choice(['pass'] * 6 + ['warn'] * 3 + ['fail'])
+
+def _bins(read_length):
+    """ FastQC style position bins: single bases, then groups of 5 """
+    bins = [str(i) for i in range(1, 10)]
+    for start in range(10, read_length + 1, 5):
+        end = min(start + 4, read_length)
+        bins.append('{}-{}'.format(start, end) if end > start else str(start))
+    return bins
+
+def fastqc_data(s_name, rand, read_length=150):
+    """ Contents of a FastQC fastqc_data.txt file """
+    total = rand.randint(1000000, 50000000)
+    gc = rand.randint(38, 52)
+    bins = _bins(read_length)
+    lines = ['##FastQC\t0.11.8']
+
+    lines.append('>>Basic Statistics\tpass')
+    lines.append('#Measure\tValue')
+    lines.append('Filename\t{}.fastq.gz'.format(s_name))
+    lines.append('File type\tConventional base calls')
+    lines.append('Encoding\tSanger / Illumina 1.9')
+    lines.append('Total Sequences\t{}'.format(total))
+    lines.append('Sequences flagged as poor quality\t0')
+    lines.append('Sequence length\t{}'.format(read_length))
+    lines.append('%GC\t{}'.format(gc))
+    lines.append('>>END_MODULE')
+
+    lines.append('>>Per base sequence quality\t{}'.format(_status(rand)))
+    lines.append('#Base\tMean\tMedian\tLower Quartile\tUpper Quartile\t10th Percentile\t90th Percentile')
+    for i, b in enumerate(bins):
+        mean = 36 - (i / len(bins)) * rand.uniform(2, 10)
+        lines.append('{}\t{:.3f}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}'.format(
+            b, mean, round(mean), round(mean) - 3, min(round(mean) + 2, 41), round(mean) - 8, min(round(mean) + 4, 41)))
+    lines.append('>>END_MODULE')
+
+    lines.append('>>Per sequence quality scores\t{}'.format(_status(rand)))
+    lines.append('#Quality\tCount')
+    for q in range(2, 42):
+        lines.append('{}\t{:.1f}'.format(q, total * (q / 861.0) * rand.uniform(0.5, 1.5) / 10))
+    lines.append('>>END_MODULE')
+
+    lines.append('>>Per base sequence content\t{}'.format(_status(rand)))
+    lines.append('#Base\tG\tA\tT\tC')
+    for b in bins:
+        g = gc / 2 + rand.uniform(-2, 2)
+        c = gc - g
+        a = (100 - gc) / 2 + rand.uniform(-2, 2)
+        t = 100 - gc - a
+        lines.append('{}\t{:.4f}\t{:.4f}\t{:.4f}\t{:.4f}'.format(b, g, a, t, c))
+    lines.append('>>END_MODULE')
+
+    lines.append('>>Per sequence GC content\t{}'.format(_status(rand)))
+    lines.append('#GC Content\tCount')
+    for pct in range(0, 101):
+        lines.append('{}\t{:.1f}'.format(pct, total * max(0, 1 - abs(pct - gc) / 25.0) / 25.0))
+    lines.append('>>END_MODULE')
+
+    lines.append('>>Per base N content\t{}'.format(_status(rand)))
+    lines.append('#Base\tN-Count')
+    for b in bins:
+        lines.append('{}\t{:.4f}'.format(b, rand.uniform(0, 0.05)))
+    lines.append('>>END_MODULE')
+
+    lines.append('>>Sequence Length Distribution\tpass')
+    lines.append('#Length\tCount')
+    lines.append('{}\t{:.1f}'.format(read_length, total))
+    lines.append('>>END_MODULE')
+
+    dedup = rand.uniform(30, 95)
+    lines.append('>>Sequence Duplication Levels\t{}'.format(_status(rand)))
+    lines.append('#Total Deduplicated Percentage\t{:.4f}'.format(dedup))
+    lines.append('#Duplication Level\tPercentage of deduplicated\tPercentage of total')
+    levels = [str(i) for i in range(1, 10)] + ['>10', '>50', '>100', '>500', '>1k', '>5k', '>10k+']
+    remaining = 100.0
+    for i, level in enumerate(levels):
+        pct = remaining * (dedup / 100.0) if i < len(levels) - 1 else remaining
+        remaining -= pct
+        lines.append('{}\t{:.4f}\t{:.4f}'.format(level, pct, pct * rand.uniform(0.5, 1.5)))
+    lines.append('>>END_MODULE')
+
+    num_overrep = rand.randint(0, 5)
+    lines.append('>>Overrepresented sequences\t{}'.format('pass' if num_overrep == 0 else 'warn'))
+    if num_overrep > 0:
+        lines.append('#Sequence\tCount\tPercentage\tPossible Source')
+    for i in range(num_overrep):
+        seq = ''.join(rand.choice('ACGT') for _ in range(50))
+        count = int(total * rand.uniform(0.001, 0.01))
+        lines.append('{}\t{}\t{:.4f}\tNo Hit'.format(seq, count, 100.0 * count / total))
+    lines.append('>>END_MODULE')
+
+    adapters = ['Illumina Universal Adapter', "Illumina Small RNA 3' Adapter", "Illumina Small RNA 5' Adapter",
+                'Nextera Transposase Sequence', 'SOLID Small RNA Adapter']
+    lines.append('>>Adapter Content\t{}'.format(_status(rand)))
+    lines.append('#Position\t{}'.format('\t'.join(adapters)))
+    level = rand.uniform(0, 0.1)
+    for i, b in enumerate(bins):
+        lines.append('{}\t{:.6f}\t0.0\t0.0\t{:.6f}\t0.0'.format(b, level * i, level * i / 10))
+    lines.append('>>END_MODULE')
+
+    return '\n'.join(lines) + '\n'
+
+def samtools_stats(s_name, rand):
+    """ Contents of a samtools stats file """
+    total = rand.randint(1000000, 50000000)
+    mapped = int(total * rand.uniform(0.7, 0.99))
+    paired = mapped - mapped % 2
+    proper = int(paired * rand.uniform(0.9, 0.99))
+    dups = int(mapped * rand.uniform(0.05, 0.4))
+    insert_size = rand.uniform(200, 400)
+    sn = OrderedDict([
+        ('raw total sequences', total),
+        ('filtered sequences', 0),
+        ('sequences', total),
+        ('is sorted', 1),
+        ('1st fragments', total // 2),
+        ('last fragments', total - total // 2),
+        ('reads mapped', mapped),
+        ('reads mapped and paired', paired),
+        ('reads unmapped', total - mapped),
+        ('reads properly paired', proper),
+        ('reads paired', total),
+        ('reads duplicated', dups),
+        ('reads MQ0', int(mapped * rand.uniform(0, 0.05))),
+        ('reads QC failed', 0),
+        ('non-primary alignments', int(mapped * rand.uniform(0, 0.1))),
+        ('total length', total * 150),
+        ('bases mapped', mapped * 150),
+        ('bases mapped (cigar)', int(mapped * 149.5)),
+        ('bases trimmed', 0),
+        ('bases duplicated', dups * 150),
+        ('mismatches', int(mapped * 150 * rand.uniform(0.001, 0.01))),
+        ('error rate', '{:.6e}'.format(rand.uniform(0.001, 0.01))),
+        ('average length', 150),
+        ('maximum length', 150),
+        ('average quality', '{:.1f}'.format(rand.uniform(30, 38))),
+        ('insert size average', '{:.1f}'.format(insert_size)),
+        ('insert size standard deviation', '{:.1f}'.format(insert_size / 4)),
+        ('inward oriented pairs', paired // 2),
+        ('outward oriented pairs', int(paired * 0.001)),
+        ('pairs with other orientation', 0),
+        ('pairs on different chromosomes', int(paired * 0.01)),
+    ])
+    lines = [
+        '# This file was produced by samtools stats (1.9+htslib-1.9) and can be plotted using plot-bamstats',
+        '# This file contains statistics for all reads.',
+        '# CHK, Checksum\t[2]Read Names\t[3]Sequences\t[4]Qualities',
+        'CHK\t{:08x}\t{:08x}\t{:08x}'.format(rand.getrandbits(32), rand.getrandbits(32), rand.getrandbits(32)),
+        '# Summary Numbers. Use `grep ^SN | cut -f 2-` to extract this part.'
+    ]
+    for k, v in sn.items():
+        lines.append('SN\t{}:\t{}'.format(k, v))
+    lines.append('# GC Content of first fragments. Use `grep ^GCF | cut -f 2-` to extract this part.')
+    for pct in range(0, 100):
+        lines.append('GCF\t{:.2f}\t{}'.format(pct + 0.25, int(total * max(0, 1 - abs(pct - 45) / 25.0) / 50)))
+    lines.append('# Insert sizes. Use `grep ^IS | cut -f 2-` to extract this part.')
+    for i in range(0, 600):
+        count = int(paired / 2 * max(0, 1 - abs(i - insert_size) / 150.0) / 150)
+        lines.append('IS\t{}\t{}\t{}\t{}\t0'.format(i, count, count // 2, count - count // 2))
+    lines.append('# Coverage distribution. Use `grep ^COV | cut -f 2-` to extract this part.')
+    for i in range(1, 1001):
+        lines.append('COV\t[{0}-{0}]\t{0}\t{1}'.format(i, int(total / (i * i))))
+    return '\n'.join(lines) + '\n'
+
+def picard_markdups(s_name, rand):
+    """ Contents of a Picard MarkDuplicates metrics file """
+    pairs = rand.randint(500000, 25000000)
+    unpaired = rand.randint(0, 100000)
+    pair_dups = int(pairs * rand.uniform(0.05, 0.4))
+    unpaired_dups = int(unpaired * rand.uniform(0.05, 0.4))
+    lines = [
+        '## htsjdk.samtools.metrics.StringHeader',
+        '# MarkDuplicates INPUT=[{0}.bam] OUTPUT={0}.dedup.bam METRICS_FILE={0}.markdups.metrics.txt'.format(s_name),
+        '## htsjdk.samtools.metrics.StringHeader',
+        '# Started on: Tue Jan 01 00:00:00 GMT 2019',
+        '',
+        '## METRICS CLASS\tpicard.sam.DuplicationMetrics',
+        '\t'.join(['LIBRARY', 'UNPAIRED_READS_EXAMINED', 'READ_PAIRS_EXAMINED', 'SECONDARY_OR_SUPPLEMENTARY_RDS',
+                   'UNMAPPED_READS', 'UNPAIRED_READ_DUPLICATES', 'READ_PAIR_DUPLICATES', 'READ_PAIR_OPTICAL_DUPLICATES',
+                   'PERCENT_DUPLICATION', 'ESTIMATED_LIBRARY_SIZE']),
+        '\t'.join([str(v) for v in [
+            s_name, unpaired, pairs, rand.randint(0, 10000), rand.randint(0, 100000), unpaired_dups, pair_dups,
+            int(pair_dups * rand.uniform(0, 0.1)), '{:.6f}'.format((pair_dups * 2 + unpaired_dups) / (pairs * 2.0 + unpaired)),
+            pairs * rand.randint(2, 10)
+        ]]),
+        '',
+        '## HISTOGRAM\tjava.lang.Double',
+        'BIN\tVALUE'
+    ]
+    for i in range(1, 101):
+        lines.append('{:.1f}\t{:.6f}'.format(i, 1 + (i - 1) * rand.uniform(0.5, 0.9)))
+    return '\n'.join(lines) + '\n'
+
+def picard_insertsize(s_name, rand):
+    """ Contents of a Picard CollectInsertSizeMetrics file """
+    mean = rand.uniform(200, 400)
+    sd = mean / 4
+    pairs = rand.randint(500000, 25000000)
+    widths = ['WIDTH_OF_{}_PERCENT'.format(p) for p in [10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99]]
+    lines = [
+        '## htsjdk.samtools.metrics.StringHeader',
+        '# CollectInsertSizeMetrics HISTOGRAM_FILE={0}.pdf INPUT={0}.bam OUTPUT={0}.insert_size_metrics.txt'.format(s_name),
+        '## htsjdk.samtools.metrics.StringHeader',
+        '# Started on: Tue Jan 01 00:00:00 GMT 2019',
+        '',
+        '## METRICS CLASS\tpicard.analysis.InsertSizeMetrics',
+        '\t'.join(['MEDIAN_INSERT_SIZE', 'MODE_INSERT_SIZE', 'MEDIAN_ABSOLUTE_DEVIATION', 'MIN_INSERT_SIZE',
+                   'MAX_INSERT_SIZE', 'MEAN_INSERT_SIZE', 'STANDARD_DEVIATION', 'READ_PAIRS', 'PAIR_ORIENTATION']
+                  + widths + ['SAMPLE', 'LIBRARY', 'READ_GROUP']),
+        '\t'.join([str(v) for v in [
+            int(mean), int(mean), int(sd * 0.67), 2, int(mean * 10), '{:.6f}'.format(mean), '{:.6f}'.format(sd), pairs, 'FR'
+        ]] + [str(int(sd * (i + 1) / 4)) for i in range(len(widths))] + ['', '', '']),
+        '',
+        '## HISTOGRAM\tjava.lang.Integer',
+        'insert_size\tAll_Reads.fr_count'
+    ]
+    for i in range(2, int(mean * 3)):
+        count = int(pairs * max(0, 1 - abs(i - mean) / (sd * 3)) / (sd * 3))
+        if count > 0:
+            lines.append('{}\t{}'.format(i, count))
+    return '\n'.join(lines) + '\n'
+
+def bcl2fastq_stats(run_id, s_names, seed, num_lanes=2):
+    """ Contents of a bcl2fastq Stats.json file for one sequencing run """
+    rand = random.Random('{}-bcl2fastq-{}'.format(seed, run_id))
+    conversion_results = []
+    unknown_barcodes = []
+    for lane in range(1, num_lanes + 1):
+        demux_results = []
+        for s_name in s_names:
+            reads = rand.randint(100000, 5000000)
+            index = ''.join(rand.choice('ACGT') for _ in range(8))
+            demux_results.append(OrderedDict([
+                ('SampleId', s_name),
+                ('SampleName', s_name),
+                ('IndexMetrics', [OrderedDict([
+                    ('IndexSequence', index),
+                    ('MismatchCounts', OrderedDict([('0', int(reads * 0.97)), ('1', reads - int(reads * 0.97))]))
+                ])]),
+                ('NumberReads', reads),
+                ('Yield', reads * 302),
+                ('ReadMetrics', [OrderedDict([
+                    ('ReadNumber', r),
+                    ('Yield', reads * 151),
+                    ('YieldQ30', int(reads * 151 * rand.uniform(0.8, 0.95))),
+                    ('QualityScoreSum', int(reads * 151 * rand.uniform(33, 37))),
+                    ('TrimmedBases', 0)
+                ]) for r in (1, 2)])
+            ]))
+        undetermined = rand.randint(100000, 5000000)
+        conversion_results.append(OrderedDict([
+            ('LaneNumber', lane),
+            ('TotalClustersRaw', sum(d['NumberReads'] for d in demux_results) * 2),
+            ('TotalClustersPF', sum(d['NumberReads'] for d in demux_results) + undetermined),
+            ('Yield', sum(d['Yield'] for d in demux_results)),
+            ('DemuxResults', demux_results),
+            ('Undetermined', OrderedDict([
+                ('NumberReads', undetermined),
+                ('Yield', undetermined * 302),
+                ('ReadMetrics', [OrderedDict([
+                    ('ReadNumber', r),
+                    ('Yield', undetermined * 151),
+                    ('YieldQ30', int(undetermined * 151 * 0.8)),
+                    ('QualityScoreSum', int(undetermined * 151 * 33)),
+                    ('TrimmedBases', 0)
+                ]) for r in (1, 2)])
+            ]))
+        ]))
+        unknown_barcodes.append(OrderedDict([
+            ('Lane', lane),
+            ('Barcodes', OrderedDict(
+                (''.join(rand.choice('ACGT') for _ in range(8)), rand.randint(1000, 100000)) for _ in range(10)
+            ))
+        ]))
+    stats = OrderedDict([
+        ('Flowcell', 'H{}BBXX'.format(run_id)),
+        ('RunNumber', run_id),
+        ('RunId', '190101_K00000_{:04d}_H{}BBXX'.format(run_id, run_id)),
+        ('ConversionResults', conversion_results),
+        ('UnknownBarcodes', unknown_barcodes)
+    ])
+    return json.dumps(stats, indent=4)
+
+def custom_table(s_names, rand):
+    """ Custom content table, with text and numeric columns """
+    lines = [
+        '# id: "benchmark_table"',
+        '# section_name: "Benchmark table"',
+        '# plot_type: "table"',
+        '\t'.join(['Sample', 'Batch', 'Tissue'] + ['Metric {}'.format(i) for i in range(1, 9)])
+    ]
+    for s_name in s_names:
+        lines.append('\t'.join(
+            [s_name, 'batch_{}'.format(rand.randint(1, 20)), rand.choice(['blood', 'liver', 'brain', 'skin'])]
+            + ['{:.3f}'.format(rand.uniform(0, 1000)) for i in range(8)]
+        ))
+    return '\n'.join(lines) + '\n'
+
+def custom_bargraph(s_names, rand):
+    """ Custom content bar graph, one row per sample """
+    lines = [
+        '# id: "benchmark_bargraph"',
+        '# section_name: "Benchmark bar graph"',
+        '# plot_type: "bargraph"',
+        'Sample\tCategory A\tCategory B\tCategory C\tCategory D'
+    ]
+    for s_name in s_names:
+        lines.append('\t'.join([s_name] + [str(rand.randint(0, 1000000)) for i in range(4)]))
+    return '\n'.join(lines) + '\n'
+
+def custom_scatter(s_names, rand):
+    """ Custom content scatter plot, one point per sample """
+    lines = [
+        '# id: "benchmark_scatter"',
+        '# section_name: "Benchmark scatter plot"',
+        '# plot_type: "scatter"'
+    ]
+    for s_name in s_names:
+        lines.append('{}\t{:.3f}\t{:.3f}'.format(s_name, rand.gauss(0, 1), rand.gauss(0, 1)))
+    return '\n'.join(lines) + '\n'
+
+def custom_heatmap(s_names, rand):
+    """ Custom content heatmap of sample correlations """
+    lines = [
+        '# id: "benchmark_heatmap"',
+        '# section_name: "Benchmark heatmap"',
+        '# plot_type: "heatmap"',
+        '\t'.join([''] + s_names)
+    ]
+    for s_name in s_names:
+        lines.append('\t'.join([s_name] + ['{:.3f}'.format(rand.uniform(0, 1)) for s in s_names]))
+    return '\n'.join(lines) + '\n'
+
+def custom_linegraph(s_name, rand, num_points=200):
+    """ Custom content line graph for one sample """
+    lines = [
+        '# id: "benchmark_linegraph"',
+        '# section_name: "Benchmark line graph"',
+        '# plot_type: "linegraph"'
+    ]
+    y = rand.uniform(10, 50)
+    for x in range(1, num_points + 1):
+        y = max(0, y + rand.gauss(0, 1))
+        lines.append('{}\t{:.3f}'.format(x, y))
+    return '\n'.join(lines) + '\n'
+
+def _write(path, contents):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(contents)
+
+def write_fastqc(outdir, s_names, seed):
+    """ FastQC results, alternating between unzipped directories and zip files """
+    for i, s_name in enumerate(s_names):
+        data = fastqc_data(s_name, sample_random(s_name, seed, 'fastqc'))
+        if i % 2 == 0:
+            _write(os.path.join(outdir, 'fastqc', '{}_fastqc'.format(s_name), 'fastqc_data.txt'), data)
+        else:
+            zip_fn = os.path.join(outdir, 'fastqc', '{}_fastqc.zip'.format(s_name))
+            if not os.path.isdir(os.path.dirname(zip_fn)):
+                os.makedirs(os.path.dirname(zip_fn))
+            with zipfile.ZipFile(zip_fn, 'w', zipfile.ZIP_DEFLATED) as zf:
+                # FastQC zips start with the directory entry
+                zf.writestr('{}_fastqc/'.format(s_name), '')
+                zf.writestr('{}_fastqc/fastqc_data.txt'.format(s_name), data)
+
+def write_samtools(outdir, s_names, seed):
+    for s_name in s_names:
+        _write(os.path.join(outdir, 'samtools', '{}.bam.stats'.format(s_name)),
+               samtools_stats(s_name, sample_random(s_name, seed, 'samtools')))
+
+def write_picard(outdir, s_names, seed):
+    for s_name in s_names:
+        rand = sample_random(s_name, seed, 'picard')
+        _write(os.path.join(outdir, 'picard', '{}.markdups.metrics.txt'.format(s_name)), picard_markdups(s_name, rand))
+        _write(os.path.join(outdir, 'picard', '{}.insert_size_metrics.txt'.format(s_name)), picard_insertsize(s_name, rand))
+
+def write_bcl2fastq(outdir, s_names, seed, samples_per_run=96):
+    for run_id, start in enumerate(range(0, len(s_names), samples_per_run), 1):
+        _write(os.path.join(outdir, 'bcl2fastq', 'run_{:04d}'.format(run_id), 'Stats', 'Stats.json'),
+               bcl2fastq_stats(run_id, s_names[start:start + samples_per_run], seed))
+
+def write_custom_content(outdir, s_names, seed, max_heatmap_samples=100):
+    rand = random.Random('{}-custom_content'.format(seed))
+    _write(os.path.join(outdir, 'custom', 'benchmark_table_mqc.tsv'), custom_table(s_names, rand))
+    _write(os.path.join(outdir, 'custom', 'benchmark_bargraph_mqc.tsv'), custom_bargraph(s_names, rand))
+    _write(os.path.join(outdir, 'custom', 'benchmark_scatter_mqc.tsv'), custom_scatter(s_names, rand))
+    # Heatmaps grow with the square of the number of samples, so only use some
+    _write(os.path.join(outdir, 'custom', 'benchmark_heatmap_mqc.tsv'), custom_heatmap(s_names[:max_heatmap_samples], rand))
+    for s_name in s_names:
+        _write(os.path.join(outdir, 'custom', 'linegraph', '{}_mqc.tsv'.format(s_name)),
+               custom_linegraph(s_name, sample_random(s_name, seed, 'custom_content')))
+
+# Functions to write the files for each tool, with the MultiQC module that reads them
+tools = OrderedDict([
+    ('fastqc', (write_fastqc, 'fastqc')),
+    ('samtools', (write_samtools, 'samtools')),
+    ('picard', (write_picard, 'picard')),
+    ('bcl2fastq', (write_bcl2fastq, 'bcl2fastq')),
+    ('custom_content', (write_custom_content, 'custom_content')),
+])
+
+def generate(outdir, num_samples, tool_names=None, seed=1):
+    """ Write synthetic log files for num_samples samples to outdir """
+    if not tool_names:
+        tool_names = list(tools.keys())
+    s_names = sample_names(num_samples)
+    for name in tool_names:
+        tools[name][0](outdir, s_names, seed)
+
+@click.command()
+@click.argument('outdir', type=click.Path())
+@click.option('--samples', default=1000, show_default=True, help="Number of samples")
+@click.option('--tool', 'tool_names', type=click.Choice(list(tools.keys())), multiple=True,
+              help="Only make files for this tool. Can specify multiple times.")
+@click.option('--seed', default=1, show_default=True, help="Random seed")
+def main(outdir, samples, tool_names, seed):
+    generate(outdir, samples, tool_names, seed)
+    print("Wrote synthetic data for {} samples to {}".format(samples, outdir))
+
+if __name__ == "__main__":
+    main()
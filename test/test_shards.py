@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+""" Tests for merging the results of separate MultiQC runs (multiqc/utils/shards.py) """
+
+from collections import OrderedDict
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+import synthetic_data
+
+from multiqc import multiqc
+from multiqc.utils import report, shards
+
+
+def general_stats(gs_data, gs_headers):
+    """ General Statistics values by namespace, column and sample """
+    values = dict()
+    for data, headers in zip(gs_data, gs_headers):
+        for k, header in headers.items():
+            for s_name, row in data.items():
+                if k in row:
+                    values[(header['namespace'], k, s_name)] = row[k]
+    return values
+
+
+class TestMergeData(unittest.TestCase):
+
+    def test_keeps_dict_type(self):
+        merged = shards.merge_data({'b': {'x': 1}}, {'a': {'x': 2}, 'b': {'y': 3}})
+        self.assertIs(type(merged), dict)
+        self.assertEqual(merged, {'a': {'x': 2}, 'b': {'x': 1, 'y': 3}})
+        merged = shards.merge_data(OrderedDict([('b', 1)]), OrderedDict([('a', 2)]))
+        self.assertIs(type(merged), OrderedDict)
+        self.assertEqual(list(merged.keys()), ['b', 'a'])
+
+    def test_sample_colours(self):
+        a = { 'data': {'s1': {1: 1}}, 'pconfig': { 'id': 'p', 'colors': {'s1': 'red'}, 'ymax': 5 } }
+        b = { 'data': {'s2': {1: 2}}, 'pconfig': { 'id': 'p', 'colors': {'s2': 'green'}, 'ymax': 6 } }
+        merged = shards.merge_plot_inputs(a, b)
+        self.assertEqual(merged['pconfig']['colors'], {'s1': 'red', 's2': 'green'})
+        self.assertEqual(merged['pconfig']['ymax'], 5)
+        # The inputs aren't changed
+        self.assertEqual(a['pconfig']['colors'], {'s1': 'red'})
+
+
+class TestMergeShards(unittest.TestCase):
+    """ Two merged shards should give the same report as one run with all of the samples """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        s_names = synthetic_data.sample_names(8)
+        # Every other sample in each shard, so that they're not found in sorted order
+        for name, shard_s_names in [('a', s_names[1::2]), ('b', s_names[0::2])]:
+            for write in [synthetic_data.write_fastqc, synthetic_data.write_samtools, synthetic_data.write_picard]:
+                write(os.path.join(self.tmpdir, name), shard_s_names, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_multiqc(self, analysis_dir, outdir, **kwargs):
+        result = multiqc.run(analysis_dir=analysis_dir, outdir=os.path.join(self.tmpdir, outdir), quiet=True, **kwargs)
+        self.assertEqual(result['sys_exit_code'], 0)
+        return report.plot_data, len(report.general_stats_data), general_stats(report.general_stats_data, report.general_stats_headers)
+
+    def test_merged_report(self):
+        a, b = os.path.join(self.tmpdir, 'a'), os.path.join(self.tmpdir, 'b')
+        plot_data, num_gs, gs = self.run_multiqc([a, b], 'direct')
+        shard_a, shard_b = os.path.join(self.tmpdir, 'a.mqc'), os.path.join(self.tmpdir, 'b.mqc')
+        self.run_multiqc([a], 'shard_a', shard_out=shard_a)
+        self.run_multiqc([b], 'shard_b', shard_out=shard_b)
+        merged_plot_data, merged_num_gs, merged_gs = self.run_multiqc([shard_a, shard_b], 'merged', merge_shards=True)
+
+        self.assertEqual(merged_num_gs, num_gs)
+        self.assertEqual(merged_gs, gs)
+        self.assertEqual(sorted(merged_plot_data.keys()), sorted(plot_data.keys()))
+        for pid, pdata in plot_data.items():
+            merged = merged_plot_data[pid]
+            self.assertEqual(merged.get('samples'), pdata.get('samples'), pid)
+            self.assertEqual(merged['datasets'], pdata['datasets'], pid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+""" Tests for packing plot data into binary typed arrays (multiqc/utils/typed_arrays.py) """
+
+from __future__ import division
+import struct
+import unittest
+
+import numpy as np
+
+from multiqc.utils import typed_arrays
+
+
+def read_array(packer, ref):
+    """ Read back the values of a packed array from the packer buffer """
+    name, offset, length = ref['mqc_array'][:3]
+    return np.frombuffer(packer.buffer(), dtype=typed_arrays.dtypes[name], count=length, offset=offset).tolist()
+
+
+class TestToArray(unittest.TestCase):
+
+    def test_ints(self):
+        arr = typed_arrays.to_array([1, 2, 3])
+        self.assertEqual(arr.dtype.kind, 'i')
+        self.assertEqual(arr.tolist(), [1, 2, 3])
+
+    def test_floats(self):
+        arr = typed_arrays.to_array([1.5, 2, -3.25])
+        self.assertEqual(arr.dtype.kind, 'f')
+        self.assertEqual(arr.tolist(), [1.5, 2.0, -3.25])
+
+    def test_none_and_nan(self):
+        arr = typed_arrays.to_array([1, None, float('nan'), 4])
+        self.assertEqual(arr.dtype.kind, 'f')
+        self.assertEqual(arr[0], 1)
+        self.assertTrue(np.isnan(arr[1]))
+        self.assertTrue(np.isnan(arr[2]))
+        self.assertEqual(arr[3], 4)
+
+    def test_bools(self):
+        self.assertIsNone(typed_arrays.to_array([True, False]))
+        self.assertIsNone(typed_arrays.to_array([1, True, 3]))
+        self.assertIsNone(typed_arrays.to_array([[1, 2], [3, False]], 2))
+        self.assertIsNone(typed_arrays.to_array([None, True]))
+
+    def test_not_numbers(self):
+        self.assertIsNone(typed_arrays.to_array(['a', 'b']))
+        self.assertIsNone(typed_arrays.to_array([1, 'b']))
+
+    def test_pairs(self):
+        arr = typed_arrays.to_array([[1, 2.5], [2, None]], 2)
+        self.assertEqual(arr.shape, (2, 2))
+        self.assertIsNone(typed_arrays.to_array([[1, 2], [3, 4]], 1))
+
+
+class TestArrayType(unittest.TestCase):
+
+    def test_ints(self):
+        self.assertEqual(typed_arrays.array_type(np.array([1, -2, 3]), 7), 'i32')
+        self.assertEqual(typed_arrays.array_type(np.array([1.0, 2.0]), 7), 'i32')
+
+    def test_ints_too_big(self):
+        # Kept exact, whatever the number of significant digits
+        self.assertEqual(typed_arrays.array_type(np.array([1, 2**40]), 7), 'f64')
+        self.assertEqual(typed_arrays.array_type(np.array([1.0, 2.0**40]), 7), 'f32')
+
+    def test_floats(self):
+        self.assertEqual(typed_arrays.array_type(np.array([1.5, 2.25]), 7), 'f32')
+        self.assertEqual(typed_arrays.array_type(np.array([1.5, 2.25]), 8), 'f64')
+        self.assertEqual(typed_arrays.array_type(np.array([1.5, 1e39]), 7), 'f64')
+
+    def test_nan(self):
+        # NaN can't be saved in an integer array
+        self.assertEqual(typed_arrays.array_type(np.array([1.0, float('nan')]), 7), 'f32')
+        self.assertEqual(typed_arrays.array_type(np.array([float('nan')]), 7), 'f32')
+        self.assertEqual(typed_arrays.array_type(np.array([float('nan')]), 10), 'f64')
+
+
+class TestPackPlot(unittest.TestCase):
+
+    def test_linegraph(self):
+        packer = typed_arrays.TypedArrayPacker()
+        pdata = {
+            'plot_type': 'xy_line',
+            'config': {},
+            'datasets': [[
+                { 'name': 'a', 'data': [[1, 0.5], [2, None], [3, 1.25]] },
+                { 'name': 'b', 'data': [[1, 1], [2, 2], [3, 3]] },
+            ]]
+        }
+        packed = packer.pack_plot(pdata)
+        a, b = packed['datasets'][0]
+        self.assertEqual(a['name'], 'a')
+        x_a, y_a = a['data']['mqc_xy']
+        x_b, y_b = b['data']['mqc_xy']
+        self.assertEqual(read_array(packer, x_a), [1, 2, 3])
+        self.assertEqual(x_a['mqc_array'][0], 'i32')
+        # The shared x values are only saved once
+        self.assertIs(x_a, x_b)
+        y = read_array(packer, y_a)
+        self.assertEqual(y_a['mqc_array'][0], 'f32')
+        self.assertEqual(y_a['mqc_array'][3], typed_arrays.float32_digits)
+        self.assertEqual(y[0], 0.5)
+        self.assertTrue(np.isnan(y[1]))
+        self.assertEqual(y[2], 1.25)
+        self.assertEqual(read_array(packer, y_b), [1, 2, 3])
+        # The original data isn't changed
+        self.assertEqual(pdata['datasets'][0][0]['data'][0], [1, 0.5])
+
+    def test_bargraph(self):
+        packer = typed_arrays.TypedArrayPacker()
+        pdata = {
+            'plot_type': 'bar_graph',
+            'datasets': [[
+                { 'name': 'ints', 'data': [1, 2, 3] },
+                { 'name': 'floats', 'data': [0.25, 1.5, 2] },
+                { 'name': 'bools', 'data': [True, False, True] },
+                { 'name': 'strings', 'data': ['a', 'b', 'c'] },
+            ]]
+        }
+        ints, floats, bools, strings = packer.pack_plot(pdata)['datasets'][0]
+        self.assertEqual(read_array(packer, ints['data']), [1, 2, 3])
+        self.assertEqual(read_array(packer, floats['data']), [0.25, 1.5, 2.0])
+        self.assertEqual(bools['data'], [True, False, True])
+        self.assertEqual(strings['data'], ['a', 'b', 'c'])
+
+    def test_other_plots_unchanged(self):
+        packer = typed_arrays.TypedArrayPacker()
+        pdata = { 'plot_type': 'heatmap', 'data': [[1, 2], [3, 4]] }
+        self.assertIs(packer.pack_plot(pdata), pdata)
+        self.assertEqual(packer.buffer(), b'')
+
+    def test_sig_digits_not_shared(self):
+        """ The same float32 bytes with different sig_digits are separate arrays """
+        packer = typed_arrays.TypedArrayPacker()
+        def plot(sig_digits):
+            return {
+                'plot_type': 'bar_graph',
+                'config': { 'sig_digits': sig_digits },
+                'datasets': [[ { 'name': 'a', 'data': [0.123456, 1.5] } ]]
+            }
+        ref_3 = packer.pack_plot(plot(3))['datasets'][0][0]['data']
+        ref_5 = packer.pack_plot(plot(5))['datasets'][0][0]['data']
+        ref_3_again = packer.pack_plot(plot(3))['datasets'][0][0]['data']
+        self.assertEqual(ref_3['mqc_array'][3], 3)
+        self.assertEqual(ref_5['mqc_array'][3], 5)
+        self.assertNotEqual(ref_3['mqc_array'][1], ref_5['mqc_array'][1])
+        self.assertIs(ref_3, ref_3_again)
+
+    def test_arrays_aligned(self):
+        packer = typed_arrays.TypedArrayPacker()
+        packer.pack_plot({ 'plot_type': 'bar_graph', 'datasets': [[
+            { 'name': 'a', 'data': [1, 2, 3] },
+            { 'name': 'b', 'data': [1.5, 2.5, 3.5, 4.5, 5.5] },
+        ]] })
+        self.assertEqual(len(packer.buffer()) % 8, 0)
+        for ref in packer.refs.values():
+            self.assertEqual(ref['mqc_array'][1] % 8, 0)
+        self.assertEqual(struct.unpack('<3i', packer.buffer()[:12]), (1, 2, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()